@@ -1,45 +1,257 @@
 ## api.py
-import openai
+import hashlib
+import json
+import threading
+import time
 from flask import current_app
-from .config import OPENAI_API_KEY
+from .config import (OPENAI_API_KEY, STORY_ADAPTER, FAKE_ADAPTER_LATENCY, PROMPT_CACHE_BACKEND,
+                     PROMPT_CACHE_PATH, PROMPT_CACHE_MAX_ENTRIES, PROMPT_CACHE_TTL)
+from .cache import make_cache
+from .model_client import get_model_client, get_openai, estimate_tokens
+from .context_builder import build_prompt, update_story_summary
+from .telemetry import InstrumentedStoryAdapter, get_usage_recorder
 from .models import db, Adventure
+from .jobs import task
 
 class OpenAIAdapter:
     def __init__(self, api_key: str = OPENAI_API_KEY):
         self.api_key = api_key
-        openai.api_key = self.api_key
+        self.engine = "davinci"
+        self.max_tokens = 150  # Assuming 150 is a sensible default
+        self.client = get_model_client(self.api_key)
+
+    def model_params(self) -> dict:
+        return {'engine': self.engine, 'max_tokens': self.max_tokens}
 
     def generate_story(self, prompt: str) -> str:
         try:
-            response = openai.Completion.create(
-                engine="davinci",
-                prompt=prompt,
-                max_tokens=150  # Assuming 150 is a sensible default
-            )
-            story = response.choices[0].text.strip() if response.choices else ""
-            return story
-        except openai.error.OpenAIError as e:
+            return self.client.complete(prompt, **self.model_params())
+        except get_openai().error.OpenAIError as e:
             current_app.logger.error(f"OpenAI API error: {e}")
             raise
         except Exception as e:
             current_app.logger.error(f"An unexpected error occurred: {e}")
             raise
 
-def update_adventure_story(adventure_id: int, prompt: str):
+    def stream_story(self, prompt: str):
+        """
+        Streams a story completion, yielding text chunks as they arrive.
+
+        :param prompt: The prompt to be sent to the OpenAI API.
+        :return: A generator of text chunks.
+        """
+        try:
+            for chunk in self.client.stream(prompt, **self.model_params()):
+                text = chunk.choices[0].text if chunk.choices else ""
+                if text:
+                    yield text
+        except get_openai().error.OpenAIError as e:
+            current_app.logger.error(f"OpenAI API error: {e}")
+            raise
+        except Exception as e:
+            current_app.logger.error(f"An unexpected error occurred: {e}")
+            raise
+
+class FakeOpenAIAdapter:
+    """
+    Deterministic stand-in for OpenAIAdapter used for offline load testing.
+    The same prompt always produces the same story after a fixed latency,
+    plus prompt_latency seconds per 1000 estimated prompt tokens to model
+    longer prompts being slower to process.
+    """
+    WORDS = ['the', 'hero', 'wanders', 'into', 'a', 'dark', 'forest', 'where', 'an', 'old',
+             'dragon', 'guards', 'forgotten', 'gold', 'and', 'whispers', 'of', 'ancient', 'magic', 'echo']
+
+    def __init__(self, latency: float = FAKE_ADAPTER_LATENCY, length: int = 100, prompt_latency: float = 0.0):
+        self.latency = latency
+        self.length = length
+        self.prompt_latency = prompt_latency
+
+    def _delay(self, prompt: str) -> float:
+        return self.latency + self.prompt_latency * estimate_tokens(prompt) / 1000
+
+    def model_params(self) -> dict:
+        return {'engine': 'fake', 'length': self.length}
+
+    def _story(self, prompt: str) -> str:
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+        words = [self.WORDS[digest[i % len(digest)] % len(self.WORDS)] for i in range(self.length)]
+        return ' '.join(words).capitalize() + '.'
+
+    def generate_story(self, prompt: str) -> str:
+        delay = self._delay(prompt)
+        if delay:
+            time.sleep(delay)
+        return self._story(prompt)
+
+    def stream_story(self, prompt: str):
+        words = self._story(prompt).split(' ')
+        delay = self._delay(prompt)
+        for i, word in enumerate(words):
+            if delay:
+                time.sleep(delay / len(words))
+            yield word if i == 0 else ' ' + word
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normalizes a prompt so that near-identical prompts share a cache entry.
+
+    :param prompt: The raw prompt text.
+    :return: The prompt with whitespace collapsed and case folded.
+    """
+    return ' '.join(prompt.split()).casefold()
+
+def prompt_cache_key(prompt: str, params: dict) -> str:
+    payload = json.dumps({'prompt': normalize_prompt(prompt), 'params': params}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class CachedStoryAdapter:
+    """
+    Wraps a story adapter with a prompt/response cache keyed on the
+    normalized prompt plus the adapter's model parameters.
+    """
+    def __init__(self, adapter, cache):
+        self.adapter = adapter
+        self.cache = cache
+
+    def model_params(self) -> dict:
+        return self.adapter.model_params()
+
+    def generate_story(self, prompt: str) -> str:
+        key = prompt_cache_key(prompt, self.model_params())
+        story = self.cache.get(key)
+        if story is None:
+            story = self.adapter.generate_story(prompt)
+            self.cache.set(key, story)
+        return story
+
+    def stream_story(self, prompt: str):
+        key = prompt_cache_key(prompt, self.model_params())
+        story = self.cache.get(key)
+        if story is not None:
+            yield story
+            return
+        chunks = []
+        for chunk in self.adapter.stream_story(prompt):
+            chunks.append(chunk)
+            yield chunk
+        self.cache.set(key, ''.join(chunks).strip())
+
+_prompt_cache = None
+_prompt_cache_lock = threading.Lock()
+
+def get_prompt_cache():
+    """
+    Returns the process-wide prompt cache, creating it on first use.
+
+    :return: The cache, or None when PROMPT_CACHE_BACKEND is 'none'.
+    """
+    global _prompt_cache
+    if _prompt_cache is None:
+        with _prompt_cache_lock:
+            if _prompt_cache is None:
+                _prompt_cache = make_cache(PROMPT_CACHE_BACKEND, PROMPT_CACHE_MAX_ENTRIES,
+                                           PROMPT_CACHE_TTL, PROMPT_CACHE_PATH) or False
+    return _prompt_cache or None
+
+def prompt_cache_stats() -> dict:
+    cache = get_prompt_cache()
+    return cache.stats.to_dict() if cache else {}
+
+def get_story_adapter(adventure_id: int = None, user_id: int = None):
+    """
+    Builds the story adapter selected by the STORY_ADAPTER configuration,
+    with usage telemetry and quotas around each model call, wrapped in the
+    prompt cache when one is configured. Cache hits are not model calls and
+    are neither recorded nor counted against quotas.
+
+    :param adventure_id: The adventure the calls are made for.
+    :param user_id: The user the calls are made for.
+    :return: An adapter exposing generate_story(prompt).
+    """
+    if current_app.config.get('STORY_ADAPTER', STORY_ADAPTER) == 'fake':
+        adapter = FakeOpenAIAdapter(latency=current_app.config.get('FAKE_ADAPTER_LATENCY', FAKE_ADAPTER_LATENCY))
+    else:
+        adapter = OpenAIAdapter()
+    recorder = get_usage_recorder()
+    if recorder is not None:
+        adapter = InstrumentedStoryAdapter(adapter, recorder, adventure_id, user_id)
+    cache = get_prompt_cache()
+    return CachedStoryAdapter(adapter, cache) if cache else adapter
+
+def _record_turn(adventure: Adventure, payload: dict):
+    # Appends the turn (indexing it for search) and keeps the rolling summary in step, in the caller's transaction
+    adventure.update_story_state(payload)
+    update_story_summary(adventure)
+
+def generate_adventure_story(adventure_id: int, prompt: str, adapter=None, user_id: int = None) -> str:
+    """
+    Generates the next part of an adventure's story and commits it.
+
+    :param adventure_id: ID of the Adventure to be updated.
+    :param prompt: The player's prompt; the story context is added by build_prompt.
+    :param adapter: Optional adapter to use instead of the configured one.
+    :param user_id: ID of the user who made the request, for usage accounting and quotas.
+    :return: The generated story text.
+    :raises ValueError: If the adventure does not exist.
+    """
+    adventure = Adventure.query.get(adventure_id)
+    if not adventure:
+        raise ValueError(f"Adventure with ID {adventure_id} does not exist.")
+    adapter = adapter or get_story_adapter(adventure_id, user_id)
+    story_update = adapter.generate_story(build_prompt(adventure, prompt))
+    _record_turn(adventure, {'story': story_update, 'prompt': prompt})
+    db.session.commit()
+    return story_update
+
+def stream_adventure_story(adventure_id: int, prompt: str, adapter=None, user_id: int = None):
+    """
+    Streams the next part of an adventure's story, committing the full text
+    once the stream finishes.
+
+    :param adventure_id: ID of the Adventure to be updated.
+    :param prompt: The player's prompt; the story context is added by build_prompt.
+    :param adapter: Optional adapter to use instead of the configured one.
+    :param user_id: ID of the user who made the request, for usage accounting and quotas.
+    :return: A generator of text chunks.
+    :raises ValueError: If the adventure does not exist.
+    """
+    adventure = Adventure.query.get(adventure_id)
+    if not adventure:
+        raise ValueError(f"Adventure with ID {adventure_id} does not exist.")
+    adapter = adapter or get_story_adapter(adventure_id, user_id)
+    chunks = []
+    for chunk in adapter.stream_story(build_prompt(adventure, prompt)):
+        chunks.append(chunk)
+        yield chunk
+    _record_turn(adventure, {'story': ''.join(chunks).strip(), 'prompt': prompt})
+    db.session.commit()
+
+def update_adventure_story(adventure_id: int, prompt: str, user_id: int = None):
     """
     Updates the story state of an adventure using the OpenAI API.
-    
+
     :param adventure_id: ID of the Adventure to be updated.
     :param prompt: The prompt to be sent to the OpenAI API.
+    :param user_id: ID of the user who made the request, for usage accounting and quotas.
     :return: None
     """
     adventure = Adventure.query.get(adventure_id)
     if adventure:
-        openai_adapter = OpenAIAdapter()
         try:
-            story_update = openai_adapter.generate_story(prompt)
-            adventure.update_story_state({'story': story_update})
-            db.session.commit()
+            generate_adventure_story(adventure_id, prompt, user_id=user_id)
         except Exception as e:
             current_app.logger.error(f"Failed to update adventure story: {e}")
             # Consider re-raising the exception or handling it appropriately
+
+@task('generate_story')
+def generate_story_task(adventure_id: int, prompt: str, user_id: int = None) -> str:
+    """
+    Job task that runs story generation on a worker.
+
+    :param adventure_id: ID of the Adventure to be updated.
+    :param prompt: The player's prompt; the story context is added by build_prompt.
+    :param user_id: ID of the user who made the request, for usage accounting and quotas.
+    :return: The generated story text.
+    """
+    return generate_adventure_story(adventure_id, prompt, user_id=user_id)
@@ -1,20 +1,135 @@
 ## auth.py
+from flask import current_app, has_app_context
 from flask_login import LoginManager, login_user, logout_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from .models import User, db
-from werkzeug.security import check_password_hash
+from .cache import make_cache
+from .config import USER_CACHE_BACKEND, USER_CACHE_PATH, USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL
+from .hashing import HashingBusy
 
 # Initialize Flask-Login
 login_manager = LoginManager()
 
+class UserSnapshot:
+    """
+    Lightweight, read-only view of a User for Flask-Login's current_user.
+
+    Attributes beyond the snapshot (relationships, for instance) are served by
+    loading the full User on first access.
+    """
+    FIELDS = ('id', 'username', 'email')
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, id: int, username: str, email: str):
+        object.__setattr__(self, 'id', id)
+        object.__setattr__(self, 'username', username)
+        object.__setattr__(self, 'email', email)
+        object.__setattr__(self, '_model', None)
+
+    @classmethod
+    def from_user(cls, user: User) -> 'UserSnapshot':
+        return cls(user.id, user.username, user.email)
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def get_id(self) -> str:
+        return str(self.id)
+
+    def model(self) -> User:
+        if self._model is None:
+            object.__setattr__(self, '_model', User.query.get(self.id))
+        return self._model
+
+    def __getattr__(self, name):
+        return getattr(self.model(), name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("UserSnapshot is read-only; load the User model to modify it.")
+
+    def __eq__(self, other):
+        return isinstance(other, (UserSnapshot, User)) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+def get_user_cache():
+    return current_app.extensions.get('user_cache')
+
+def user_cache_key(user_id: int) -> str:
+    return f'user:{user_id}'
+
+def invalidate_user(user_id: int):
+    """
+    Drop a user's cached snapshot.
+
+    :param user_id: The ID of the user.
+    """
+    user_cache = get_user_cache() if has_app_context() else None
+    if user_cache is not None and user_id is not None:
+        user_cache.delete(user_cache_key(user_id))
+
 @login_manager.user_loader
 def load_user(user_id):
     """
     Load a user given the user ID.
     
     :param user_id: The ID of the user to load.
-    :return: The User object if found, None otherwise.
+    :return: A UserSnapshot if found, None otherwise.
     """
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    user_cache = get_user_cache()
+    if user_cache is not None:
+        cached = user_cache.get(user_cache_key(user_id))
+        if cached is not None:
+            return UserSnapshot(**cached)
+    user = User.query.get(user_id)
+    if user is None:
+        return None
+    snapshot = UserSnapshot.from_user(user)
+    if user_cache is not None:
+        user_cache.set(user_cache_key(user_id), snapshot.to_dict())
+    return snapshot
+
+def user_cache_stats() -> dict:
+    """
+    Report user cache effectiveness; every hit is a database query saved.
+    """
+    user_cache = get_user_cache()
+    if user_cache is None:
+        return {}
+    stats = user_cache.stats.to_dict()
+    stats['queries_saved'] = stats['hits']
+    return stats
+
+def _record_change(user: User):
+    # Evicted only once the commit succeeds; evicting at flush time lets a concurrent
+    # request re-cache the old row before the change is visible
+    session = db.inspect(user).session
+    if session is not None and user.id is not None:
+        session.info.setdefault('changed_users', set()).add(user.id)
+
+@event.listens_for(User.password_hash, 'set')
+def _invalidate_on_password_change(user, value, oldvalue, initiator):
+    _record_change(user)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_on_change(mapper, connection, user):
+    _record_change(user)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop('changed_users', ()):
+        invalidate_user(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('changed_users', None)
 
 class AuthError(Exception):
     """
@@ -33,9 +148,16 @@ def authenticate_user(username, password):
     :raises AuthError: If authentication fails.
     """
     user = User.query.filter_by(username=username).first()
-    if user and check_password_hash(user.password_hash, password):
-        login_user(user)
-        return user
+    try:
+        if user and user.check_password(password):
+            if user.password_needs_rehash():
+                # Upgrade hashes created with older parameters while we have the plaintext
+                user.set_password(password)
+                db.session.commit()
+            login_user(user)
+            return user
+    except HashingBusy:
+        raise AuthError("The server is busy, please try again shortly")
     raise AuthError("Invalid username or password")
 
 def logout():
@@ -54,12 +176,22 @@ def register_user(username, email, password):
     :return: User object if registration is successful.
     :raises AuthError: If registration fails due to existing user.
     """
-    if User.query.filter((User.username == username) | (User.email == email)).first():
-        raise AuthError("Username or email already exists")
-
-    new_user = User(username=username, email=email, password=password)
+    try:
+        new_user = User(username=username, email=email, password=password)
+    except HashingBusy:
+        raise AuthError("The server is busy, please try again shortly")
+    # The unique constraints decide; a duplicate costs one failed insert instead of a lookup per field
     db.session.add(new_user)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        detail = str(e.orig).lower()
+        if 'username' in detail:
+            raise AuthError("That username is taken. Please choose a different one.")
+        if 'email' in detail:
+            raise AuthError("That email is already in use. Please choose a different one.")
+        raise AuthError("Username or email already exists")
     return new_user
 
 def init_auth(app):
@@ -69,4 +201,10 @@ def init_auth(app):
     :param app: The Flask application object.
     """
     login_manager.init_app(app)
-    login_manager.login_view = 'login'
+    login_manager.login_view = 'views.login'
+    # Per-process (or shared, with the 'sqlite' backend) cache of user snapshots
+    app.extensions['user_cache'] = make_cache(
+        app.config.get('USER_CACHE_BACKEND', USER_CACHE_BACKEND),
+        app.config.get('USER_CACHE_MAX_ENTRIES', USER_CACHE_MAX_ENTRIES),
+        app.config.get('USER_CACHE_TTL', USER_CACHE_TTL),
+        app.config.get('USER_CACHE_PATH', USER_CACHE_PATH))
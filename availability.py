@@ -0,0 +1,174 @@
+## availability.py
+import hashlib
+import math
+import threading
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .config import (AVAILABILITY_INDEX_ENABLED, AVAILABILITY_INDEX_CAPACITY, AVAILABILITY_INDEX_ERROR_RATE,
+                     AVAILABILITY_INDEX_REFRESH)
+from .models import db, User
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter. Membership tests never give false negatives, so a
+    miss proves an item was never added.
+    """
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Double hashing: k positions derived from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+class AvailabilityIndex:
+    """
+    Answers "is this username/email taken?" from Bloom filters where possible.
+
+    A filter miss is answered as available without touching the database;
+    a hit may be a false positive, so it is confirmed with an indexed query.
+    Each process adds its own committed inserts straight away but only sees
+    other processes' inserts when its filters are rebuilt, which happens in
+    the background once they are refresh_interval seconds old. A name taken
+    elsewhere within that window can be reported as available; that only
+    affects the availability hint, since registration is decided by the
+    unique constraints. Until the filters have been built every check goes
+    to the database.
+    """
+    def __init__(self, app, capacity: int = AVAILABILITY_INDEX_CAPACITY, error_rate: float = AVAILABILITY_INDEX_ERROR_RATE,
+                 refresh_interval: float = AVAILABILITY_INDEX_REFRESH):
+        self.app = app
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.usernames = None
+        self.emails = None
+        self.built_at = None
+        self.filter_answers = 0
+        self.db_checks = 0
+        self._building = False
+        # Inserts seen while a rebuild streams the table, replayed onto the new filters
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def rebuild(self, batch_size: int = 10000):
+        """
+        Rebuilds both filters by streaming every username and email.
+
+        :param batch_size: The number of rows fetched per round trip.
+        """
+        with self._lock:
+            if not self._building:
+                self._building = True
+                self._pending = []
+        started = time.monotonic()
+        with self.app.app_context():
+            count = db.session.query(db.func.count(User.id)).scalar() or 0
+            capacity = max(self.capacity, count * 2)
+            usernames = BloomFilter(capacity, self.error_rate)
+            emails = BloomFilter(capacity, self.error_rate)
+            query = db.session.query(User.username, User.email).execution_options(stream_results=True)
+            for username, email in query.yield_per(batch_size):
+                usernames.add(username)
+                emails.add(email)
+        with self._lock:
+            for username, email in self._pending:
+                usernames.add(username)
+                emails.add(email)
+            self.usernames, self.emails = usernames, emails
+            self.built_at = started
+            self._pending = []
+            self._building = False
+
+    def add(self, username: str, email: str):
+        with self._lock:
+            if self._building:
+                self._pending.append((username, email))
+            if self.usernames is not None:
+                self.usernames.add(username)
+                self.emails.add(email)
+
+    def is_username_available(self, username: str) -> bool:
+        return self._is_available(self.usernames, User.username, username)
+
+    def is_email_available(self, email: str) -> bool:
+        return self._is_available(self.emails, User.email, email)
+
+    def stats(self) -> dict:
+        return {'ready': self.usernames is not None, 'filter_answers': self.filter_answers, 'db_checks': self.db_checks}
+
+    def _is_available(self, bloom: BloomFilter, column, value: str) -> bool:
+        if bloom is None or time.monotonic() - self.built_at > self.refresh_interval:
+            # The current filters keep answering while the new ones are built
+            self._start_rebuild()
+        if bloom is not None and value not in bloom:
+            self.filter_answers += 1
+            return True
+        self.db_checks += 1
+        return not db.session.query(db.exists().where(column == value)).scalar()
+
+    def _start_rebuild(self):
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+            self._pending = []
+        threading.Thread(target=self.rebuild, name='availability-index', daemon=True).start()
+
+def init_availability(app):
+    """
+    Initialize the username/email availability index. The filters are built
+    in the background on first use.
+
+    :param app: The Flask application object.
+    """
+    if app.config.get('AVAILABILITY_INDEX_ENABLED', AVAILABILITY_INDEX_ENABLED):
+        app.extensions['availability_index'] = AvailabilityIndex(
+            app, capacity=app.config.get('AVAILABILITY_INDEX_CAPACITY', AVAILABILITY_INDEX_CAPACITY),
+            error_rate=app.config.get('AVAILABILITY_INDEX_ERROR_RATE', AVAILABILITY_INDEX_ERROR_RATE),
+            refresh_interval=app.config.get('AVAILABILITY_INDEX_REFRESH', AVAILABILITY_INDEX_REFRESH))
+
+def get_availability_index():
+    return current_app.extensions.get('availability_index')
+
+def username_available(username: str) -> bool:
+    index = get_availability_index()
+    if index is not None:
+        return index.is_username_available(username)
+    return not db.session.query(db.exists().where(User.username == username)).scalar()
+
+def email_available(email: str) -> bool:
+    index = get_availability_index()
+    if index is not None:
+        return index.is_email_available(email)
+    return not db.session.query(db.exists().where(User.email == email)).scalar()
+
+@event.listens_for(User, 'after_insert')
+def _record_new_user(mapper, connection, user):
+    # Added to the filters only once committed, so a rolled-back name does not cost later checks a query
+    db.inspect(user).session.info.setdefault('new_users', []).append((user.username, user.email))
+
+@event.listens_for(Session, 'after_commit')
+def _index_new_users(session):
+    new_users = session.info.pop('new_users', ())
+    index = current_app.extensions.get('availability_index') if has_app_context() else None
+    if index is not None:
+        for username, email in new_users:
+            index.add(username, email)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_new_users(session):
+    session.info.pop('new_users', None)
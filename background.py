@@ -0,0 +1,122 @@
+## background.py
+import atexit
+import os
+import threading
+
+class ProcessThreads:
+    """
+    Daemon threads started on first use in each process. A preloaded master
+    never owns them, and a worker forked from it starts its own instead of
+    relying on thread objects that only exist in the parent.
+
+    Queues and conditions the parent's threads were waiting on are unsafe
+    to use in the child: a notify may go to a waiter that no longer exists.
+    Pass reset to replace them before the child's threads start.
+
+    :param targets: (name, callable) pairs, one thread per pair.
+    :param reset: Optional callable run in a forked child whose parent had started the threads.
+    """
+    def __init__(self, *targets, reset=None):
+        self.targets = targets
+        self.reset = reset
+        self.threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self) -> bool:
+        """
+        Starts the threads unless this process already has.
+
+        :return: True if the threads were started by this call.
+        """
+        if self._pid == os.getpid():
+            return False
+        with self._lock:
+            if self._pid == os.getpid():
+                return False
+            if self._pid is not None and self.reset is not None:
+                self.reset()
+            self.threads = []
+            for name, target in self.targets:
+                thread = threading.Thread(target=target, name=name, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+            self._pid = os.getpid()
+            return True
+
+class PeriodicFlusher:
+    """
+    Runs a write function every interval seconds on a per-process background
+    thread, and once more at interpreter exit in each process that started
+    it. Flushes never overlap, whether periodic or called directly.
+
+    A failing write is counted and re-raised to direct callers; the
+    background thread swallows it and retries next round, so the write
+    function must log the error and keep its data.
+
+    :param write: Callable that writes pending data and returns the number of rows written.
+    :param interval: Seconds between flushes.
+    :param name: The background thread's name.
+    """
+    def __init__(self, write, interval: float, name: str):
+        self.write = write
+        self.interval = interval
+        self._threads = ProcessThreads((name, self._run))
+        self._flush_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._flushes = 0
+        self._flushed_rows = 0
+        self._flush_errors = 0
+
+    def ensure_started(self):
+        if self._threads.ensure_started():
+            atexit.register(self.shutdown)
+
+    def wake(self):
+        """
+        Runs the next periodic flush now rather than at the end of the interval.
+        """
+        self._wake.set()
+
+    def flush(self, *args) -> int:
+        """
+        Calls the write function with args.
+
+        :return: The number of rows written.
+        """
+        with self._flush_lock:
+            try:
+                rows = self.write(*args)
+            except Exception:
+                with self._stats_lock:
+                    self._flush_errors += 1
+                raise
+            if rows:
+                with self._stats_lock:
+                    self._flushes += 1
+                    self._flushed_rows += rows
+            return rows
+
+    def shutdown(self):
+        """
+        Stops the background thread and flushes once more.
+        """
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {'flushes': self._flushes, 'flushed_rows': self._flushed_rows, 'flush_errors': self._flush_errors}
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Logged by the write function, which keeps its data for the next round
+                pass
@@ -0,0 +1,82 @@
+## benchmarks/bench_adventure_pages.py
+"""
+Measures a spectator refreshing an adventure page: rendered from the
+database every time, served from the page cache, and answered with a 304
+to a conditional request.
+
+Run with: python -m <package>.benchmarks.bench_adventure_pages
+"""
+import os
+import random
+import tempfile
+from jinja2 import DictLoader
+from ..database import init_db
+from ..main import create_app
+from ..models import db, User
+from ..game_manager import GameManager
+from ..page_cache import get_page_cache, get_version_cache
+from .bench_load import TEMPLATES
+from .bench_serialization import passage
+from .harness import make_parser, report, summarize, time_calls
+
+def clear_caches(app):
+    with app.app_context():
+        for cache in (get_page_cache(), get_version_cache()):
+            if cache is not None:
+                cache.clear()
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument('--repeat', type=int, default=500)
+    parser.add_argument('--turns', type=int, default=50, help='Story events on the adventure.')
+    parser.add_argument('--players', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'bench.db'),
+                          'WTF_CSRF_ENABLED': False})
+        app.jinja_loader = DictLoader(TEMPLATES)
+        with app.app_context():
+            init_db()
+            db.session.execute(db.insert(User), [
+                {'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'unused'}
+                for i in range(args.players + 1)
+            ])
+            db.session.commit()
+            user_ids = list(db.session.scalars(db.select(User.id).order_by(User.id)))
+            owner = db.session.get(User, user_ids[0])
+            adventure = GameManager(owner).create_adventure('Popular adventure')
+            adventure.add_players(user_ids[1:])
+            for _ in range(args.turns):
+                adventure.update_story_state({'story': passage(rng)})
+            db.session.commit()
+            adventure_id = adventure.id
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_ids[1])
+            session['_fresh'] = True
+        path = f'/adventure/{adventure_id}'
+
+        etag = client.get(path).headers['ETag']
+        cases = {
+            'render_every_time': (lambda: clear_caches(app), {}),
+            'page_cache_hit': (lambda: None, {}),
+            'conditional_304': (lambda: None, {'If-None-Match': etag}),
+        }
+        for case, (prepare, headers) in cases.items():
+            def refresh():
+                prepare()
+                return client.get(path, headers=headers)
+
+            response = refresh()
+            stats = summarize(time_calls(refresh, args.repeat))
+            results.append({'case': case, 'status': response.status_code,
+                            'db_queries': int(response.headers.get('X-DB-Queries', 0)),
+                            'p50_ms': stats['p50_ms'], 'p99_ms': stats['p99_ms']})
+    report('adventure_pages', results, args.output, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+## benchmarks/bench_availability.py
+"""
+Measures the availability index at scale: filter build time and size, false
+positive rate, and "is this name taken" latency against a plain indexed query.
+Free names are answered from the filter; taken names are confirmed in the
+database.
+
+Run with: python -m <package>.benchmarks.bench_availability [--users 1000000]
+"""
+import os
+import tempfile
+import time
+from ..models import db, User
+from ..availability import AvailabilityIndex
+from .harness import make_app, make_parser, report, summarize, time_calls
+
+def populate(count: int, batch_size: int = 50000):
+    for offset in range(0, count, batch_size):
+        db.session.execute(User.__table__.insert(), [
+            {'username': f'player{i}', 'email': f'player{i}@example.com', 'password_hash': 'x'}
+            for i in range(offset, min(offset + batch_size, count))
+        ])
+        db.session.commit()
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--lookups', type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app('sqlite:///' + os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            populate(args.users)
+            index = AvailabilityIndex(app, capacity=args.users)
+            start = time.perf_counter()
+            index.rebuild()
+            build_seconds = time.perf_counter() - start
+
+            free = [f'newcomer{i}' for i in range(args.lookups)]
+            taken = [f'player{i * (args.users // args.lookups or 1)}' for i in range(args.lookups)]
+            false_positives = sum(1 for name in free if name in index.usernames)
+
+            def db_lookup(name):
+                return not db.session.query(db.exists().where(User.username == name)).scalar()
+
+            results = [{
+                'users': args.users,
+                'build_s': build_seconds,
+                'filter_bytes': len(index.usernames._bits),
+                'false_positive_rate': false_positives / len(free),
+            }]
+            for label, names in (('free', free), ('taken', taken)):
+                it = iter(names)
+                indexed = summarize(time_calls(lambda: index.is_username_available(next(it)), len(names)))
+                it = iter(names)
+                plain = summarize(time_calls(lambda: db_lookup(next(it)), len(names)))
+                results.append({'names': label, 'index_p50_ms': indexed['p50_ms'], 'index_p99_ms': indexed['p99_ms'],
+                                'db_p50_ms': plain['p50_ms'], 'db_p99_ms': plain['p99_ms']})
+            results.append(index.stats())
+    report('availability', results, args.output, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+## benchmarks/bench_chat_history.py
+"""
+Measures chat history page latency at increasing depths in a very large room,
+comparing keyset pagination with OFFSET pagination.
+
+Run with: python -m <package>.benchmarks.bench_chat_history [--messages 1000000]
+"""
+import os
+import tempfile
+from datetime import datetime, timedelta
+from ..models import db, User, Adventure, ChatRoom, Message
+from ..chat import ChatManager, encode_cursor
+from .harness import make_app, make_parser, report, summarize, time_calls
+
+def populate(chat_room: ChatRoom, user: User, count: int, batch_size: int = 50000):
+    start = datetime(2024, 1, 1)
+    for offset in range(0, count, batch_size):
+        # Several messages share each timestamp to exercise the id tie-breaker
+        db.session.execute(Message.__table__.insert(), [
+            {'sender_id': user.id, 'chat_room_id': chat_room.id, 'text': f'message {i}',
+             'timestamp': start + timedelta(milliseconds=i // 3)}
+            for i in range(offset, min(offset + batch_size, count))
+        ])
+        db.session.commit()
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app('sqlite:///' + os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            user = User('bench', 'bench@example.com', 'password')
+            db.session.add(user)
+            db.session.commit()
+            adventure = Adventure('Benchmark', user)
+            db.session.add(adventure)
+            db.session.commit()
+            chat_room = ChatRoom(adventure)
+            db.session.add(chat_room)
+            db.session.commit()
+            populate(chat_room, user, args.messages)
+            manager = ChatManager(chat_room)
+
+            for fraction in (0.0, 0.01, 0.5, 0.99):
+                depth = int(args.messages * fraction)
+                # Cursor pointing `depth` messages back from the newest one
+                anchor = chat_room.messages.order_by(Message.timestamp.desc(), Message.id.desc()).offset(depth).first()
+                cursor = encode_cursor(anchor) if depth else None
+                keyset = summarize(time_calls(lambda: manager.get_messages_page(cursor=cursor, limit=args.page_size),
+                                              args.repeat))
+                offset = summarize(time_calls(
+                    lambda: chat_room.messages.order_by(Message.timestamp.desc(), Message.id.desc())
+                    .offset(depth).limit(args.page_size).all(), args.repeat))
+                results.append({'messages': args.messages, 'depth': depth, 'keyset_p50_ms': keyset['p50_ms'],
+                                'keyset_p99_ms': keyset['p99_ms'], 'offset_p50_ms': offset['p50_ms']})
+    report('chat_history', results, args.output, args.compare)
+
+if __name__ == '__main__':
+    main()
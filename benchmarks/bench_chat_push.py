@@ -0,0 +1,73 @@
+## benchmarks/bench_chat_push.py
+"""
+Load test for chat push: connects thousands of simulated clients to chat rooms
+and measures the delay between publishing a message and each client receiving it.
+
+Run with: python -m <package>.benchmarks.bench_chat_push [--bus redis://localhost:6379]
+"""
+import threading
+import time
+from ..realtime import ChatHub, make_message_bus
+from .harness import make_parser, report, summarize
+
+class SimulatedClient:
+    def __init__(self, expected: int, done: threading.Event, counter: list, lock: threading.Lock):
+        self.latencies = []
+        self.expected = expected
+        self.done = done
+        self.counter = counter
+        self.lock = lock
+
+    def send(self, event: str, payload: dict):
+        self.latencies.append(time.time() - payload['sent_at'])
+        if len(self.latencies) == self.expected:
+            with self.lock:
+                self.counter[0] -= 1
+                if self.counter[0] == 0:
+                    self.done.set()
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument('--bus', default='memory://', help='Message bus URL.')
+    parser.add_argument('--clients', type=int, nargs='+', default=[1000, 5000, 10000])
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--messages', type=int, default=20, help='Messages published per room.')
+    parser.add_argument('--interval', type=float, default=0.01, help='Seconds between publishes.')
+    args = parser.parse_args()
+
+    results = []
+    for client_count in args.clients:
+        hub = ChatHub(make_message_bus(args.bus))
+        done = threading.Event()
+        lock = threading.Lock()
+        counter = [client_count]
+        clients = []
+        for i in range(client_count):
+            client = SimulatedClient(args.messages, done, counter, lock)
+            hub.join(i % args.rooms, client)
+            clients.append(client)
+        time.sleep(0.1)  # Let bus subscriptions settle
+
+        start = time.perf_counter()
+        for n in range(args.messages):
+            for room in range(args.rooms):
+                hub.publish(room, {'text': f'message {n}', 'sent_at': time.time()})
+            time.sleep(args.interval)
+        delivered = done.wait(timeout=120)
+        elapsed = time.perf_counter() - start
+
+        stats = summarize([latency for client in clients for latency in client.latencies])
+        results.append({
+            'bus': args.bus,
+            'clients': client_count,
+            'rooms': args.rooms,
+            'complete': delivered,
+            'deliveries_per_s': stats['count'] / elapsed,
+            'p50_ms': stats['p50_ms'],
+            'p95_ms': stats['p95_ms'],
+            'p99_ms': stats['p99_ms'],
+        })
+    report('chat_push', results, args.output, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+## benchmarks/bench_chat_writes.py
+"""
+Compares chat message throughput and acknowledgement latency with one commit
+per message against the group-commit BufferedMessageWriter.
+
+Run with: python -m <package>.benchmarks.bench_chat_writes
+"""
+import os
+import tempfile
+import threading
+import time
+from ..models import db, User, Adventure, ChatRoom
+from ..chat import ChatManager
+from ..chat_writer import BufferedMessageWriter
+from .harness import make_app, make_parser, report, summarize
+
+def run(app, room_id: int, user_id: int, threads: int, per_thread: int) -> tuple:
+    latencies = []
+    lock = threading.Lock()
+
+    def poster():
+        with app.app_context():
+            manager = ChatManager(ChatRoom.query.get(room_id))
+            user = User.query.get(user_id)
+            samples = []
+            for i in range(per_thread):
+                start = time.perf_counter()
+                manager.post_message(user, f'message {i}')
+                samples.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(samples)
+
+    workers = [threading.Thread(target=poster) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return latencies, time.perf_counter() - start
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--per-thread', type=int, default=100)
+    parser.add_argument('--max-rows', type=int, default=100)
+    parser.add_argument('--max-delay-ms', type=float, default=5)
+    args = parser.parse_args()
+
+    results = []
+    for mode in ('commit_per_message', 'group_commit'):
+        for threads in args.threads:
+            with tempfile.TemporaryDirectory() as tmp:
+                # Every poster holds a connection for its whole run, plus one for the writer
+                app = make_app('sqlite:///' + os.path.join(tmp, 'bench.db'),
+                               SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'timeout': 30}, 'pool_size': threads + 2})
+                with app.app_context():
+                    user = User('bench', 'bench@example.com', 'password')
+                    db.session.add(user)
+                    db.session.commit()
+                    adventure = Adventure('Benchmark', user)
+                    db.session.add(adventure)
+                    db.session.commit()
+                    room = ChatRoom(adventure)
+                    db.session.add(room)
+                    db.session.commit()
+                    room_id, user_id = room.id, user.id
+                writer = None
+                if mode == 'group_commit':
+                    writer = BufferedMessageWriter(app, max_rows=args.max_rows, max_delay=args.max_delay_ms / 1000)
+                    app.extensions['chat_writer'] = writer
+                latencies, elapsed = run(app, room_id, user_id, threads, args.per_thread)
+                stats = summarize(latencies)
+                row = {'mode': mode, 'threads': threads, 'messages_per_s': stats['count'] / elapsed,
+                       'ack_p50_ms': stats['p50_ms'], 'ack_p99_ms': stats['p99_ms']}
+                if writer is not None:
+                    writer_stats = writer.stats()
+                    row['mean_batch_size'] = writer_stats['mean_batch_size']
+                    row['commit_p50_ms'] = writer_stats['commit_p50_ms']
+                results.append(row)
+    report('chat_writes', results, args.output, args.compare)
+
+if __name__ == '__main__':
+    main()
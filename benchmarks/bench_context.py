@@ -0,0 +1,64 @@
+## benchmarks/bench_context.py
+"""
+Measures prompt size and generation latency as an adventure grows to
+hundreds of turns, sending either the whole story so far or the context
+builder's budgeted prompt (rolling summary plus recent turns). The fake
+model's latency grows with prompt length, as a real model's does.
+
+Run with: python -m <package>.benchmarks.bench_context
+"""
+from ..api import FakeOpenAIAdapter, generate_adventure_story
+from ..context_builder import build_prompt, format_turn
+from ..model_client import estimate_tokens
+from ..models import db, User, Adventure, StoryEvent
+from .harness import make_app, make_parser, report, summarize, time_calls
+
+def full_history_prompt(adventure: Adventure, player_prompt: str) -> str:
+    events = StoryEvent.query.filter_by(adventure_id=adventure.id).order_by(StoryEvent.seq)
+    return '\n'.join([format_turn(event.payload) for event in events] + [f"Player: {player_prompt}\n"])
+
+STRATEGIES = {
+    'full_history': full_history_prompt,
+    'context_builder': build_prompt,
+}
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument('--turns', default='10,100,300,500', help='Comma-separated adventure lengths to measure at.')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--prompt-latency', type=float, default=0.02,
+                        help='Fake model seconds per 1000 prompt tokens.')
+    args = parser.parse_args()
+
+    checkpoints = sorted(int(turns) for turns in args.turns.split(','))
+    fill_adapter = FakeOpenAIAdapter(latency=0)
+    model = FakeOpenAIAdapter(latency=0, prompt_latency=args.prompt_latency)
+    player_prompt = 'I light a torch and follow the dragon deeper into the caves'
+    results = []
+    app = make_app()
+    with app.app_context():
+        owner = User('owner', 'owner@example.com', 'unused')
+        db.session.add(owner)
+        db.session.commit()
+        adventure = Adventure('Long adventure', owner)
+        db.session.add(adventure)
+        db.session.commit()
+
+        played = 0
+        for checkpoint in checkpoints:
+            # Play real turns so the summary is maintained exactly as in production
+            for turn in range(played, checkpoint):
+                generate_adventure_story(adventure.id, f'Turn {turn}: I search the room for a way out', fill_adapter)
+            played = checkpoint
+            for strategy, make_prompt in STRATEGIES.items():
+                prompt = make_prompt(adventure, player_prompt)
+                build = summarize(time_calls(lambda: make_prompt(adventure, player_prompt), args.repeat))
+                generate = summarize(time_calls(lambda: model.generate_story(make_prompt(adventure, player_prompt)),
+                                                max(args.repeat // 4, 1)))
+                results.append({'strategy': strategy, 'turns': checkpoint,
+                                'build_p50_ms': build['p50_ms'], 'generate_p50_ms': generate['p50_ms'],
+                                'prompt_tokens': estimate_tokens(prompt)})
+    report('context', results, args.output, args.compare)
+
+if __name__ == '__main__':
+    main()
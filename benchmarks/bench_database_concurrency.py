@@ -0,0 +1,115 @@
+## benchmarks/bench_database_concurrency.py
+"""
+Measures chat read and write throughput with concurrent readers and writers
+on SQLite, comparing the default rollback journal with WAL mode
+(synchronous=NORMAL) and with reads routed to a replica.
+
+Run with: python -m <package>.benchmarks.bench_database_concurrency
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+from flask import g
+from sqlalchemy import insert
+from ..models import db, User, Adventure, ChatRoom, Message
+from ..chat import ChatManager
+from .harness import make_app, make_parser, report, summarize
+
+MODES = {
+    'rollback_journal': {'SQLITE_WAL': False, 'SQLITE_SYNCHRONOUS': 'FULL'},
+    'wal': {'SQLITE_WAL': True, 'SQLITE_SYNCHRONOUS': 'NORMAL'},
+    'wal_replica': {'SQLITE_WAL': True, 'SQLITE_SYNCHRONOUS': 'NORMAL'},
+}
+
+def seed(app, messages: int) -> tuple:
+    with app.app_context():
+        user = User('bench', 'bench@example.com', 'password')
+        db.session.add(user)
+        db.session.commit()
+        adventure = Adventure('Benchmark', user)
+        db.session.add(adventure)
+        db.session.commit()
+        room = ChatRoom(adventure)
+        db.session.add(room)
+        db.session.commit()
+        db.session.execute(insert(Message), [
+            {'sender_id': user.id, 'chat_room_id': room.id, 'text': f'Seed message {i}'} for i in range(messages)
+        ])
+        db.session.commit()
+        return room.id, user.id
+
+def run(app, room_id: int, user_id: int, readers: int, writers: int, duration: float, replica: bool) -> dict:
+    samples = {'read': [], 'write': []}
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(kind: str):
+        local, failures = [], 0
+        with app.app_context():
+            g.use_replica = replica and kind == 'read'
+            manager = ChatManager(db.session.get(ChatRoom, room_id))
+            user = db.session.get(User, user_id)
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    if kind == 'read':
+                        manager.get_recent_messages(50)
+                        db.session.rollback()
+                    else:
+                        manager.post_message(user, 'Concurrent message')
+                except Exception:
+                    db.session.rollback()
+                    failures += 1
+                    continue
+                local.append(time.perf_counter() - start)
+        with lock:
+            samples[kind].extend(local)
+            errors.append(failures)
+
+    threads = [threading.Thread(target=worker, args=('read',)) for _ in range(readers)]
+    threads += [threading.Thread(target=worker, args=('write',)) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    reads, writes = summarize(samples['read']), summarize(samples['write'])
+    return {
+        'reads_per_s': reads['count'] / duration,
+        'writes_per_s': writes['count'] / duration,
+        'read_p99_ms': reads.get('p99_ms', 0.0),
+        'write_p99_ms': writes.get('p99_ms', 0.0),
+        'errors': sum(errors),
+    }
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument('--readers', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=3.0)
+    parser.add_argument('--messages', type=int, default=1000, help='Messages in the room before the run.')
+    args = parser.parse_args()
+
+    results = []
+    for mode, config in MODES.items():
+        for readers in args.readers:
+            with tempfile.TemporaryDirectory() as tmp:
+                primary = os.path.join(tmp, 'primary.db')
+                app = make_app('sqlite:///' + primary, **config)
+                room_id, user_id = seed(app, args.messages)
+                if mode == 'wal_replica':
+                    # A static copy stands in for a streaming replica
+                    replica = os.path.join(tmp, 'replica.db')
+                    with app.app_context():
+                        db.session.execute(db.text('PRAGMA wal_checkpoint(TRUNCATE)'))
+                    shutil.copyfile(primary, replica)
+                    app = make_app('sqlite:///' + primary, DATABASE_REPLICA_URL='sqlite:///' + replica, **config)
+                row = {'mode': mode, 'readers': readers, 'writers': args.writers}
+                row.update(run(app, room_id, user_id, readers, args.writers, args.duration, mode == 'wal_replica'))
+                results.append(row)
+    report('database_concurrency', results, args.output, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+## benchmarks/bench_export.py
+"""
+Measures adventure export and import throughput and peak memory as the chat
+history grows. Each phase runs in a fresh process so its peak RSS is its
+own; a naive export that loads every message through the ORM is included
+for comparison.
+
+Run with: python -m <package>.benchmarks.bench_export
+"""
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from ..database import init_db
+from ..main import create_app
+from ..models import db, User, Adventure, ChatRoom, Message, StoryEvent, adventure_players
+from .bench_serialization import passage
+from .harness import make_parser, report
+
+PACKAGE = __package__.rsplit('.', 1)[0]
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PHASE_SCRIPT = f'''
+import json, resource, sys, time
+from {PACKAGE}.main import create_app
+from {PACKAGE}.export import export_adventure, import_adventure
+from {PACKAGE}.models import db, Adventure
+phase, uri, path, adventure_id = json.loads(sys.argv[1])
+app = create_app({{'SQLALCHEMY_DATABASE_URI': uri, 'SESSION_STORE_ENABLED': False}})
+with app.app_context():
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    rows = 0
+    if phase == 'export':
+        with open(path, 'w', encoding='utf-8') as output:
+            for line in export_adventure(adventure_id):
+                output.write(line)
+                rows += 1
+    elif phase == 'naive_export':
+        adventure = db.session.get(Adventure, adventure_id)
+        messages = [message.to_dict() for message in adventure.chat_room.messages.all()]
+        with open(path, 'w', encoding='utf-8') as output:
+            for message in messages:
+                output.write(json.dumps(message) + '\\n')
+                rows += 1
+    else:
+        with open(path, encoding='utf-8') as lines:
+            _, counts = import_adventure(lines)
+        rows = sum(counts.values())
+    elapsed = time.perf_counter() - start
+print(json.dumps({{'rows': rows, 'elapsed': elapsed, 'baseline_kb': baseline,
+                  'peak_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}}))
+'''
+
+def populate(uri: str, messages: int, users: int, turns: int, chunk: int = 10000) -> int:
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'SESSION_STORE_ENABLED': False})
+    rng = random.Random(0)
+    with app.app_context():
+        init_db()
+        db.session.execute(db.insert(User), [
+            {'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'unused'} for i in range(users)
+        ])
+        user_ids = list(db.session.scalars(db.select(User.id).order_by(User.id)))
+        adventure = Adventure('Exported adventure', db.session.get(User, user_ids[0]))
+        db.session.add(adventure)
+        db.session.flush()
+        room = ChatRoom(adventure)
+        db.session.add(room)
+        db.session.flush()
+        db.session.execute(db.insert(adventure_players),
+                           [{'adventure_id': adventure.id, 'user_id': user_id} for user_id in user_ids])
+        db.session.execute(db.insert(StoryEvent), [
+            {'adventure_id': adventure.id, 'seq': seq, 'payload': {'story': passage(rng)}} for seq in range(1, turns + 1)
+        ])
+        start = datetime(2024, 1, 1)
+        for offset in range(0, messages, chunk):
+            db.session.execute(db.insert(Message), [
+                {'chat_room_id': room.id, 'sender_id': rng.choice(user_ids), 'text': f'Message number {i} in the tavern',
+                 'timestamp': start + timedelta(seconds=i)} for i in range(offset, min(offset + chunk, messages))
+            ])
+        db.session.commit()
+        return adventure.id
+
+def run_phase(phase: str, uri: str, path: str, adventure_id: int) -> dict:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(PACKAGE_DIR),
+                                                                       os.environ.get('PYTHONPATH')])))
+    result = subprocess.run([sys.executable, '-c', PHASE_SCRIPT, json.dumps([phase, uri, path, adventure_id])],
+                            env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument('--messages', default='100000,400000', help='Comma-separated chat history sizes.')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--turns', type=int, default=200)
+    parser.add_argument('--skip-naive', action='store_true', help='Skip the ORM export, which needs memory for every message.')
+    args = parser.parse_args()
+
+    phases = ['export', 'import'] + ([] if args.skip_naive else ['naive_export'])
+    results = []
+    for messages in (int(size) for size in args.messages.split(',')):
+        with tempfile.TemporaryDirectory() as tmp:
+            uri = 'sqlite:///' + os.path.join(tmp, 'export.db')
+            adventure_id = populate(uri, messages, args.users, args.turns)
+            for phase in phases:
+                path = os.path.join(tmp, 'adventure.ndjson' if phase != 'naive_export' else 'naive.ndjson')
+                stats = run_phase(phase, uri, path, adventure_id)
+                results.append({'phase': phase, 'messages': messages,
+                                'rows_per_s': stats['rows'] / stats['elapsed'],
+                                'peak_rss_mb': stats['peak_kb'] / 1024,
+                                'rss_growth_mb': (stats['peak_kb'] - stats['baseline_kb']) / 1024,
+                                'file_mb': os.path.getsize(path) / 1e6})
+    report('export', results, args.output, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+## benchmarks/bench_load.py
+"""
+End-to-end load test: simulated players register, log in, create or join an
+adventure, chat and play through the real views, with a deterministic fake
+model standing in for the completion API. Reports throughput and latency
+percentiles per endpoint.
+
+Runs in-process against a temporary SQLite database by default; pass
+--database-uri to use a local Postgres instead.
+
+Run with: python -m <package>.benchmarks.bench_load
+"""
+import os
+import re
+import tempfile
+import threading
+import time
+from jinja2 import DictLoader
+from ..database import init_db
+from ..main import create_app
+from .harness import make_parser, report, summarize
+
+# The views render these in place of the site templates; the layout consumes flashes like a real one
+TEMPLATES = {
+    'layout.html': '<html><body>{% for category, message in get_flashed_messages(with_categories=true) %}'
+                   '<p class="{{ category }}">{{ message }}</p>{% endfor %}{% block content %}{% endblock %}'
+                   '</body></html>',
+    'index.html': '{% extends "layout.html" %}',
+    'register.html': '{% extends "layout.html" %}{% block content %}{{ form.hidden_tag() }}{% endblock %}',
+    'login.html': '{% extends "layout.html" %}{% block content %}{{ form.hidden_tag() }}{% endblock %}',
+    'create_adventure.html': '{% extends "layout.html" %}{% block content %}{{ form.hidden_tag() }}{% endblock %}',
+    'view_adventure.html': '{% extends "layout.html" %}{% block content %}<h1>{{ adventure.title }}</h1>'
+                           '<p>{{ adventure.story_state.get("story", "") }}</p>'
+                           '<p>{{ adventure.player_count }} players</p>{% endblock %}',
+    'adventure_chat.html': '{% extends "layout.html" %}{% block content %}'
+                           '{% for message in messages %}<p>{{ message.text }}</p>{% endfor %}'
+                           '{{ next_cursor or "" }}{% endblock %}',
+    'play_adventure.html': '{% extends "layout.html" %}{% block content %}{{ form.hidden_tag() }}'
+                           '{% if job %}<div id="job">{{ job.id }}</div>{% endif %}{% endblock %}',
+}
+
+JOB_ID = re.compile(r'<div id="job">([0-9a-f]+)</div>')
+ADVENTURE_ID = re.compile(r'/adventure/(\d+)')
+
+def make_load_app(database_uri: str, latency: float, job_workers: int):
+    """
+    Builds the application against the given database, with the fake story
+    adapter and minimal templates.
+    """
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_uri,
+        'WTF_CSRF_ENABLED': False,
+        'STORY_ADAPTER': 'fake',
+        'FAKE_ADAPTER_LATENCY': latency,
+        'STORY_JOB_WORKERS': job_workers,
+        'STORY_JOB_QUEUE_SIZE': 1024,
+    })
+    app.jinja_loader = DictLoader(TEMPLATES)
+    with app.app_context():
+        init_db()
+    return app
+
+class Player:
+    """
+    One simulated player with its own session cookie.
+    """
+    def __init__(self, app, index: int, samples: dict, lock: threading.Lock):
+        self.client = app.test_client()
+        self.index = index
+        self.samples = samples
+        self.lock = lock
+
+    def request(self, name: str, method: str, path: str, expected=(200, 302), **kwargs):
+        start = time.perf_counter()
+        response = self.client.open(path, method=method, **kwargs)
+        elapsed = time.perf_counter() - start
+        if response.status_code not in expected:
+            raise RuntimeError(f"{method} {path} returned {response.status_code}")
+        with self.lock:
+            self.samples.setdefault(name, []).append(elapsed)
+        return response
+
+    def record(self, name: str, elapsed: float):
+        with self.lock:
+            self.samples.setdefault(name, []).append(elapsed)
+
+    def register_and_login(self):
+        username, password = f'player{self.index}', 'correct horse battery'
+        self.request('register', 'POST', '/register', data={
+            'username': username, 'email': f'{username}@example.com',
+            'password': password, 'confirm_password': password,
+        })
+        self.request('login', 'POST', '/login', data={'username': username, 'password': password})
+
+    def create_adventure(self) -> int:
+        response = self.request('create_adventure', 'POST', '/adventure/create',
+                                data={'title': f'Adventure of player {self.index}'})
+        return int(ADVENTURE_ID.search(response.headers['Location']).group(1))
+
+    def join_adventure(self, adventure_id: int):
+        self.request('join_adventure', 'GET', f'/adventure/{adventure_id}/join')
+
+    def chat(self, adventure_id: int, messages: int):
+        for i in range(messages):
+            self.request('post_chat', 'POST', f'/adventure/{adventure_id}/chat',
+                         data={'message': f'Player {self.index} says hello #{i}'})
+        self.request('chat_history', 'GET', f'/adventure/{adventure_id}/chat/messages?limit=50')
+
+    def play(self, adventure_id: int, turns: int, poll_interval: float):
+        for turn in range(turns):
+            start = time.perf_counter()
+            response = self.request('play', 'POST', f'/adventure/{adventure_id}/play',
+                                    data={'prompt': f'Player {self.index} tries move number {turn} in the dark forest'})
+            match = JOB_ID.search(response.get_data(as_text=True))
+            if match is None:
+                raise RuntimeError("The story job was not accepted")
+            while True:
+                status = self.request('job_status', 'GET', f'/adventure/{adventure_id}/jobs/{match.group(1)}').json
+                if status['status'] in ('succeeded', 'failed'):
+                    break
+                time.sleep(poll_interval)
+            if status['status'] == 'failed':
+                raise RuntimeError(f"Story job failed: {status['error']}")
+            self.record('story_turn', time.perf_counter() - start)
+            self.request('view_adventure', 'GET', f'/adventure/{adventure_id}')
+
+def run(app, players: int, group_size: int, messages: int, turns: int, poll_interval: float) -> tuple:
+    samples = {}
+    lock = threading.Lock()
+    adventures = {}
+    created = {group: threading.Event() for group in range(0, players, group_size)}
+    errors = []
+
+    def simulate(index: int):
+        player = Player(app, index, samples, lock)
+        try:
+            player.register_and_login()
+            group = index - index % group_size
+            if index == group:
+                adventures[group] = player.create_adventure()
+                created[group].set()
+            else:
+                if not created[group].wait(60):
+                    raise RuntimeError("Timed out waiting for the adventure to be created")
+                player.join_adventure(adventures[group])
+            player.chat(adventures[group], messages)
+            player.play(adventures[group], turns, poll_interval)
+        except Exception as e:
+            created.get(index, threading.Event()).set()
+            with lock:
+                errors.append(f'player {index}: {e}')
+
+    threads = [threading.Thread(target=simulate, args=(i,)) for i in range(players)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start, errors
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument('--database-uri', help='SQLAlchemy URI of an empty database; defaults to a temporary SQLite file.')
+    parser.add_argument('--players', type=int, default=20)
+    parser.add_argument('--group-size', type=int, default=4, help='Players per adventure.')
+    parser.add_argument('--messages', type=int, default=5, help='Chat messages per player.')
+    parser.add_argument('--turns', type=int, default=3, help='Story turns per player.')
+    parser.add_argument('--latency', type=float, default=0.2, help='Fake model latency in seconds.')
+    parser.add_argument('--job-workers', type=int, default=4)
+    parser.add_argument('--poll-interval', type=float, default=0.02)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_uri = args.database_uri or 'sqlite:///' + os.path.join(tmp, 'load.db')
+        app = make_load_app(database_uri, args.latency, args.job_workers)
+        samples, elapsed, errors = run(app, args.players, args.group_size, args.messages, args.turns,
+                                       args.poll_interval)
+
+    for error in errors:
+        print(f'error: {error}')
+    results = []
+    for endpoint, durations in sorted(samples.items()):
+        stats = summarize(durations)
+        results.append({'endpoint': endpoint, 'count': stats['count'], 'per_s': stats['count'] / elapsed,
+                        'p50_ms': stats['p50_ms'], 'p95_ms': stats['p95_ms'], 'p99_ms': stats['p99_ms']})
+    total = sum(len(durations) for name, durations in samples.items() if name != 'story_turn')
+    results.append({'endpoint': 'all_requests', 'count': total, 'per_s': total / elapsed, 'errors': len(errors)})
+    report('load', results, args.output, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+## benchmarks/bench_managers.py
+"""
+Microbenchmarks for the ChatManager and GameManager operations behind the
+chat and adventure views. Story-state serialization is covered by
+bench_serialization.
+
+Run with: python -m <package>.benchmarks.bench_managers
+"""
+import os
+import tempfile
+from sqlalchemy import insert
+from ..models import db, User, Adventure, Message
+from ..chat import ChatManager
+from ..game_manager import GameManager
+from .harness import make_app, make_parser, report, summarize, time_calls
+
+def seed_users(count: int) -> list:
+    # Bulk insert with a placeholder hash; password hashing is measured by bench_password_hashing
+    db.session.execute(insert(User), [
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'unused'} for i in range(count)
+    ])
+    db.session.commit()
+    return list(db.session.scalars(db.select(User.id).order_by(User.id)))
+
+def row(manager: str, operation: str, samples: list) -> dict:
+    stats = summarize(samples)
+    return {'manager': manager, 'operation': operation, 'ops_per_s': stats['count'] / sum(samples),
+            'p50_ms': stats['p50_ms'], 'p99_ms': stats['p99_ms']}
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument('--repeat', type=int, default=500)
+    parser.add_argument('--history', type=int, default=10000, help='Chat messages in the room before reads.')
+    parser.add_argument('--batch', type=int, default=100, help='Players per add_players/remove_players call.')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app('sqlite:///' + os.path.join(tmp, 'bench.db'))
+        with app.test_request_context():
+            user_ids = seed_users(max(args.batch, args.repeat) + 1)
+            owner = db.session.get(User, user_ids[0])
+            game_manager = GameManager(owner)
+
+            results.append(row('GameManager', 'create_adventure', time_calls(
+                lambda: game_manager.create_adventure('Benchmark adventure'), args.repeat)))
+            adventure = game_manager.create_adventure('Benchmark adventure')
+
+            players = iter(db.session.scalars(db.select(User).where(User.id.in_(user_ids[1:args.repeat + 1]))).all())
+            results.append(row('GameManager', 'join_adventure', time_calls(
+                lambda: game_manager.join_adventure(adventure.id, next(players)), args.repeat)))
+
+            bulk = Adventure('Bulk membership', owner)
+            db.session.add(bulk)
+            db.session.commit()
+            batch = user_ids[1:args.batch + 1]
+            samples = []
+            for _ in range(max(1, args.repeat // 10)):
+                samples += time_calls(lambda: game_manager.add_players(bulk.id, batch), 1)
+                game_manager.remove_players(bulk.id, batch)
+            results.append(row('GameManager', f'add_players[{args.batch}]', samples))
+
+            chat_manager = ChatManager(adventure.chat_room)
+            results.append(row('GameManager', 'send_chat_message', time_calls(
+                lambda: game_manager.send_chat_message(adventure.chat_room.id, owner, 'Hello from the manager'),
+                args.repeat)))
+            results.append(row('ChatManager', 'post_message', time_calls(
+                lambda: chat_manager.post_message(owner, 'Hello from the chat manager'), args.repeat)))
+
+            remaining = args.history - 2 * args.repeat
+            for start in range(0, max(0, remaining), 1000):
+                db.session.execute(insert(Message), [
+                    {'sender_id': owner.id, 'chat_room_id': adventure.chat_room.id, 'text': f'History message {i}'}
+                    for i in range(start, min(start + 1000, remaining))
+                ])
+            db.session.commit()
+
+            results.append(row('ChatManager', 'get_recent_messages', time_calls(
+                lambda: chat_manager.get_recent_messages(), args.repeat)))
+            _, cursor = chat_manager.get_messages_page()
+            results.append(row('ChatManager', 'get_messages_page', time_calls(
+                lambda: chat_manager.get_messages_page(cursor=cursor), args.repeat)))
+    report('managers', results, args.output, args.compare)
+
+if __name__ == '__main__':
+    main()
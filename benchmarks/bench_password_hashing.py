@@ -0,0 +1,86 @@
+## benchmarks/bench_password_hashing.py
+"""
+Measures login throughput and the latency of other requests during a login
+burst, hashing inline on request threads versus on the bounded process pool.
+
+Run with: python -m <package>.benchmarks.bench_password_hashing
+"""
+import json
+import threading
+import time
+from ..hashing import PasswordHasher, HashingBusy
+from .harness import make_parser, report, summarize
+
+def other_request():
+    # Stand-in for a cheap CPU-bound page render
+    payload = {'messages': [{'id': i, 'text': f'message {i}'} for i in range(200)]}
+    json.loads(json.dumps(payload))
+
+def run(hasher: PasswordHasher, password_hash: str, login_threads: int, other_threads: int, duration: float) -> dict:
+    stop = threading.Event()
+    lock = threading.Lock()
+    logins, others = [], []
+    rejected = [0]
+
+    def login_loop():
+        samples = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                hasher.verify(password_hash, 'correct horse battery staple')
+                samples.append(time.perf_counter() - start)
+            except HashingBusy:
+                with lock:
+                    rejected[0] += 1
+                time.sleep(0.001)
+        with lock:
+            logins.extend(samples)
+
+    def other_loop():
+        samples = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            other_request()
+            samples.append(time.perf_counter() - start)
+            time.sleep(0.002)
+        with lock:
+            others.extend(samples)
+
+    threads = [threading.Thread(target=login_loop) for _ in range(login_threads)]
+    threads += [threading.Thread(target=other_loop) for _ in range(other_threads)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    login_stats, other_stats = summarize(logins), summarize(others)
+    return {
+        'logins_per_s': login_stats['count'] / duration,
+        'login_p99_ms': login_stats.get('p99_ms', 0.0),
+        'rejected': rejected[0],
+        'other_p50_ms': other_stats.get('p50_ms', 0.0),
+        'other_p99_ms': other_stats.get('p99_ms', 0.0),
+    }
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 2, 4], help='0 hashes inline.')
+    parser.add_argument('--queue-size', type=int, default=32)
+    parser.add_argument('--login-threads', type=int, default=16)
+    parser.add_argument('--other-threads', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args()
+
+    results = []
+    for workers in args.workers:
+        hasher = PasswordHasher(workers=workers, queue_size=args.queue_size)
+        password_hash = hasher.hash('correct horse battery staple')
+        row = {'workers': workers}
+        row.update(run(hasher, password_hash, args.login_threads, args.other_threads, args.duration))
+        hasher.shutdown()
+        results.append(row)
+    report('password_hashing', results, args.output, args.compare)
+
+if __name__ == '__main__':
+    main()
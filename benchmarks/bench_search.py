@@ -0,0 +1,108 @@
+## benchmarks/bench_search.py
+"""
+Measures searching one adventure's chat history on a large corpus: scanning
+the room's messages in Python against the full-text index. Also reports how
+long init-search takes to build the index and what indexing adds to posting
+a message.
+
+Run with: python -m <package>.benchmarks.bench_search
+"""
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from ..chat import ChatManager
+from ..database import init_db
+from ..main import create_app
+from ..models import db, User, Adventure, ChatRoom, Message
+from ..search import get_search_index
+from .bench_serialization import VOCABULARY
+from .harness import make_parser, report, summarize, time_calls
+
+QUERIES = ('dragon', 'cursed village', 'goblins scheme', 'lone knight dawn')
+
+def populate(messages: int, adventures: int, users: int, chunk: int = 20000) -> list:
+    rng = random.Random(0)
+    db.session.execute(db.insert(User), [
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'unused'} for i in range(users)
+    ])
+    user_ids = list(db.session.scalars(db.select(User.id).order_by(User.id)))
+    owner = db.session.get(User, user_ids[0])
+    room_ids = []
+    for i in range(adventures):
+        adventure = Adventure(f'Adventure {i}', owner)
+        db.session.add(adventure)
+        db.session.flush()
+        room = ChatRoom(adventure)
+        db.session.add(room)
+        db.session.flush()
+        room_ids.append(room.id)
+    start = datetime(2024, 1, 1)
+    for offset in range(0, messages, chunk):
+        db.session.execute(db.insert(Message), [
+            {'chat_room_id': room_ids[i % adventures], 'sender_id': rng.choice(user_ids),
+             'text': ' '.join(rng.choice(VOCABULARY) for _ in range(rng.randint(4, 16))),
+             'timestamp': start + timedelta(seconds=i)} for i in range(offset, min(offset + chunk, messages))
+        ])
+    db.session.commit()
+    return list(db.session.scalars(db.select(Adventure.id).order_by(Adventure.id)))
+
+def scan_search(adventure: Adventure, query: str, limit: int = 20) -> list:
+    """
+    Pages through the room's whole history and matches in Python, as before.
+    """
+    terms = query.lower().split()
+    manager = ChatManager(adventure.chat_room)
+    hits, cursor = [], None
+    while True:
+        messages, cursor = manager.get_messages_page(cursor=cursor, limit=500)
+        hits += [message for message in messages if all(term in message.text.lower() for term in terms)]
+        if cursor is None:
+            return hits[:limit]
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--adventures', type=int, default=50)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--scan-repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'search.db'),
+                          'SESSION_STORE_ENABLED': False})
+        with app.app_context():
+            init_db()
+            adventure_ids = populate(args.messages, args.adventures, args.users)
+            adventure = db.session.get(Adventure, adventure_ids[0])
+            sender = db.session.get(User, 1)
+            search = get_search_index()
+
+            manager = ChatManager(adventure.chat_room)
+            post = summarize(time_calls(lambda: manager.post_message(sender, 'the knight rides at dawn'), args.repeat))
+            results.append({'case': 'post_message/no_index', 'p50_ms': post['p50_ms'], 'p99_ms': post['p99_ms']})
+
+            start = time.perf_counter()
+            counts = search.rebuild()
+            elapsed = time.perf_counter() - start
+            results.append({'case': 'init_search', 'rows': counts['message'] + counts['story'],
+                            'seconds': elapsed, 'rows_per_s': counts['message'] / elapsed})
+
+            post = summarize(time_calls(lambda: manager.post_message(sender, 'the knight rides at dawn'), args.repeat))
+            results.append({'case': 'post_message/indexed', 'p50_ms': post['p50_ms'], 'p99_ms': post['p99_ms']})
+
+            for query in QUERIES:
+                hits = len(search.search(adventure.id, query)['results'])
+                scan = summarize(time_calls(lambda: scan_search(adventure, query), args.scan_repeat))
+                rng = random.Random(0)
+                indexed = summarize(time_calls(
+                    lambda: search.search(rng.choice(adventure_ids), query, page=rng.randint(1, 5)), args.repeat))
+                results.append({'case': f'search/{query}', 'hits': hits, 'scan_p50_ms': scan['p50_ms'],
+                                'fts_p50_ms': indexed['p50_ms'], 'fts_p99_ms': indexed['p99_ms']})
+    report('search', results, args.output, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+## benchmarks/bench_serialization.py
+"""
+Compares pickle with the versioned Serializer formats for story state.
+
+Run with: python -m <package>.benchmarks.bench_serialization
+"""
+import pickle
+import random
+from ..serialization import Serializer, msgpack, zstandard
+from .harness import make_parser, report, summarize, time_calls
+
+VOCABULARY = ('the hero wanders into a dark forest where an old dragon guards forgotten gold and whispers of '
+              'ancient magic echo through ruined halls while goblins scheme beneath crumbling towers as storms '
+              'gather over distant mountains and a lone knight rides toward the cursed village at dawn').split()
+
+def passage(rng: random.Random, words: int = 110) -> str:
+    # About one 150-token completion
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(words)).capitalize() + '.'
+
+def story_state(turns: int) -> dict:
+    rng = random.Random(turns)
+    passages = [passage(rng) for _ in range(turns)]
+    return {
+        'story': passages[-1],
+        'turns': [{'prompt': f'Turn {i}: what happens next?', 'story': text} for i, text in enumerate(passages)],
+    }
+
+def codecs() -> dict:
+    result = {
+        'pickle': (lambda v: pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL), pickle.loads),
+        'json': Serializer('json', 'none'),
+        'json+zlib': Serializer('json', 'zlib', compression_threshold=0),
+    }
+    if msgpack is not None:
+        result['msgpack'] = Serializer('msgpack', 'none')
+        result['msgpack+zlib'] = Serializer('msgpack', 'zlib', compression_threshold=0)
+    if zstandard is not None:
+        result['json+zstd'] = Serializer('json', 'zstd', compression_threshold=0)
+    return {name: codec if isinstance(codec, tuple) else (codec.dumps, codec.loads) for name, codec in result.items()}
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument('--turns', type=int, nargs='+', default=[1, 10, 100, 500])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    results = []
+    for turns in args.turns:
+        state = story_state(turns)
+        for name, (dumps, loads) in codecs().items():
+            blob = dumps(state)
+            encode = summarize(time_calls(lambda: dumps(state), args.repeat))
+            decode = summarize(time_calls(lambda: loads(blob), args.repeat))
+            results.append({
+                'turns': turns,
+                'codec': name,
+                'bytes': len(blob),
+                'encode_p50_ms': encode['p50_ms'],
+                'decode_p50_ms': decode['p50_ms'],
+            })
+    report('serialization', results, args.output, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+## benchmarks/bench_session_store.py
+"""
+Measures game session save/load throughput straight against the database
+and through the hot session store, then checks crash recovery: a separate
+process saves sessions for a while and either exits cleanly or is killed
+without running exit handlers, and the sessions left in the database are
+compared with the last state it saved.
+
+Exits non-zero when a clean exit or a write-through store loses an update,
+or a crashed write-behind store loses more than its flush interval's worth.
+
+Run with: python -m <package>.benchmarks.bench_session_store
+"""
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from ..database import init_db
+from ..game_manager import GameManager
+from ..main import create_app
+from ..models import db, User, Adventure, GameSession
+from ..session_store import SessionStore
+from .harness import make_parser, report, summarize, time_calls
+
+PACKAGE = __package__.rsplit('.', 1)[0]
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WRITER_SCRIPT = f'''
+import json, os, sys, time
+from {PACKAGE}.main import create_app
+from {PACKAGE}.game_manager import GameManager
+uri, durability, interval, duration, session_ids, exit_mode = json.loads(sys.argv[1])
+app = create_app({{'SQLALCHEMY_DATABASE_URI': uri, 'SESSION_STORE_ENABLED': True,
+                  'SESSION_STORE_DURABILITY': durability, 'SESSION_STORE_FLUSH_INTERVAL': interval}})
+with app.app_context():
+    manager = GameManager(None)
+    start = time.perf_counter()
+    updates = 0
+    while time.perf_counter() - start < duration:
+        manager.save_game_session(session_ids[updates % len(session_ids)], {{'seq': updates}})
+        updates += 1
+    print(json.dumps({{'updates': updates, 'elapsed': time.perf_counter() - start}}), flush=True)
+if exit_mode == 'crash':
+    os._exit(1)
+'''
+
+def create_sessions(app, count: int) -> list:
+    with app.app_context():
+        init_db()
+        owner = User('owner', 'owner@example.com', 'unused')
+        db.session.add(owner)
+        db.session.flush()
+        adventure = Adventure('Session adventure', owner)
+        db.session.add(adventure)
+        db.session.flush()
+        sessions = [GameSession(adventure) for _ in range(count)]
+        db.session.add_all(sessions)
+        db.session.commit()
+        return [session.id for session in sessions]
+
+def run_writer(uri: str, durability: str, interval: float, duration: float, session_ids: list, exit_mode: str) -> dict:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(PACKAGE_DIR),
+                                                                       os.environ.get('PYTHONPATH')])))
+    result = subprocess.run([sys.executable, '-c', WRITER_SCRIPT,
+                             json.dumps([uri, durability, interval, duration, session_ids, exit_mode])],
+                            env=env, capture_output=True, text=True)
+    if not result.stdout.strip():
+        raise RuntimeError(f"Writer process failed: {result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def lost_updates(app, session_ids: list, updates: int) -> tuple:
+    """
+    Compares the stored sessions with the last update the writer made to each.
+
+    :return: (stale sessions, most updates lost by one session)
+    """
+    stale, max_lost = 0, 0
+    with app.app_context():
+        stored = dict(db.session.execute(db.select(GameSession.id, GameSession.session_data)
+                                         .where(GameSession.id.in_(session_ids))).all())
+    for index, session_id in enumerate(session_ids):
+        if index >= updates:
+            continue
+        expected = updates - 1 - (updates - 1 - index) % len(session_ids)
+        seq = (stored.get(session_id) or {}).get('seq', -1)
+        if seq != expected:
+            stale += 1
+            max_lost = max(max_lost, (expected - seq) // len(session_ids))
+    return stale, max_lost
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--hot-sessions', type=int, default=20, help='Sessions receiving most of the traffic.')
+    parser.add_argument('--flush-interval', type=float, default=0.5)
+    parser.add_argument('--duration', type=float, default=2.0, help='Seconds the crash-test writer runs.')
+    args = parser.parse_args()
+
+    results = []
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        uri = 'sqlite:///' + os.path.join(tmp, 'sessions.db')
+        app = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'SESSION_STORE_ENABLED': False})
+        session_ids = create_sessions(app, args.sessions)
+        hot = session_ids[:args.hot_sessions]
+
+        stores = {
+            'database': None,
+            'write_through': SessionStore(app, flush_interval=args.flush_interval, durability='write_through'),
+            'write_behind': SessionStore(app, flush_interval=args.flush_interval, durability='write_behind'),
+        }
+        for mode, store in stores.items():
+            app.extensions['session_store'] = store
+            rng = random.Random(0)
+            with app.app_context():
+                manager = GameManager(None)
+
+                def operation():
+                    session_id = rng.choice(hot) if rng.random() < 0.9 else rng.choice(session_ids)
+                    state = manager.load_game_session(session_id)
+                    manager.save_game_session(session_id, dict(state, turn=state.get('turn', 0) + 1))
+
+                stats = summarize(time_calls(operation, args.repeat))
+                if store is not None:
+                    store.shutdown()
+            results.append({'case': f'load_save/{mode}', 'p50_ms': stats['p50_ms'], 'p99_ms': stats['p99_ms'],
+                            'ops_per_s': 1000 / stats['mean_ms']})
+        app.extensions.pop('session_store')
+
+        for durability in ('write_behind', 'write_through'):
+            for exit_mode in ('clean', 'crash'):
+                writer = run_writer(uri, durability, args.flush_interval, args.duration, session_ids, exit_mode)
+                stale, max_lost = lost_updates(app, session_ids, writer['updates'])
+                results.append({'case': f'recovery/{durability}/{exit_mode}', 'updates': writer['updates'],
+                                'stale_sessions': stale, 'max_updates_lost': max_lost})
+                rate = writer['updates'] / writer['elapsed'] / len(session_ids)
+                if stale and (exit_mode == 'clean' or durability == 'write_through'):
+                    failures.append(f'{durability}/{exit_mode} lost updates to {stale} sessions')
+                elif max_lost > rate * args.flush_interval * 2 + 1:
+                    failures.append(f'{durability}/{exit_mode} lost {max_lost} updates to one session, '
+                                    f'more than one flush interval allows')
+    report('session_store', results, args.output, args.compare)
+
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if failures:
+        sys.exit(1)
+    print('OK: no updates lost beyond the configured durability')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+## benchmarks/bench_startup.py
+"""
+Measures cold start: importing the application module and building the app,
+each in a fresh interpreter run with `python -X importtime`. Prints the
+slowest imports and exits non-zero when the median cold start exceeds the
+budget or a module that should load lazily is imported at startup.
+
+Run with: python -m <package>.benchmarks.bench_startup
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+from .harness import make_parser, report, summarize
+
+PACKAGE = __package__.rsplit('.', 1)[0]
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy dependencies only needed once a real model call is made
+LAZY_MODULES = ('openai', 'requests')
+
+STARTUP_SCRIPT = f'''
+import json, time
+start = time.perf_counter()
+from {PACKAGE}.main import create_app
+imported = time.perf_counter()
+create_app({{'SQLALCHEMY_DATABASE_URI': 'sqlite://'}})
+print(json.dumps({{'import': imported - start, 'create_app': time.perf_counter() - imported}}))
+'''
+
+def parse_importtime(stderr: str) -> dict:
+    """
+    Parses `-X importtime` output into {module: cumulative seconds}.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative) / 1e6
+    return modules
+
+def measure() -> tuple:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(PACKAGE_DIR),
+                                                                       os.environ.get('PYTHONPATH')])))
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT], env=env,
+                            capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - start
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    return elapsed, timings, parse_importtime(result.stderr)
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('STARTUP_BUDGET_MS', 1500)),
+                        help='Maximum median import + create_app time.')
+    parser.add_argument('--top', type=int, default=15, help='Slowest imports to print.')
+    args = parser.parse_args()
+
+    samples = {'process': [], 'import': [], 'create_app': []}
+    modules = {}
+    for _ in range(args.repeat):
+        elapsed, timings, modules = measure()
+        samples['process'].append(elapsed)
+        samples['import'].append(timings['import'])
+        samples['create_app'].append(timings['create_app'])
+
+    results = []
+    for phase, durations in samples.items():
+        stats = summarize(durations)
+        results.append({'phase': phase, 'p50_ms': stats['p50_ms'], 'p95_ms': stats['p95_ms'], 'max_ms': stats['max_ms']})
+    report('startup', results, args.output, args.compare)
+
+    print('== slowest imports (cumulative, last run)')
+    for name, cumulative in sorted(modules.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f'  {cumulative * 1000:8.1f} ms  {name}')
+
+    failures = []
+    cold_start = summarize([i + c for i, c in zip(samples['import'], samples['create_app'])])['p50_ms']
+    if cold_start > args.budget_ms:
+        failures.append(f'cold start {cold_start:.1f} ms exceeds the {args.budget_ms:.0f} ms budget')
+    for name in LAZY_MODULES:
+        if name in modules:
+            failures.append(f"'{name}' is imported at startup; it should load on first use")
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if failures:
+        sys.exit(1)
+    print(f'OK: cold start {cold_start:.1f} ms within the {args.budget_ms:.0f} ms budget')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+## benchmarks/bench_story_log.py
+"""
+Measures story write latency as adventures grow, comparing the append-only
+event log with rewriting the whole story history blob on every generation.
+
+Run with: python -m <package>.benchmarks.bench_story_log
+"""
+import os
+import random
+import tempfile
+from ..models import db, User, Adventure
+from .bench_serialization import passage
+from .harness import make_app, make_parser, report, summarize, time_calls
+
+def grow(adventure: Adventure, turns: int, rng: random.Random, legacy: bool):
+    history = list((adventure.legacy_story_state or {}).get('turns', []))
+    for _ in range(turns):
+        text = passage(rng)
+        if legacy:
+            history.append(text)
+            adventure.legacy_story_state = {'story': text, 'turns': history}
+        else:
+            adventure.update_story_state({'story': text})
+    db.session.commit()
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument('--lengths', type=int, nargs='+', default=[10, 100, 1000, 5000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app('sqlite:///' + os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            user = User('bench', 'bench@example.com', 'password')
+            db.session.add(user)
+            db.session.commit()
+            for mode in ('event_log', 'legacy_blob'):
+                adventure = Adventure('Benchmark', user)
+                db.session.add(adventure)
+                db.session.commit()
+                length = 0
+                for target in args.lengths:
+                    grow(adventure, target - length, rng, legacy=mode == 'legacy_blob')
+                    length = target
+                    samples = time_calls(lambda: grow(adventure, 1, rng, legacy=mode == 'legacy_blob'), args.repeat)
+                    length += args.repeat
+                    stats = summarize(samples)
+                    results.append({'mode': mode, 'story_length': target, 'write_p50_ms': stats['p50_ms'],
+                                    'write_p99_ms': stats['p99_ms']})
+    report('story_log', results, args.output, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+## benchmarks/harness.py
+import argparse
+import json
+import platform
+import time
+from flask import Flask
+from ..database import init_database, init_db
+
+def percentile(samples: list, pct: float) -> float:
+    """
+    Returns the nearest-rank percentile of a list of samples.
+
+    :param samples: The samples.
+    :param pct: The percentile, between 0 and 100.
+    :return: The percentile value, or 0.0 for an empty list.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+def summarize(samples: list) -> dict:
+    """
+    Summarizes durations given in seconds as milliseconds.
+    """
+    if not samples:
+        return {'count': 0}
+    return {
+        'count': len(samples),
+        'mean_ms': sum(samples) / len(samples) * 1000,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'max_ms': max(samples) * 1000,
+    }
+
+def time_calls(func, repeat: int) -> list:
+    """
+    Calls func repeatedly and returns the duration of each call in seconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def make_app(database_uri: str = 'sqlite://', **config) -> Flask:
+    """
+    Builds a minimal application bound to the given database with the schema created.
+
+    :param database_uri: The SQLAlchemy database URI.
+    :param config: Extra configuration values.
+    :return: The Flask application.
+    """
+    app = Flask('benchmarks')
+    app.config.update(SECRET_KEY='benchmark', SQLALCHEMY_DATABASE_URI=database_uri,
+                      SQLALCHEMY_TRACK_MODIFICATIONS=False, **config)
+    init_database(app)
+    with app.app_context():
+        init_db()
+    return app
+
+def make_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--output', help='Write results as JSON to this file.')
+    parser.add_argument('--compare', help='Compare against results previously saved with --output.')
+    return parser
+
+def _row_key(row: dict, strict: bool) -> tuple:
+    # A row's leading non-float fields describe the case (mode, endpoint, threads, ...);
+    # the labels alone identify it unless they are ambiguous
+    key = []
+    for name, value in row.items():
+        if isinstance(value, float):
+            break
+        if strict or isinstance(value, str):
+            key.append((name, value))
+    return tuple(key)
+
+def compare(results: list, baseline: dict) -> list:
+    """
+    Pairs result rows with the baseline rows describing the same case.
+
+    :param results: The rows of the current run.
+    :param baseline: A JSON document previously written by report().
+    :return: One (row_key, {field: (before, after, change_pct)}) pair per matched row.
+    """
+    before_rows = baseline.get('results', [])
+    loose = {}
+    for row in before_rows:
+        loose.setdefault(_row_key(row, False), []).append(row)
+    strict = {_row_key(row, True): row for row in before_rows}
+    comparison = []
+    for row in results:
+        candidates = loose.get(_row_key(row, False), [])
+        before = candidates[0] if len(candidates) == 1 else strict.get(_row_key(row, True))
+        if before is None:
+            continue
+        changes = {}
+        for key, value in row.items():
+            if (isinstance(value, (int, float)) and not isinstance(value, bool)
+                    and isinstance(before.get(key), (int, float)) and value != before[key]):
+                change = (value - before[key]) / before[key] * 100 if before[key] else 0.0
+                changes[key] = (before[key], value, change)
+        comparison.append((_row_key(row, len(candidates) != 1), changes))
+    return comparison
+
+def report(name: str, results: list, output: str = None, baseline: str = None):
+    """
+    Prints benchmark rows and optionally saves them as JSON for later comparison.
+
+    :param name: The benchmark name.
+    :param results: A list of flat dicts, one per measured case.
+    :param output: Optional path of the JSON file to write.
+    :param baseline: Optional path of an earlier output file to compare against.
+    """
+    print(f'== {name}')
+    for row in results:
+        print('  ' + '  '.join(f'{key}={value:.3f}' if isinstance(value, float) else f'{key}={value}'
+                               for key, value in row.items()))
+    if output:
+        with open(output, 'w') as f:
+            json.dump({
+                'benchmark': name,
+                'created_at': time.time(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'results': results,
+            }, f, indent=2)
+    if baseline:
+        with open(baseline) as f:
+            comparison = compare(results, json.load(f))
+        print(f'== {name} vs {baseline}')
+        for row_key, changes in comparison:
+            print('  ' + '  '.join(f'{key}={value}' for key, value in row_key))
+            for key, (before, after, change) in changes.items():
+                print(f'    {key}: {before:.3f} -> {after:.3f} ({change:+.1f}%)')
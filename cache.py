@@ -0,0 +1,188 @@
+## cache.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def record_evictions(self, count: int = 1):
+        with self._lock:
+            self.evictions += count
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def to_dict(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'hit_rate': self.hit_rate}
+
+class MemoryCache:
+    """
+    In-process cache with LRU eviction and a per-entry TTL.
+    """
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """
+        Retrieves a cached value.
+
+        :param key: The cache key.
+        :return: The cached value, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats.record_hit()
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+        self.stats.record_miss()
+        return None
+
+    def set(self, key: str, value, ttl: float = None):
+        """
+        Stores a value, evicting the least recently used entries beyond capacity.
+
+        :param key: The cache key.
+        :param value: The value to store.
+        :param ttl: Optional TTL in seconds overriding the cache default.
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            self.stats.record_evictions(evicted)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class SQLiteCache:
+    """
+    On-disk cache shared by every process that opens the same file.
+
+    Values are stored as JSON. Eviction is approximately LRU: the entry count is
+    trimmed back to max_entries every few writes rather than on each one.
+    """
+    TRIM_EVERY = 64
+
+    def __init__(self, path: str, max_entries: int = 10000, ttl: float = 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._local = threading.local()
+        self._writes = 0
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS cache_entry ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection().execute("CREATE INDEX IF NOT EXISTS ix_cache_entry_accessed_at ON cache_entry (accessed_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread (and per process, since forked children get a new pid)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str):
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute("SELECT value, expires_at FROM cache_entry WHERE key = ?", (key,)).fetchone()
+        if row is not None and row[1] > now:
+            conn.execute("UPDATE cache_entry SET accessed_at = ? WHERE key = ?", (now, key))
+            self.stats.record_hit()
+            return json.loads(row[0])
+        if row is not None:
+            conn.execute("DELETE FROM cache_entry WHERE key = ?", (key,))
+        self.stats.record_miss()
+        return None
+
+    def set(self, key: str, value, ttl: float = None):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entry (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), expires_at, now)
+        )
+        self._writes += 1
+        if self._writes % self.TRIM_EVERY == 0:
+            self._trim(conn, now)
+
+    def _trim(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM cache_entry WHERE expires_at <= ?", (now,))
+        cursor = conn.execute(
+            "DELETE FROM cache_entry WHERE key IN ("
+            "SELECT key FROM cache_entry ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        if cursor.rowcount > 0:
+            self.stats.record_evictions(cursor.rowcount)
+
+    def delete(self, key: str):
+        self._connection().execute("DELETE FROM cache_entry WHERE key = ?", (key,))
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache_entry")
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM cache_entry").fetchone()[0]
+
+def make_cache(backend: str, max_entries: int, ttl: float, path: str = None):
+    """
+    Builds a cache for the given backend name.
+
+    :param backend: 'memory', 'sqlite' or 'none'.
+    :param max_entries: The maximum number of entries to keep.
+    :param ttl: The default TTL in seconds.
+    :param path: The database file for the 'sqlite' backend.
+    :return: A cache instance, or None when caching is disabled.
+    """
+    if backend == 'none':
+        return None
+    if backend == 'memory':
+        return MemoryCache(max_entries=max_entries, ttl=ttl)
+    if backend == 'sqlite':
+        return SQLiteCache(path, max_entries=max_entries, ttl=ttl)
+    raise ValueError(f"Unknown cache backend '{backend}'.")
@@ -1,6 +1,36 @@
 ## chat.py
+import base64
+import json
 from datetime import datetime
+from sqlalchemy import and_, or_
 from .models import db, Message
+from .realtime import publish_chat_message
+from .chat_writer import get_chat_writer
+from .search import get_search_index
+
+def encode_cursor(message: Message) -> str:
+    """
+    Encodes a message's position as an opaque pagination cursor.
+
+    :param message: The last message of a page.
+    :return: The cursor string.
+    """
+    raw = json.dumps([message.timestamp.isoformat(), message.id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Decodes a pagination cursor.
+
+    :param cursor: A cursor produced by encode_cursor.
+    :return: A (timestamp, id) tuple.
+    :raises ValueError: If the cursor is malformed.
+    """
+    try:
+        timestamp, message_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(timestamp), int(message_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid pagination cursor: {cursor}") from e
 
 class ChatManager:
     def __init__(self, chat_room):
@@ -12,10 +42,24 @@ class ChatManager:
 
         :param user: The user sending the message.
         :param text: The text of the message.
+        :return: The posted message.
         """
         new_message = Message(sender=user, text=text, chat_room=self.chat_room)
-        db.session.add(new_message)
-        db.session.commit()
+        writer = get_chat_writer()
+        if writer is not None:
+            # Group commit: returns once the batch holding this message is durable
+            new_message.timestamp = datetime.utcnow()
+            new_message.id = writer.write(new_message.sender_id, new_message.chat_room_id, text, new_message.timestamp)
+        else:
+            db.session.add(new_message)
+            db.session.flush()
+            search = get_search_index()
+            if search is not None:
+                search.index_messages([{'id': new_message.id, 'chat_room_id': new_message.chat_room_id,
+                                        'text': text, 'timestamp': new_message.timestamp}])
+            db.session.commit()
+        publish_chat_message(new_message)
+        return new_message
 
     def get_recent_messages(self, limit=50):
         """
@@ -24,13 +68,56 @@ class ChatManager:
         :param limit: The maximum number of messages to retrieve.
         :return: A list of the most recent messages.
         """
-        return self.chat_room.messages.order_by(Message.timestamp.desc()).limit(limit).all()
+        return self.get_messages_page(limit=limit)[0]
+
+    def get_messages_page(self, cursor=None, limit=50, newest_first=True):
+        """
+        Retrieves one page of messages using keyset pagination on (timestamp, id).
+
+        :param cursor: The cursor returned with the previous page, or None for the first page.
+        :param limit: The maximum number of messages in the page.
+        :param newest_first: Page backwards through history when True, forwards when False.
+        :return: A (messages, next_cursor) tuple; next_cursor is None on the last page.
+        :raises ValueError: If the cursor is malformed.
+        """
+        query = self.chat_room.messages
+        if cursor is not None:
+            timestamp, message_id = decode_cursor(cursor)
+            # The redundant plain range bound lets the planner seek on the (chat_room_id, timestamp, id) index
+            if newest_first:
+                query = query.filter(Message.timestamp <= timestamp,
+                                     or_(Message.timestamp < timestamp,
+                                         and_(Message.timestamp == timestamp, Message.id < message_id)))
+            else:
+                query = query.filter(Message.timestamp >= timestamp,
+                                     or_(Message.timestamp > timestamp,
+                                         and_(Message.timestamp == timestamp, Message.id > message_id)))
+        if newest_first:
+            query = query.order_by(Message.timestamp.desc(), Message.id.desc())
+        else:
+            query = query.order_by(Message.timestamp.asc(), Message.id.asc())
+        # Fetch one extra row to learn whether another page follows
+        messages = query.limit(limit + 1).all()
+        next_cursor = encode_cursor(messages[limit - 1]) if len(messages) > limit else None
+        return messages[:limit], next_cursor
 
-    def get_messages_since(self, timestamp):
+    def get_messages_since(self, timestamp, after_id=None, limit=None):
         """
         Retrieves messages from the chat room that were posted after the given timestamp.
 
         :param timestamp: The timestamp to filter messages.
+        :param after_id: Optional ID of the last message seen at that timestamp, so that
+                         messages sharing the timestamp are not dropped.
+        :param limit: Optional maximum number of messages to retrieve.
         :return: A list of messages posted after the timestamp.
         """
-        return self.chat_room.messages.filter(Message.timestamp > timestamp).order_by(Message.timestamp.asc()).all()
+        if after_id is None:
+            condition = Message.timestamp > timestamp
+        else:
+            condition = and_(Message.timestamp >= timestamp,
+                             or_(Message.timestamp > timestamp,
+                                 and_(Message.timestamp == timestamp, Message.id > after_id)))
+        query = self.chat_room.messages.filter(condition).order_by(Message.timestamp.asc(), Message.id.asc())
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
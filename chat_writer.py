@@ -0,0 +1,161 @@
+## chat_writer.py
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import insert
+from .background import ProcessThreads
+from .config import CHAT_WRITE_BUFFER_ENABLED, CHAT_WRITE_BUFFER_MAX_ROWS, CHAT_WRITE_BUFFER_MAX_DELAY_MS, CHAT_WRITE_TIMEOUT
+from .models import db, Message
+
+class _PendingWrite:
+    QUEUED = 'queued'
+    COMMITTING = 'committing'
+    CANCELLED = 'cancelled'
+
+    def __init__(self, row: dict):
+        self.row = row
+        self.state = _PendingWrite.QUEUED
+        self.message_id = None
+        self.error = None
+        self.done = threading.Event()
+
+class BufferedMessageWriter:
+    """
+    Group-commit writer for chat messages.
+
+    Messages are collected for up to max_delay seconds or max_rows rows and
+    inserted in one transaction. Each caller blocks until the transaction
+    holding its message has committed, so an acknowledged message is durable.
+
+    A caller that times out withdraws its message if no batch has taken it
+    yet, so a TimeoutError means the message was not stored and is safe to
+    retry. A message already in a committing batch is not withdrawn; its
+    caller waits for that transaction's outcome instead.
+    """
+    def __init__(self, app, max_rows: int = CHAT_WRITE_BUFFER_MAX_ROWS,
+                 max_delay: float = CHAT_WRITE_BUFFER_MAX_DELAY_MS / 1000, timeout: float = CHAT_WRITE_TIMEOUT):
+        self.app = app
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._threads = ProcessThreads(('chat-writer', self._run), reset=self._reset_queue)
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._rows = 0
+        self._timeouts = 0
+        self._max_batch_size = 0
+        self._commit_latencies = deque(maxlen=1000)
+
+    def write(self, sender_id: int, chat_room_id: int, text: str, timestamp: datetime) -> int:
+        """
+        Queues a message and waits until its batch is committed.
+
+        :return: The ID of the inserted message.
+        :raises TimeoutError: If no batch took the message within the timeout; it was not stored.
+        """
+        self._threads.ensure_started()
+        pending = _PendingWrite({'sender_id': sender_id, 'chat_room_id': chat_room_id, 'text': text,
+                                 'timestamp': timestamp})
+        self._queue.put(pending)
+        if not pending.done.wait(self.timeout):
+            with self._lock:
+                withdrawn = pending.state == _PendingWrite.QUEUED
+                if withdrawn:
+                    pending.state = _PendingWrite.CANCELLED
+                    self._timeouts += 1
+            if withdrawn:
+                raise TimeoutError("Timed out waiting for the chat message to be committed; it was not stored")
+            # Its transaction is under way; reporting a timeout now could make a retry store it twice
+            pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.message_id
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._commit_latencies)
+            return {
+                'batches': self._batches,
+                'rows': self._rows,
+                'mean_batch_size': self._rows / self._batches if self._batches else 0.0,
+                'max_batch_size': self._max_batch_size,
+                'timeouts': self._timeouts,
+                'commit_p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+                'commit_p99_ms': latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+            }
+
+    def _reset_queue(self):
+        # Messages queued before a fork belong to the parent, which commits them
+        self._queue = queue.Queue()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            with self._lock:
+                # Skip messages whose callers gave up; the rest can no longer be withdrawn
+                batch = [pending for pending in batch if pending.state == _PendingWrite.QUEUED]
+                for pending in batch:
+                    pending.state = _PendingWrite.COMMITTING
+            if batch:
+                self._commit(batch)
+
+    def _commit(self, batch: list):
+        start = time.perf_counter()
+        with self.app.app_context():
+            try:
+                # One multi-row INSERT ... RETURNING, ids come back in submission order
+                ids = db.session.scalars(
+                    insert(Message).returning(Message.id, sort_by_parameter_order=True),
+                    [pending.row for pending in batch]
+                ).all()
+                search = self.app.extensions.get('search')
+                if search is not None:
+                    # Indexed in the same transaction, so a committed message is always searchable
+                    search.index_messages([dict(pending.row, id=message_id) for pending, message_id in zip(batch, ids)])
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.error(f"Failed to commit chat message batch: {e}")
+                for pending in batch:
+                    pending.error = e
+                    pending.done.set()
+                return
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._batches += 1
+            self._rows += len(batch)
+            self._max_batch_size = max(self._max_batch_size, len(batch))
+            self._commit_latencies.append(elapsed)
+        for pending, message_id in zip(batch, ids):
+            pending.message_id = message_id
+            pending.done.set()
+
+def init_chat_writer(app):
+    """
+    Initialize the buffered chat writer when CHAT_WRITE_BUFFER_ENABLED is set.
+
+    :param app: The Flask application object.
+    """
+    if app.config.get('CHAT_WRITE_BUFFER_ENABLED', CHAT_WRITE_BUFFER_ENABLED):
+        app.extensions['chat_writer'] = BufferedMessageWriter(
+            app,
+            max_rows=app.config.get('CHAT_WRITE_BUFFER_MAX_ROWS', CHAT_WRITE_BUFFER_MAX_ROWS),
+            max_delay=app.config.get('CHAT_WRITE_BUFFER_MAX_DELAY_MS', CHAT_WRITE_BUFFER_MAX_DELAY_MS) / 1000,
+            timeout=app.config.get('CHAT_WRITE_TIMEOUT', CHAT_WRITE_TIMEOUT),
+        )
+
+def get_chat_writer():
+    return current_app.extensions.get('chat_writer')
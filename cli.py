@@ -0,0 +1,115 @@
+## cli.py
+import click
+from .database import init_db
+from .migrations import migrate_pickle_blobs, create_missing_indexes, add_missing_columns, backfill_player_counts
+from .story_log import compact_story_log
+from .export import export_adventure, import_adventure
+from .models import User
+from .telemetry import usage_report
+from .search import get_search_index
+
+def init_cli(app):
+    """
+    Register the application's maintenance commands with the Flask CLI.
+
+    :param app: The Flask application object.
+    """
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create the database tables."""
+        init_db()
+        click.echo('database initialized')
+
+    @app.cli.command('migrate-serialization')
+    @click.option('--batch-size', default=500, show_default=True, help='Rows converted per transaction.')
+    def migrate_serialization_command(batch_size):
+        """Convert pickled story and session state to the versioned format."""
+        converted, failed = migrate_pickle_blobs(batch_size)
+        for name, count in converted.items():
+            click.echo(f'{name}: converted {count} rows')
+        for name, row_ids in failed.items():
+            click.echo(f"{name}: could not convert {len(row_ids)} rows, IDs {', '.join(map(str, row_ids))}", err=True)
+
+    @app.cli.command('compact-story-log')
+    @click.option('--adventure-id', type=int, default=None, help='Only compact this adventure.')
+    @click.option('--retain-events', type=click.IntRange(min=1), default=None, help='Events kept for rewind per adventure.')
+    def compact_story_log_command(adventure_id, retain_events):
+        """Fold old story events into snapshots."""
+        kwargs = {} if retain_events is None else {'retain_events': retain_events}
+        deleted = compact_story_log(adventure_id, **kwargs)
+        click.echo(f'compacted {len(deleted)} adventures, deleted {sum(deleted.values())} events')
+
+    @app.cli.command('create-indexes')
+    def create_indexes_command():
+        """Create indexes declared on the models that the database is missing."""
+        for name in create_missing_indexes():
+            click.echo(f'index {name}: ok')
+
+    @app.cli.command('upgrade-schema')
+    def upgrade_schema_command():
+        """Add missing columns and indexes to an existing database and backfill derived data."""
+        for name in add_missing_columns():
+            click.echo(f'column {name}: added')
+        for name in create_missing_indexes():
+            click.echo(f'index {name}: ok')
+        click.echo(f'player counts: {backfill_player_counts()} adventures updated')
+
+    @app.cli.command('export-adventure')
+    @click.argument('adventure_id', type=int)
+    @click.option('--output', type=click.File('w', encoding='utf-8'), default='-', help='File to write; defaults to stdout.')
+    @click.option('--batch-size', type=int, default=None, help='Rows fetched from the database at a time.')
+    def export_adventure_command(adventure_id, output, batch_size):
+        """Stream an adventure, its story, sessions and chat history as NDJSON."""
+        kwargs = {} if batch_size is None else {'batch_size': batch_size}
+        try:
+            for line in export_adventure(adventure_id, **kwargs):
+                output.write(line)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+    @app.cli.command('import-adventure')
+    @click.argument('input', type=click.File('r', encoding='utf-8'))
+    @click.option('--game-master', default=None, help='Username to own the imported adventure.')
+    @click.option('--batch-size', type=int, default=None, help='Rows per INSERT statement.')
+    def import_adventure_command(input, game_master, batch_size):
+        """Import an adventure exported with export-adventure as a new adventure."""
+        owner = None
+        if game_master is not None:
+            owner = User.query.filter_by(username=game_master).first()
+            if owner is None:
+                raise click.ClickException(f"No user named {game_master}")
+        kwargs = {} if batch_size is None else {'batch_size': batch_size}
+        try:
+            adventure_id, counts = import_adventure(input, game_master=owner, **kwargs)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        for name, count in sorted(counts.items()):
+            click.echo(f'{name}: {count} rows')
+        click.echo(f'imported as adventure {adventure_id}')
+
+    @app.cli.command('usage-report')
+    @click.option('--days', type=int, default=7, show_default=True, help='Days to include, counting today.')
+    @click.option('--limit', type=int, default=20, show_default=True, help='Rows per section.')
+    def usage_report_command(days, limit):
+        """Show model token usage, errors and latency by user and adventure."""
+        report = usage_report(days, limit)
+        click.echo(f"model usage since {report['since']}")
+        for section in ('users', 'adventures'):
+            click.echo(f'== {section}')
+            for row in report[section]:
+                click.echo(f"  {row['name'] or row['id']}: {row['tokens']} tokens, {row['calls']} calls, "
+                           f"{row['errors']} errors, {row['mean_latency_ms']} ms mean, {row['max_latency_ms']} ms max")
+        click.echo('== outcomes')
+        for outcome, calls in report['outcomes'].items():
+            click.echo(f'  {outcome}: {calls} calls')
+
+    @app.cli.command('init-search')
+    @click.option('--batch-size', default=1000, show_default=True, help='Story events indexed at a time.')
+    def init_search_command(batch_size):
+        """Create the full-text search index and fill it from existing messages and story turns."""
+        try:
+            counts = get_search_index().rebuild(batch_size)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        for kind, count in counts.items():
+            click.echo(f'{kind}: indexed {count} rows')
@@ -8,15 +8,116 @@ DEBUG = os.environ.get('DEBUG', 'True').lower() in ['true', '1', 't']  # Convert
 # Database configuration
 SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///text_adventure_incubator.db')
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')  # Optional read replica for read-only views
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))  # Persistent connections per process
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))  # Extra connections opened under load
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # Seconds before a connection is replaced
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'True').lower() in ['true', '1', 't']
+SQLITE_WAL = os.environ.get('SQLITE_WAL', 'True').lower() in ['true', '1', 't']
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')  # Safe with WAL; FULL syncs every commit
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))  # Wait for locks instead of failing
+
+# Story/session state serialization
+SERIALIZATION_FORMAT = os.environ.get('SERIALIZATION_FORMAT', 'json')  # 'json' or 'msgpack'
+SERIALIZATION_COMPRESSION = os.environ.get('SERIALIZATION_COMPRESSION', 'zlib')  # 'none', 'zlib' or 'zstd'
+SERIALIZATION_COMPRESSION_THRESHOLD = int(os.environ.get('SERIALIZATION_COMPRESSION_THRESHOLD', 1024))  # Bytes
 
 # OpenAI API configuration
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', 'default_openai_api_key')  # Environment variable or default
+STORY_ADAPTER = os.environ.get('STORY_ADAPTER', 'openai')  # 'openai' or 'fake' for offline load testing
+FAKE_ADAPTER_LATENCY = float(os.environ.get('FAKE_ADAPTER_LATENCY', 0.0))  # Seconds per fake completion
+
+# Model client configuration
+MODEL_REQUESTS_PER_SECOND = float(os.environ.get('MODEL_REQUESTS_PER_SECOND', 5))  # Per process
+MODEL_TOKENS_PER_SECOND = float(os.environ.get('MODEL_TOKENS_PER_SECOND', 2000))  # Estimated prompt + completion tokens
+MODEL_MAX_RETRIES = int(os.environ.get('MODEL_MAX_RETRIES', 5))
+MODEL_BACKOFF_BASE = float(os.environ.get('MODEL_BACKOFF_BASE', 0.5))  # Seconds
+MODEL_BACKOFF_MAX = float(os.environ.get('MODEL_BACKOFF_MAX', 30))  # Seconds
+MODEL_POOL_SIZE = int(os.environ.get('MODEL_POOL_SIZE', 10))  # Pooled HTTP connections per process
+MODEL_RATE_LIMIT_TIMEOUT = float(os.environ.get('MODEL_RATE_LIMIT_TIMEOUT', 30))  # Max seconds to wait for the limiter
+
+# Story event log configuration
+STORY_SNAPSHOT_INTERVAL = int(os.environ.get('STORY_SNAPSHOT_INTERVAL', 20))  # Events between snapshots
+STORY_EVENT_RETENTION = int(os.environ.get('STORY_EVENT_RETENTION', 1000))  # Events kept for rewind by compaction
+
+# Model-call telemetry and quotas
+MODEL_USAGE_FLUSH_INTERVAL = float(os.environ.get('MODEL_USAGE_FLUSH_INTERVAL', 10))  # Seconds between usage writes
+MODEL_USER_DAILY_TOKEN_QUOTA = int(os.environ.get('MODEL_USER_DAILY_TOKEN_QUOTA', 0))  # 0 disables the quota
+MODEL_ADVENTURE_DAILY_TOKEN_QUOTA = int(os.environ.get('MODEL_ADVENTURE_DAILY_TOKEN_QUOTA', 0))  # 0 disables the quota
+ADMIN_USERNAMES = [name.strip() for name in os.environ.get('ADMIN_USERNAMES', '').split(',') if name.strip()]
+
+# Prompt context assembly
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('CONTEXT_TOKEN_BUDGET', 1500))  # Estimated prompt tokens sent per turn
+CONTEXT_RECENT_TURNS = int(os.environ.get('CONTEXT_RECENT_TURNS', 6))  # Turns kept verbatim before being summarized
+STORY_SUMMARY_MAX_TOKENS = int(os.environ.get('STORY_SUMMARY_MAX_TOKENS', 400))  # Cap on the rolling summary
+STORY_SUMMARY_LINE_TOKENS = int(os.environ.get('STORY_SUMMARY_LINE_TOKENS', 40))  # Per summarized turn
+
+# Prompt/response cache configuration
+PROMPT_CACHE_BACKEND = os.environ.get('PROMPT_CACHE_BACKEND', 'memory')  # 'memory', 'sqlite' or 'none'
+PROMPT_CACHE_PATH = os.environ.get('PROMPT_CACHE_PATH', 'prompt_cache.sqlite3')  # Shared file for the 'sqlite' backend
+PROMPT_CACHE_MAX_ENTRIES = int(os.environ.get('PROMPT_CACHE_MAX_ENTRIES', 1024))
+PROMPT_CACHE_TTL = int(os.environ.get('PROMPT_CACHE_TTL', 3600))  # Duration in seconds
+
+# Adventure page caching and conditional GET
+PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'memory')  # 'memory', 'sqlite' or 'none'
+PAGE_CACHE_PATH = os.environ.get('PAGE_CACHE_PATH', 'page_cache.sqlite3')  # Shared file for the 'sqlite' backend
+PAGE_CACHE_MAX_ENTRIES = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 2048))
+PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 300))  # Seconds; also how often validators roll over
+ADVENTURE_VERSION_TTL = float(os.environ.get('ADVENTURE_VERSION_TTL', 5))  # Max staleness across processes, seconds
+
+# Adventure export/import
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))  # Rows per cursor fetch and per INSERT
+
+# Full-text search over chat messages and story turns
+SEARCH_ENABLED = os.environ.get('SEARCH_ENABLED', 'True').lower() in ['true', '1', 't']
+SEARCH_LANGUAGE = os.environ.get('SEARCH_LANGUAGE', 'english')  # Postgres text search configuration
+SEARCH_MAX_PAGE = int(os.environ.get('SEARCH_MAX_PAGE', 50))  # Deepest result page served
+
+# Hot game session store
+# Per-process: only enable with a single worker or when each session is pinned to one worker
+SESSION_STORE_ENABLED = os.environ.get('SESSION_STORE_ENABLED', 'False').lower() in ['true', '1', 't']
+SESSION_STORE_MAX_SESSIONS = int(os.environ.get('SESSION_STORE_MAX_SESSIONS', 1000))  # Live sessions held per process
+SESSION_STORE_FLUSH_INTERVAL = float(os.environ.get('SESSION_STORE_FLUSH_INTERVAL', 1))  # Seconds; max updates lost on a crash
+SESSION_STORE_DURABILITY = os.environ.get('SESSION_STORE_DURABILITY', 'write_behind')  # 'write_behind' or 'write_through'
+
+# Story generation job configuration
+STORY_JOB_BACKEND = os.environ.get('STORY_JOB_BACKEND', 'thread')  # 'thread' or 'local_broker'
+STORY_JOB_WORKERS = int(os.environ.get('STORY_JOB_WORKERS', 4))  # Concurrent model calls per process
+STORY_JOB_QUEUE_SIZE = int(os.environ.get('STORY_JOB_QUEUE_SIZE', 64))  # Pending jobs before submissions are rejected
+STORY_JOB_RETENTION = int(os.environ.get('STORY_JOB_RETENTION', 1000))  # Finished jobs kept in memory for status polling
+# 'database' lets any worker answer a status poll; 'memory' needs a single worker or sticky routing
+STORY_JOB_STATUS_STORE = os.environ.get('STORY_JOB_STATUS_STORE', 'database')
+STORY_JOB_STATUS_TTL = int(os.environ.get('STORY_JOB_STATUS_TTL', 86400))  # Seconds finished job rows are kept
 
 # Flask-SocketIO configuration
-SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE', 'redis://')
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE', 'memory://')  # 'memory://' for one node, redis:// for many
+
+# Chat write buffering (group commit)
+CHAT_WRITE_BUFFER_ENABLED = os.environ.get('CHAT_WRITE_BUFFER_ENABLED', 'False').lower() in ['true', '1', 't']
+CHAT_WRITE_BUFFER_MAX_ROWS = int(os.environ.get('CHAT_WRITE_BUFFER_MAX_ROWS', 100))  # Rows per transaction
+CHAT_WRITE_BUFFER_MAX_DELAY_MS = float(os.environ.get('CHAT_WRITE_BUFFER_MAX_DELAY_MS', 5))  # Max wait to fill a batch
+CHAT_WRITE_TIMEOUT = float(os.environ.get('CHAT_WRITE_TIMEOUT', 5))  # Seconds a caller waits for its batch
+
+# SQL instrumentation
+SQL_INSTRUMENTATION_ENABLED = os.environ.get('SQL_INSTRUMENTATION_ENABLED', 'True').lower() in ['true', '1', 't']
+SQL_SLOW_QUERY_COUNT = int(os.environ.get('SQL_SLOW_QUERY_COUNT', 5))  # Slowest statements kept per request
+SQL_N_PLUS_ONE_THRESHOLD = int(os.environ.get('SQL_N_PLUS_ONE_THRESHOLD', 5))  # Repeats of one statement shape
+SQL_DEBUG_PANEL = os.environ.get('SQL_DEBUG_PANEL', 'False').lower() in ['true', '1', 't']  # Inject a panel into HTML pages
 
 # Flask-Login configuration
 REMEMBER_COOKIE_DURATION = int(os.environ.get('REMEMBER_COOKIE_DURATION', 3600))  # Duration in seconds
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')  # Older hashes are upgraded on login
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))  # Hashing processes; 0 hashes inline
+PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE', 32))  # Pending operations before shedding load
+PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))  # Seconds
+AVAILABILITY_INDEX_ENABLED = os.environ.get('AVAILABILITY_INDEX_ENABLED', 'True').lower() in ['true', '1', 't']
+AVAILABILITY_INDEX_CAPACITY = int(os.environ.get('AVAILABILITY_INDEX_CAPACITY', 1000000))  # Expected number of users
+AVAILABILITY_INDEX_ERROR_RATE = float(os.environ.get('AVAILABILITY_INDEX_ERROR_RATE', 0.01))  # Bloom false positive rate
+AVAILABILITY_INDEX_REFRESH = float(os.environ.get('AVAILABILITY_INDEX_REFRESH', 60))  # Seconds; other workers' signups unseen until then
+USER_CACHE_BACKEND = os.environ.get('USER_CACHE_BACKEND', 'memory')  # 'memory', 'sqlite' or 'none'
+USER_CACHE_PATH = os.environ.get('USER_CACHE_PATH', 'user_cache.sqlite3')  # Shared file for the 'sqlite' backend
+USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 10000))
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300))  # Duration in seconds
 
 # Flask-Session configuration
 PERMANENT_SESSION_LIFETIME = int(os.environ.get('PERMANENT_SESSION_LIFETIME', 3600))  # Duration in seconds
@@ -0,0 +1,123 @@
+## context_builder.py
+import re
+from .config import (CONTEXT_TOKEN_BUDGET, CONTEXT_RECENT_TURNS, STORY_SUMMARY_MAX_TOKENS,
+                     STORY_SUMMARY_LINE_TOKENS)
+from .model_client import estimate_tokens
+from .models import db, Adventure, StoryEvent
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Shortens a text to roughly max_tokens, cutting at a word boundary.
+
+    :param text: The text to shorten.
+    :param max_tokens: The token estimate the result must fit in.
+    :return: The text, with '...' appended if it was cut.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text[:max(max_tokens * 4 - 3, 0)]
+    if ' ' in cut:
+        cut = cut.rsplit(' ', 1)[0]
+    return cut + '...'
+
+def summarize_turn(payload: dict) -> str:
+    """
+    Reduces one story event to a single summary line: the lead sentence of
+    its story text, capped at STORY_SUMMARY_LINE_TOKENS.
+
+    :param payload: The story event payload.
+    :return: The summary line, or an empty string if the event has no story.
+    """
+    story = ' '.join((payload.get('story') or '').split())
+    if not story:
+        return ''
+    return truncate_to_tokens(SENTENCE_END.split(story, 1)[0], STORY_SUMMARY_LINE_TOKENS)
+
+def fold_summary(summary: str, lines, max_tokens: int = STORY_SUMMARY_MAX_TOKENS) -> str:
+    """
+    Appends summary lines to a rolling summary, dropping the oldest lines
+    (except the opening one, which sets the scene) once it exceeds max_tokens.
+
+    :param summary: The current summary, one line per summarized turn.
+    :param lines: New lines, oldest first.
+    :param max_tokens: The token estimate the summary must fit in.
+    :return: The new summary.
+    """
+    kept = (summary.split('\n') if summary else []) + [line for line in lines if line]
+    while len(kept) > 2 and estimate_tokens('\n'.join(kept)) > max_tokens:
+        del kept[1]
+    return truncate_to_tokens('\n'.join(kept), max_tokens)
+
+def update_story_summary(adventure: Adventure, recent_turns: int = CONTEXT_RECENT_TURNS) -> int:
+    """
+    Folds story events older than the last recent_turns into the adventure's
+    rolling summary. Only events after summary_through_seq are read, so each
+    turn normally folds a single event. Call after appending an event, in the
+    same transaction.
+
+    :param adventure: The Adventure whose summary to update.
+    :param recent_turns: The number of latest events left out of the summary.
+    :return: The number of events folded.
+    """
+    through = adventure.summary_through_seq or 0
+    events = StoryEvent.query.filter(StoryEvent.adventure_id == adventure.id, StoryEvent.seq > through) \
+        .order_by(StoryEvent.seq).all()
+    to_fold = events[:max(len(events) - recent_turns, 0)]
+    if not to_fold:
+        return 0
+    summary = fold_summary(adventure.story_summary, [summarize_turn(event.payload) for event in to_fold])
+    # Conditional on the old position so a concurrent fold of the same events is not applied twice
+    updated = Adventure.query.filter_by(id=adventure.id, summary_through_seq=through).update({
+        Adventure.story_summary: summary,
+        Adventure.summary_through_seq: to_fold[-1].seq,
+    }, synchronize_session=False)
+    db.session.expire(adventure, ['story_summary', 'summary_through_seq'])
+    return len(to_fold) if updated else 0
+
+def format_turn(payload: dict) -> str:
+    story = (payload.get('story') or '').strip()
+    if payload.get('prompt'):
+        return f"Player: {payload['prompt'].strip()}\n{story}"
+    return story
+
+def build_prompt(adventure: Adventure, player_prompt: str, budget: int = CONTEXT_TOKEN_BUDGET,
+                 recent_turns: int = CONTEXT_RECENT_TURNS) -> str:
+    """
+    Assembles the model prompt for the next turn: the rolling story summary,
+    the latest turns verbatim, and the player's prompt, within a token budget.
+    Turns are added newest first until the budget is spent, then the summary
+    fills what is left. Reads at most recent_turns events, however long the
+    adventure is.
+
+    :param adventure: The Adventure being played.
+    :param player_prompt: The player's prompt for this turn.
+    :param budget: The maximum estimated prompt tokens.
+    :param recent_turns: The maximum number of turns included verbatim.
+    :return: The prompt; just the player's prompt if the story has not started.
+    """
+    events = StoryEvent.query.filter(StoryEvent.adventure_id == adventure.id,
+                                     StoryEvent.seq > (adventure.summary_through_seq or 0)) \
+        .order_by(StoryEvent.seq.desc()).limit(recent_turns).all()
+    if not events and not adventure.story_summary:
+        return player_prompt
+
+    tail = f"Player: {player_prompt.strip()}\n"
+    remaining = budget - estimate_tokens(tail)
+    turns = []
+    for event in events:
+        turn = format_turn(event.payload)
+        cost = estimate_tokens(turn) + 1
+        if cost > remaining:
+            break
+        turns.append(turn)
+        remaining -= cost
+
+    sections = []
+    header = "Story so far:\n"
+    if adventure.story_summary and remaining > estimate_tokens(header) + 1:
+        sections.append(header + truncate_to_tokens(adventure.story_summary, remaining - estimate_tokens(header) - 1))
+    sections.extend(reversed(turns))
+    sections.append(tail)
+    return '\n'.join(sections)
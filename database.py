@@ -1,35 +1,112 @@
 ## database.py
+from functools import wraps
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
-from .config import SQLALCHEMY_DATABASE_URI
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from .config import (SQLALCHEMY_DATABASE_URI, DATABASE_REPLICA_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE,
+                     DB_POOL_PRE_PING, SQLITE_WAL, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT_MS)
 
-# Initialize SQLAlchemy with no settings
-db = SQLAlchemy()
+REPLICA_BIND = 'replica'
 
-# Create an engine bound to the database URL
-engine = create_engine(SQLALCHEMY_DATABASE_URI, convert_unicode=True)
+class RoutingSession(Session):
+    """
+    Session that sends reads to the read replica inside views marked with
+    use_replica.
 
-# Create a configured "Session" class
-db_session = scoped_session(sessionmaker(autocommit=False,
-                                         autoflush=False,
-                                         bind=engine))
+    Only SELECTs are routed, and only until the session writes anything, so a
+    request never reads a lagging replica after changing data on the primary.
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if getattr(clause, 'is_dml', False):
+            self.info['has_written'] = True
+        if (bind is None and REPLICA_BIND in self._db.engines and has_app_context() and g.get('use_replica')
+                and getattr(clause, 'is_select', False) and not self.info.get('has_written')
+                and not (self._flushing or self.new or self.dirty or self.deleted)):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
 
-# Create a base class for declarative class definitions
-Base = declarative_base()
-Base.query = db_session.query_property()
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_written(session, flush_context):
+    session.info['has_written'] = True
+
+# The single engine/session layer shared by the models and every app
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+def use_replica(view):
+    """
+    Marks a read-only view whose queries may be served by the read replica.
+    Without DATABASE_REPLICA_URL configured this has no effect.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+def engine_options(uri: str) -> dict:
+    """
+    Builds the engine options for a database URI from the pool configuration.
+
+    :param uri: The SQLAlchemy database URI.
+    :return: Options for SQLALCHEMY_ENGINE_OPTIONS.
+    """
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # In-memory SQLite is a single shared connection; there is no pool to tune
+        return {}
+    return {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+    }
+
+def _configure_sqlite(engine, wal: bool, synchronous: str, busy_timeout_ms: int):
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if wal and engine.url.database not in (None, '', ':memory:'):
+            # WAL lets readers proceed while a writer commits
+            cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA synchronous={synchronous}')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        cursor.close()
+
+def init_database(app):
+    """
+    Initialize the database layer: pool settings, the optional read replica
+    and, on SQLite, WAL mode, synchronous=NORMAL and a busy timeout.
+
+    Options already present in SQLALCHEMY_ENGINE_OPTIONS take precedence.
+
+    :param app: The Flask application object.
+    """
+    uri = app.config.setdefault('SQLALCHEMY_DATABASE_URI', SQLALCHEMY_DATABASE_URI)
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    for key, value in engine_options(uri).items():
+        options.setdefault(key, value)
+    replica_uri = app.config.get('DATABASE_REPLICA_URL', DATABASE_REPLICA_URL)
+    if replica_uri:
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+        binds.setdefault(REPLICA_BIND, {'url': replica_uri, **engine_options(replica_uri)})
+
+    db.init_app(app)
+
+    wal = app.config.get('SQLITE_WAL', SQLITE_WAL)
+    synchronous = app.config.get('SQLITE_SYNCHRONOUS', SQLITE_SYNCHRONOUS)
+    busy_timeout_ms = app.config.get('SQLITE_BUSY_TIMEOUT_MS', SQLITE_BUSY_TIMEOUT_MS)
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                _configure_sqlite(engine, wal, synchronous, busy_timeout_ms)
 
 def init_db():
-    # Import all modules here that might define models so that
-    # they will be registered properly on the metadata. Otherwise
-    # you will have to import them first before calling init_db()
-    import .models  # Import models to ensure they are known to the Base metadata
-    Base.metadata.create_all(bind=engine)
-
-def shutdown_session(exception=None):
-    db_session.remove()
-
-# Ensure that the session is properly removed at the end of the request or when the application shuts down
-from flask import current_app
-current_app.teardown_appcontext(shutdown_session)
+    """
+    Create the tables for every model. Must be called inside an app context.
+    """
+    # Imported here so that every model is registered on the metadata
+    from . import models
+    # Only the primary; a replica gets its schema through replication
+    db.create_all(bind_key=None)
@@ -0,0 +1,223 @@
+## export.py
+import json
+from datetime import datetime
+from .config import EXPORT_BATCH_SIZE
+from .models import (db, User, Adventure, StoryEvent, StorySnapshot, GameSession, ChatRoom, Message,
+                     adventure_players)
+from .session_store import get_session_store
+from .search import get_search_index
+
+EXPORT_FORMAT = 1
+
+# Imported users get a hash no password can match; they log in once a password is set
+UNUSABLE_PASSWORD_HASH = '!'
+
+def _line(record: dict) -> str:
+    return json.dumps(record, separators=(',', ':'), default=_encode) + '\n'
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot export {type(value).__name__} values")
+
+def _datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+def _stream(statement, batch_size: int):
+    # Server-side cursor where the driver supports one; rows are fetched batch_size at a time
+    return db.session.execute(statement.execution_options(stream_results=True, yield_per=batch_size))
+
+def export_adventure(adventure_id: int, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Streams an adventure as NDJSON: a header line, then the users it
+    references, the adventure and its players, story log, game sessions
+    and chat messages. Rows are read through server-side cursors and
+    written one line at a time, so memory use does not grow with the
+    number of messages.
+
+    :param adventure_id: ID of the Adventure to export.
+    :param batch_size: Rows fetched from the database at a time.
+    :return: A generator of lines.
+    :raises ValueError: If the adventure does not exist.
+    """
+    adventure = db.session.get(Adventure, adventure_id)
+    if adventure is None:
+        raise ValueError(f"Adventure with ID {adventure_id} does not exist.")
+    store = get_session_store()
+    if store is not None:
+        # Sessions held in memory may be newer than their rows
+        store.flush()
+    room_ids = db.select(ChatRoom.id).where(ChatRoom.adventure_id == adventure_id)
+    return _export_lines(adventure, room_ids, batch_size)
+
+def _export_lines(adventure: Adventure, room_ids, batch_size: int):
+    yield _line({'type': 'export', 'format': EXPORT_FORMAT, 'exported_at': datetime.utcnow(),
+                 'adventure_id': adventure.id})
+
+    player_ids = db.select(adventure_players.c.user_id).where(adventure_players.c.adventure_id == adventure.id)
+    sender_ids = db.select(Message.sender_id).where(Message.chat_room_id.in_(room_ids)).distinct()
+    # Usernames only: the export is served to game masters, who must not learn players' emails
+    users = db.select(User.id, User.username).where(db.or_(
+        User.id == adventure.game_master_id, User.id.in_(player_ids), User.id.in_(sender_ids)))
+    for row in _stream(users, batch_size):
+        yield _line({'type': 'user', 'id': row.id, 'username': row.username})
+
+    yield _line({'type': 'adventure', 'title': adventure.title, 'game_master_id': adventure.game_master_id,
+                 'story_state': adventure.legacy_story_state, 'story_summary': adventure.story_summary,
+                 'summary_through_seq': adventure.summary_through_seq, 'updated_at': adventure.updated_at})
+    for row in _stream(player_ids, batch_size):
+        yield _line({'type': 'player', 'user_id': row.user_id})
+
+    snapshots = db.select(StorySnapshot.seq, StorySnapshot.state, StorySnapshot.created_at) \
+        .where(StorySnapshot.adventure_id == adventure.id).order_by(StorySnapshot.seq)
+    for row in _stream(snapshots, batch_size):
+        yield _line({'type': 'story_snapshot', 'seq': row.seq, 'state': row.state, 'created_at': row.created_at})
+    events = db.select(StoryEvent.seq, StoryEvent.payload, StoryEvent.created_at) \
+        .where(StoryEvent.adventure_id == adventure.id).order_by(StoryEvent.seq)
+    for row in _stream(events, batch_size):
+        yield _line({'type': 'story_event', 'seq': row.seq, 'payload': row.payload, 'created_at': row.created_at})
+
+    sessions = db.select(GameSession.session_data).where(GameSession.adventure_id == adventure.id) \
+        .order_by(GameSession.id)
+    for row in _stream(sessions, batch_size):
+        yield _line({'type': 'game_session', 'data': row.session_data})
+
+    # Walks ix_message_room_timestamp_id in order
+    messages = db.select(Message.sender_id, Message.text, Message.timestamp) \
+        .where(Message.chat_room_id.in_(room_ids)).order_by(Message.chat_room_id, Message.timestamp, Message.id)
+    for row in _stream(messages, batch_size):
+        yield _line({'type': 'message', 'sender_id': row.sender_id, 'text': row.text, 'timestamp': row.timestamp})
+
+class _Importer:
+    def __init__(self, game_master: User, batch_size: int):
+        self.game_master = game_master
+        self.batch_size = batch_size
+        # Exported user ID -> local user ID
+        self.user_ids = {}
+        self.adventure = None
+        self.chat_room_id = None
+        self.pending = {}
+        self.counts = {}
+
+    def user(self, record: dict):
+        local_id = db.session.scalar(db.select(User.id).where(User.username == record['username']))
+        if local_id is None:
+            local_id = db.session.scalar(db.insert(User).returning(User.id).values(
+                username=record['username'], email=f"{record['username']}@imported.invalid",
+                password_hash=UNUSABLE_PASSWORD_HASH))
+            self._count('users_created')
+        self.user_ids[record['id']] = local_id
+
+    def adventure_record(self, record: dict):
+        if self.game_master is not None:
+            game_master_id = self.game_master.id
+        else:
+            game_master_id = self._local_user(record['game_master_id'])
+        self.adventure = Adventure(record['title'], db.session.get(User, game_master_id))
+        self.adventure.legacy_story_state = record.get('story_state')
+        self.adventure.story_summary = record.get('story_summary')
+        self.adventure.summary_through_seq = record.get('summary_through_seq') or 0
+        if record.get('updated_at'):
+            self.adventure.updated_at = _datetime(record['updated_at'])
+        db.session.add(self.adventure)
+        db.session.flush()
+        room = ChatRoom(self.adventure)
+        db.session.add(room)
+        db.session.flush()
+        self.chat_room_id = room.id
+
+    def row(self, record: dict):
+        kind = record['type']
+        if kind == 'player':
+            self._queue(adventure_players, {'adventure_id': self._adventure_id(),
+                                            'user_id': self._local_user(record['user_id'])})
+        elif kind == 'story_snapshot':
+            self._queue(StorySnapshot, {'adventure_id': self._adventure_id(), 'seq': record['seq'],
+                                        'state': record['state'], 'created_at': _datetime(record['created_at'])})
+        elif kind == 'story_event':
+            self._queue(StoryEvent, {'adventure_id': self._adventure_id(), 'seq': record['seq'],
+                                     'payload': record['payload'], 'created_at': _datetime(record['created_at'])})
+        elif kind == 'game_session':
+            self._queue(GameSession, {'adventure_id': self._adventure_id(), 'session_data': record['data']})
+        elif kind == 'message':
+            self._adventure_id()
+            self._queue(Message, {'chat_room_id': self.chat_room_id, 'sender_id': self._local_user(record['sender_id']),
+                                  'text': record['text'], 'timestamp': _datetime(record['timestamp'])})
+        else:
+            raise ValueError(f"Unknown record type: {kind}")
+
+    def finish(self) -> int:
+        for target in list(self.pending):
+            self._flush(target)
+        if self.adventure is None:
+            raise ValueError("The export contains no adventure.")
+        # Derived from the imported rows rather than trusted from the file
+        self.adventure.player_count = self.counts.get('adventure_players', 0)
+        search = get_search_index()
+        if search is not None:
+            search.index_adventure(self.adventure.id, self.batch_size)
+        return self.adventure.id
+
+    def _adventure_id(self) -> int:
+        if self.adventure is None:
+            raise ValueError("Export records appear before the adventure record.")
+        return self.adventure.id
+
+    def _local_user(self, exported_id: int) -> int:
+        try:
+            return self.user_ids[exported_id]
+        except KeyError:
+            raise ValueError(f"Export references user {exported_id} before its user record.") from None
+
+    def _queue(self, target, row: dict):
+        rows = self.pending.setdefault(target, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self._flush(target)
+
+    def _flush(self, target):
+        rows = self.pending.pop(target, [])
+        if rows:
+            # One executemany INSERT per batch; no ORM objects are built
+            db.session.execute(db.insert(target), rows)
+            self._count(getattr(target, '__tablename__', None) or target.name, len(rows))
+
+    def _count(self, name: str, amount: int = 1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+def import_adventure(lines, game_master: User = None, batch_size: int = EXPORT_BATCH_SIZE) -> tuple:
+    """
+    Imports an adventure from NDJSON lines written by export_adventure, as a
+    new adventure in one transaction. Rows are inserted in batches of
+    batch_size, so memory use does not grow with the size of the export.
+    Users are matched by username; missing ones are created with a
+    placeholder email and without a usable password.
+
+    :param lines: An iterable of NDJSON lines, e.g. an open file.
+    :param game_master: Optional user to own the adventure instead of the exported game master.
+    :param batch_size: Rows per INSERT statement.
+    :return: A (new adventure ID, {table: rows inserted}) tuple.
+    :raises ValueError: If the export is malformed or of an unsupported format.
+    """
+    importer = _Importer(game_master, batch_size)
+    try:
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            kind = record.get('type')
+            if number == 1:
+                if kind != 'export' or record.get('format') != EXPORT_FORMAT:
+                    raise ValueError("Not an adventure export, or an unsupported format version.")
+            elif kind == 'user':
+                importer.user(record)
+            elif kind == 'adventure':
+                importer.adventure_record(record)
+            else:
+                importer.row(record)
+        adventure_id = importer.finish()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return adventure_id, importer.counts
@@ -1,6 +1,9 @@
 ## game_manager.py
 from .models import User, Adventure, GameSession, ChatRoom, db
 from .api import update_adventure_story
+from .jobs import Job, get_job_manager
+from .chat import ChatManager
+from .session_store import get_session_store
 
 class GameManager:
     def __init__(self, user: User):
@@ -9,6 +12,8 @@ class GameManager:
     def create_adventure(self, title: str) -> Adventure:
         new_adventure = Adventure(title=title, game_master=self.user)
         db.session.add(new_adventure)
+        db.session.flush()
+        db.session.add(ChatRoom(new_adventure))
         db.session.commit()
         return new_adventure
 
@@ -26,6 +31,22 @@ class GameManager:
         adventure.remove_player(player)
         db.session.commit()
 
+    def add_players(self, adventure_id: int, user_ids: list) -> int:
+        adventure = Adventure.query.get(adventure_id)
+        if not adventure:
+            raise ValueError(f"Adventure with ID {adventure_id} does not exist.")
+        added = adventure.add_players(user_ids)
+        db.session.commit()
+        return added
+
+    def remove_players(self, adventure_id: int, user_ids: list) -> int:
+        adventure = Adventure.query.get(adventure_id)
+        if not adventure:
+            raise ValueError(f"Adventure with ID {adventure_id} does not exist.")
+        removed = adventure.remove_players(user_ids)
+        db.session.commit()
+        return removed
+
     def start_game_session(self, adventure_id: int) -> GameSession:
         adventure = Adventure.query.get(adventure_id)
         if not adventure:
@@ -39,16 +60,41 @@ class GameManager:
         session = GameSession.query.get(session_id)
         if not session:
             raise ValueError(f"Game session with ID {session_id} does not exist.")
+        store = get_session_store()
+        if store is not None:
+            store.discard(session_id)
         db.session.delete(session)
         db.session.commit()
 
-    def save_game_session(self, session_id: int):
+    def save_game_session(self, session_id: int, data: dict = None):
+        """
+        Saves a game session's state. With the session store enabled the state
+        is kept in memory and written according to SESSION_STORE_DURABILITY;
+        without new data, any pending state is written now.
+
+        :param session_id: ID of the GameSession.
+        :param data: Optional new session state.
+        :raises ValueError: If the session does not exist.
+        """
+        store = get_session_store()
+        if store is not None:
+            if data is not None:
+                store.put(session_id, data)
+            else:
+                store.get(session_id)
+                store.flush([session_id])
+            return
         session = GameSession.query.get(session_id)
         if not session:
             raise ValueError(f"Game session with ID {session_id} does not exist.")
+        if data is not None:
+            session.session_data = data
         session.save_session()
 
     def load_game_session(self, session_id: int) -> dict:
+        store = get_session_store()
+        if store is not None:
+            return store.get(session_id)
         session = GameSession.query.get(session_id)
         if not session:
             raise ValueError(f"Game session with ID {session_id} does not exist.")
@@ -58,16 +104,28 @@ class GameManager:
         chat_room = ChatRoom.query.get(chat_room_id)
         if not chat_room:
             raise ValueError(f"Chat room with ID {chat_room_id} does not exist.")
-        chat_room.send_message(user, message)
+        ChatManager(chat_room).post_message(user, message)
 
-    def get_chat_messages(self, chat_room_id: int) -> list:
+    def get_chat_messages(self, chat_room_id: int, cursor: str = None, limit: int = 50) -> tuple:
         chat_room = ChatRoom.query.get(chat_room_id)
         if not chat_room:
             raise ValueError(f"Chat room with ID {chat_room_id} does not exist.")
-        return chat_room.get_messages()
+        return ChatManager(chat_room).get_messages_page(cursor=cursor, limit=limit)
 
     def generate_and_update_story(self, adventure_id: int, prompt: str):
         try:
-            update_adventure_story(adventure_id, prompt)
+            update_adventure_story(adventure_id, prompt, user_id=self.user.id)
         except Exception as e:
             raise RuntimeError(f"Failed to generate and update story: {e}")
+
+    def submit_story_generation(self, adventure_id: int, prompt: str) -> Job:
+        if not Adventure.query.get(adventure_id):
+            raise ValueError(f"Adventure with ID {adventure_id} does not exist.")
+        return get_job_manager().submit('generate_story', adventure_id=adventure_id, prompt=prompt,
+                                        user_id=self.user.id)
+
+    def get_story_job(self, adventure_id: int, job_id: str) -> Job:
+        job = get_job_manager().get(job_id)
+        if not job or job.kwargs.get('adventure_id') != adventure_id:
+            raise ValueError(f"Story job with ID {job_id} does not exist.")
+        return job
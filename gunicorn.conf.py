@@ -0,0 +1,19 @@
+## gunicorn.conf.py
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Import and build the app once in the master; workers fork with it already loaded
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True').lower() in ['true', '1', 't']
+
+def post_fork(server, worker):
+    # Pooled connections opened in the master must not be shared with the workers
+    app = server.app.wsgi()
+    db = app.extensions.get('sqlalchemy')
+    if db is not None:
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
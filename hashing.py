@@ -0,0 +1,103 @@
+## hashing.py
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from .config import PASSWORD_HASH_METHOD, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_SIZE, PASSWORD_HASH_TIMEOUT
+
+class HashingBusy(RuntimeError):
+    """
+    Raised when the hashing queue is full or an operation timed out, and the
+    request should be shed.
+    """
+
+def normalize_method(method: str) -> str:
+    """
+    Spells out the defaults werkzeug fills in for a hash method, giving the
+    method string it stores in the hash, e.g. 'pbkdf2:sha256' becomes
+    'pbkdf2:sha256:<default iterations>'.
+
+    :param method: A werkzeug hash method such as 'scrypt' or 'pbkdf2:sha256:600000'.
+    :return: The method as it appears in hashes generated with it.
+    """
+    name, *args = method.split(':')
+    if name == 'scrypt' and not args:
+        return 'scrypt:32768:8:1'
+    if name == 'pbkdf2' and len(args) < 2:
+        return f"pbkdf2:{args[0] if args else 'sha256'}:{DEFAULT_PBKDF2_ITERATIONS}"
+    return method
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification on a bounded process pool so that
+    key derivation does not hold the GIL of request threads.
+
+    At most workers + queue_size operations are in flight; beyond that calls
+    fail fast with HashingBusy. With workers=0 hashing runs inline.
+    """
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, queue_size: int = PASSWORD_HASH_QUEUE_SIZE,
+                 method: str = PASSWORD_HASH_METHOD, timeout: float = PASSWORD_HASH_TIMEOUT):
+        self.workers = workers
+        self.method = method
+        self._stored_method = normalize_method(method)
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_size) if workers else None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def hash(self, password: str) -> str:
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """
+        Tells whether a hash was created with parameters other than the current ones.
+
+        :param password_hash: A werkzeug "method$salt$hash" string.
+        :return: True if the hash should be upgraded on the next successful login.
+        """
+        return password_hash.split('$', 1)[0] != self._stored_method
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy("Too many password operations are pending")
+        try:
+            future = self._pool().submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot is freed when the work ends, so operations a caller gave up on still count toward the bound
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise HashingBusy("A password operation timed out") from None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Created lazily, and again in forked children, which cannot use the parent's pool
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    self._pid = os.getpid()
+        return self._executor
+
+_hasher = None
+
+def get_password_hasher() -> PasswordHasher:
+    global _hasher
+    if _hasher is None:
+        _hasher = PasswordHasher()
+    return _hasher
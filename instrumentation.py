@@ -0,0 +1,158 @@
+## instrumentation.py
+import re
+import time
+from flask import g, has_request_context, request
+from markupsafe import escape
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .config import SQL_INSTRUMENTATION_ENABLED, SQL_SLOW_QUERY_COUNT, SQL_N_PLUS_ONE_THRESHOLD, SQL_DEBUG_PANEL
+from .metrics import registry, register_stats
+
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+request_queries = registry.histogram('app_request_db_queries', 'SQL statements executed per request.',
+                                     QUERY_COUNT_BUCKETS)
+request_db_seconds = registry.histogram('app_request_db_seconds', 'Time spent in SQL statements per request.')
+n_plus_one_suspects = registry.counter('app_n_plus_one_suspects_total',
+                                       'Requests that repeated one statement shape past the N+1 threshold.')
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \([^()]*\)', re.IGNORECASE)
+
+def statement_shape(statement: str) -> str:
+    """
+    Reduces a SQL statement to its shape: literals and IN lists are collapsed,
+    so the same query issued for different rows maps to the same shape.
+
+    :param statement: The SQL text sent to the database.
+    :return: The normalized statement.
+    """
+    shape = _WHITESPACE.sub(' ', statement).strip()
+    shape = _STRING_LITERAL.sub('?', shape)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    return _IN_LIST.sub('IN (...)', shape)
+
+class RequestSQLStats:
+    """
+    SQL statements executed while handling one request.
+    """
+    def __init__(self, slow_query_count: int = SQL_SLOW_QUERY_COUNT):
+        self.slow_query_count = slow_query_count
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest = []
+        self.shapes = {}
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.total_time += elapsed
+        shape = statement_shape(statement)
+        self.shapes[shape] = self.shapes.get(shape, 0) + 1
+        if len(self.slowest) < self.slow_query_count or elapsed > self.slowest[-1][0]:
+            self.slowest.append((elapsed, shape))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[self.slow_query_count:]
+
+    def repeated_shapes(self, threshold: int) -> list:
+        """
+        Returns the (shape, count) pairs executed at least `threshold` times,
+        most repeated first. These are the likely N+1 queries.
+        """
+        repeated = [(shape, count) for shape, count in self.shapes.items() if count >= threshold]
+        return sorted(repeated, key=lambda item: item[1], reverse=True)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_stats' in g:
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_stats' in g:
+        start_times = conn.info.get('query_start_time')
+        if start_times:
+            g.sql_stats.record(statement, time.perf_counter() - start_times.pop())
+
+def _render_panel(stats: RequestSQLStats, repeated: list) -> str:
+    rows = ''.join(f'<tr><td>{elapsed * 1000:.2f} ms</td><td><code>{escape(shape)}</code></td></tr>'
+                   for elapsed, shape in stats.slowest)
+    suspects = ''.join(f'<li>{count}&times; <code>{escape(shape)}</code></li>' for shape, count in repeated)
+    return (
+        '<div id="sql-debug-panel" style="font:12px monospace;border-top:2px solid #c33;padding:8px;background:#fff">'
+        f'<strong>SQL: {stats.count} queries in {stats.total_time * 1000:.2f} ms</strong>'
+        f'<table>{rows}</table>'
+        + (f'<p>Likely N+1 queries:</p><ul>{suspects}</ul>' if suspects else '')
+        + '</div>'
+    )
+
+def init_instrumentation(app):
+    """
+    Initialize per-request SQL instrumentation and the /metrics endpoint.
+
+    Each response carries the request's query count and DB time in the
+    X-DB-Queries, X-DB-Time-Ms and Server-Timing headers. Statement shapes
+    repeated SQL_N_PLUS_ONE_THRESHOLD times or more are logged as likely N+1
+    queries and counted in X-DB-N-Plus-One. With SQL_DEBUG_PANEL set, HTML pages
+    also get a panel listing the slowest statements.
+
+    :param app: The Flask application object.
+    """
+    if not app.config.get('SQL_INSTRUMENTATION_ENABLED', SQL_INSTRUMENTATION_ENABLED):
+        return
+    slow_query_count = app.config.get('SQL_SLOW_QUERY_COUNT', SQL_SLOW_QUERY_COUNT)
+    threshold = app.config.get('SQL_N_PLUS_ONE_THRESHOLD', SQL_N_PLUS_ONE_THRESHOLD)
+    debug_panel = app.config.get('SQL_DEBUG_PANEL', SQL_DEBUG_PANEL)
+
+    # Listening on the Engine class covers every engine, including ones created later
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_sql_stats():
+        g.sql_stats = RequestSQLStats(slow_query_count)
+
+    @app.after_request
+    def report_sql_stats(response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+        endpoint = request.endpoint or 'unknown'
+        request_queries.observe(stats.count, endpoint=endpoint)
+        request_db_seconds.observe(stats.total_time, endpoint=endpoint)
+
+        total_ms = stats.total_time * 1000
+        response.headers['X-DB-Queries'] = str(stats.count)
+        response.headers['X-DB-Time-Ms'] = f'{total_ms:.2f}'
+        response.headers.add('Server-Timing', f'db;dur={total_ms:.2f};desc="{stats.count} queries"')
+
+        repeated = stats.repeated_shapes(threshold)
+        if repeated:
+            n_plus_one_suspects.inc(endpoint=endpoint)
+            response.headers['X-DB-N-Plus-One'] = str(len(repeated))
+            for shape, count in repeated:
+                app.logger.warning(f"Likely N+1 query in {endpoint}: {count} executions of {shape}")
+
+        if (debug_panel and response.mimetype == 'text/html' and not response.direct_passthrough
+                and not response.is_streamed):
+            body = response.get_data(as_text=True)
+            if '</body>' in body:
+                response.set_data(body.replace('</body>', _render_panel(stats, repeated) + '</body>', 1))
+        return response
+
+    def metrics():
+        return app.response_class(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
+
+    # Imported here to keep this module free of the model and adapter imports
+    from .api import prompt_cache_stats
+    from .auth import user_cache_stats
+    from .page_cache import page_cache_stats
+    register_stats('app_prompt_cache', prompt_cache_stats)
+    register_stats('app_user_cache', user_cache_stats)
+    register_stats('app_page_cache', page_cache_stats)
+    for prefix, extension in (('app_chat_writer', 'chat_writer'), ('app_model_usage', 'usage_recorder'),
+                              ('app_session_store', 'session_store')):
+        instance = app.extensions.get(extension)
+        register_stats(prefix, instance.stats if instance is not None else None)
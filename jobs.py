@@ -0,0 +1,295 @@
+## jobs.py
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from .background import ProcessThreads
+from .config import (STORY_JOB_BACKEND, STORY_JOB_WORKERS, STORY_JOB_QUEUE_SIZE, STORY_JOB_RETENTION,
+                     STORY_JOB_STATUS_STORE, STORY_JOB_STATUS_TTL)
+from .models import db, StoryJob
+
+# Registry of task functions that can be run by name on a worker
+_tasks = {}
+
+def task(name: str):
+    """
+    Register a function as a named job task.
+
+    Jobs are submitted by task name plus JSON-serializable keyword arguments so
+    that every backend, including broker-style ones, can ship them as messages.
+
+    :param name: The name under which the task is registered.
+    """
+    def decorator(func):
+        _tasks[name] = func
+        return func
+    return decorator
+
+class JobQueueFull(RuntimeError):
+    """
+    Raised when a job is submitted while the backend queue is at capacity.
+    """
+
+class Job:
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+    def __init__(self, task_name: str, kwargs: dict):
+        self.id = uuid.uuid4().hex
+        self.task_name = task_name
+        self.kwargs = kwargs
+        self.status = Job.PENDING
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (Job.SUCCEEDED, Job.FAILED)
+
+    @staticmethod
+    def from_row(row) -> 'Job':
+        job = Job(row.task, row.kwargs)
+        job.id = row.id
+        job.status = row.status
+        job.result = row.result
+        job.error = row.error
+        job.submitted_at = row.submitted_at
+        job.started_at = row.started_at
+        job.finished_at = row.finished_at
+        return job
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'task': self.task_name,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+class ThreadPoolBackend:
+    """
+    Runs jobs on an in-process thread pool with a bounded number of pending jobs.
+    """
+    def __init__(self, max_workers: int, max_queue: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='story-job')
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+
+    def submit(self, message: str, handler):
+        if not self._slots.acquire(blocking=False):
+            raise JobQueueFull("Too many story generation jobs are pending")
+
+        def run():
+            try:
+                handler(message)
+            finally:
+                self._slots.release()
+
+        self._executor.submit(run)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+class LocalBrokerBackend:
+    """
+    Local stand-in for an external message broker.
+
+    Job messages are put on a bounded queue and consumed by dedicated worker
+    threads, mirroring how a broker-backed deployment hands work to consumers.
+    """
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._workers = ProcessThreads(*[(f'story-broker-{i}', self._consume) for i in range(max_workers)],
+                                       reset=self._reset_queue)
+
+    def submit(self, message: str, handler):
+        self._workers.ensure_started()
+        try:
+            self._queue.put_nowait((message, handler))
+        except queue.Full:
+            raise JobQueueFull("Too many story generation jobs are pending") from None
+
+    def _reset_queue(self):
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+
+    def _consume(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            message, handler = item
+            try:
+                handler(message)
+            finally:
+                self._queue.task_done()
+
+    def shutdown(self, wait: bool = True):
+        for _ in self._workers.threads:
+            self._queue.put(None)
+        if wait:
+            for worker in self._workers.threads:
+                worker.join()
+
+BACKENDS = {
+    'thread': ThreadPoolBackend,
+    'local_broker': LocalBrokerBackend,
+}
+
+STATUS_STORES = ('database', 'memory')
+
+class JobManager:
+    """
+    Submits jobs to a backend and tracks their status.
+
+    Jobs run in the process that accepted them, which keeps its own copy of
+    their status. With the 'database' status store every change is also
+    written to the story_job table, so a status poll answered by another
+    worker still finds the job. The 'memory' store skips those writes and
+    only works with a single worker or sticky routing.
+    """
+    def __init__(self, app, backend, retention: int = STORY_JOB_RETENTION,
+                 status_store: str = STORY_JOB_STATUS_STORE, status_ttl: float = STORY_JOB_STATUS_TTL):
+        if status_store not in STATUS_STORES:
+            raise ValueError(f"Unknown job status store '{status_store}'.")
+        self.app = app
+        self.backend = backend
+        self.retention = retention
+        self.status_store = status_store
+        self.status_ttl = status_ttl
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, task_name: str, **kwargs) -> Job:
+        """
+        Submits a job and returns immediately.
+
+        :param task_name: The registered name of the task to run.
+        :param kwargs: JSON-serializable keyword arguments for the task.
+        :return: The pending Job.
+        :raises ValueError: If no task is registered under the given name.
+        :raises JobQueueFull: If the backend cannot accept more jobs.
+        """
+        if task_name not in _tasks:
+            raise ValueError(f"Unknown job task '{task_name}'.")
+        job = Job(task_name, kwargs)
+        message = json.dumps({'job_id': job.id, 'task': task_name, 'kwargs': kwargs})
+        self._store(job, insert=True)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict_finished()
+        try:
+            self.backend.submit(message, self._handle)
+        except JobQueueFull:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            self._unstore(job)
+            raise
+        return job
+
+    def get(self, job_id: str):
+        """
+        Looks up a job submitted to any worker.
+
+        :param job_id: The job ID.
+        :return: The Job, or None if it does not exist or has expired.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None or self.status_store != 'database':
+            return job
+        row = db.session.get(StoryJob, job_id)
+        return Job.from_row(row) if row is not None else None
+
+    def shutdown(self, wait: bool = True):
+        self.backend.shutdown(wait=wait)
+
+    def _handle(self, message: str):
+        payload = json.loads(message)
+        with self._lock:
+            job = self._jobs.get(payload['job_id'])
+        if job is None:
+            return
+        with self.app.app_context():
+            job.status = Job.RUNNING
+            job.started_at = time.time()
+            self._store(job)
+            try:
+                job.result = _tasks[payload['task']](**payload['kwargs'])
+                job.status = Job.SUCCEEDED
+            except Exception as e:
+                self.app.logger.error(f"Job {job.id} ({job.task_name}) failed: {e}")
+                job.error = str(e)
+                job.status = Job.FAILED
+            job.finished_at = time.time()
+            self._store(job, expire_before=job.finished_at - self.status_ttl)
+
+    def _store(self, job: Job, insert: bool = False, expire_before: float = None):
+        # Own short transaction, so the status is visible at once and never tied to the caller's session
+        if self.status_store != 'database':
+            return
+        table = StoryJob.__table__
+        values = {'status': job.status, 'result': job.result, 'error': job.error,
+                  'started_at': job.started_at, 'finished_at': job.finished_at}
+        try:
+            with db.engine.begin() as connection:
+                if insert:
+                    connection.execute(db.insert(table).values(id=job.id, task=job.task_name, kwargs=job.kwargs,
+                                                               submitted_at=job.submitted_at, **values))
+                else:
+                    connection.execute(db.update(table).where(table.c.id == job.id).values(**values))
+                if expire_before is not None:
+                    connection.execute(db.delete(table).where(table.c.finished_at < expire_before))
+        except Exception as e:
+            if insert:
+                raise
+            # The job itself is unaffected; pollers on other workers see a stale status
+            self.app.logger.error(f"Failed to record status of job {job.id}: {e}")
+
+    def _unstore(self, job: Job):
+        if self.status_store == 'database':
+            with db.engine.begin() as connection:
+                connection.execute(db.delete(StoryJob.__table__).where(StoryJob.__table__.c.id == job.id))
+
+    def _evict_finished(self):
+        # Drop the oldest finished jobs once we retain more than allowed
+        excess = len(self._jobs) - self.retention
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done][:excess]:
+            del self._jobs[job_id]
+
+def init_jobs(app):
+    """
+    Initialize the job subsystem for the application.
+
+    :param app: The Flask application object.
+    """
+    backend_name = app.config.get('STORY_JOB_BACKEND', STORY_JOB_BACKEND)
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Unknown job backend '{backend_name}'.")
+    backend = BACKENDS[backend_name](
+        max_workers=app.config.get('STORY_JOB_WORKERS', STORY_JOB_WORKERS),
+        max_queue=app.config.get('STORY_JOB_QUEUE_SIZE', STORY_JOB_QUEUE_SIZE),
+    )
+    app.extensions['story_jobs'] = JobManager(
+        app, backend,
+        retention=app.config.get('STORY_JOB_RETENTION', STORY_JOB_RETENTION),
+        status_store=app.config.get('STORY_JOB_STATUS_STORE', STORY_JOB_STATUS_STORE),
+        status_ttl=app.config.get('STORY_JOB_STATUS_TTL', STORY_JOB_STATUS_TTL),
+    )
+
+def get_job_manager() -> JobManager:
+    return current_app.extensions['story_jobs']
@@ -1,32 +1,90 @@
 ## main.py
 from flask import Flask
-from .config import SECRET_KEY, DEBUG, SQLALCHEMY_DATABASE_URI, OPENAI_API_KEY, SOCKETIO_MESSAGE_QUEUE, REMEMBER_COOKIE_DURATION, PERMANENT_SESSION_LIFETIME
-from .database import db, init_db
+from . import config
+from .database import init_database
 from .auth import init_auth
-from .views import app as views_blueprint
+from .jobs import init_jobs
+from .cli import init_cli
+from .realtime import init_realtime
+from .chat_writer import init_chat_writer
+from .session_store import init_session_store
+from .page_cache import init_page_cache
+from .search import init_search
+from .availability import init_availability
+from .telemetry import init_telemetry
+from .instrumentation import init_instrumentation
+from .views import bp as views_blueprint
 
-app = Flask(__name__)
+def create_app(config_overrides: dict = None) -> Flask:
+    """
+    Build and configure the application.
 
-# Configuration setup
-app.config['SECRET_KEY'] = SECRET_KEY
-app.config['DEBUG'] = DEBUG
-app.config['SQLALCHEMY_DATABASE_URI'] = SQLALCHEMY_DATABASE_URI
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['OPENAI_API_KEY'] = OPENAI_API_KEY
-app.config['SOCKETIO_MESSAGE_QUEUE'] = SOCKETIO_MESSAGE_QUEUE
-app.config['REMEMBER_COOKIE_DURATION'] = REMEMBER_COOKIE_DURATION
-app.config['PERMANENT_SESSION_LIFETIME'] = PERMANENT_SESSION_LIFETIME
+    Nothing here touches the database or starts threads: tables are created
+    with the init-db command, and background workers start on first use in
+    each process, so the app can be preloaded in a forking server's master.
 
-# Initialize database
-db.init_app(app)
-with app.app_context():
-    init_db()
+    :param config_overrides: Configuration values applied over config.py.
+    :return: The Flask application object.
+    """
+    app = Flask(__name__)
 
-# Initialize authentication
-init_auth(app)
+    # Configuration setup
+    app.config['SECRET_KEY'] = config.SECRET_KEY
+    app.config['DEBUG'] = config.DEBUG
+    app.config['SQLALCHEMY_DATABASE_URI'] = config.SQLALCHEMY_DATABASE_URI
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['OPENAI_API_KEY'] = config.OPENAI_API_KEY
+    app.config['SOCKETIO_MESSAGE_QUEUE'] = config.SOCKETIO_MESSAGE_QUEUE
+    app.config['REMEMBER_COOKIE_DURATION'] = config.REMEMBER_COOKIE_DURATION
+    app.config['PERMANENT_SESSION_LIFETIME'] = config.PERMANENT_SESSION_LIFETIME
+    if config_overrides:
+        app.config.update(config_overrides)
 
-# Register blueprints
-app.register_blueprint(views_blueprint)
+    # Initialize database
+    init_database(app)
+
+    # Initialize authentication
+    init_auth(app)
+
+    # Initialize the username/email availability index
+    init_availability(app)
+
+    # Initialize story generation jobs
+    init_jobs(app)
+
+    # Initialize buffered chat writes
+    init_chat_writer(app)
+
+    # Initialize the hot game session store
+    init_session_store(app)
+
+    # Initialize the adventure page cache
+    init_page_cache(app)
+
+    # Initialize full-text search
+    init_search(app)
+
+    # Initialize chat push
+    init_realtime(app)
+
+    # Initialize model-call telemetry and quotas
+    init_telemetry(app)
+
+    # Initialize SQL instrumentation and /metrics
+    init_instrumentation(app)
+
+    # Register CLI commands
+    init_cli(app)
+
+    # Register blueprints
+    app.register_blueprint(views_blueprint)
+
+    return app
 
 if __name__ == '__main__':
-    app.run()
+    app = create_app()
+    socketio = app.extensions.get('chat_socketio')
+    if socketio is not None:
+        socketio.run(app)
+    else:
+        app.run()
@@ -0,0 +1,144 @@
+## metrics.py
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _label_text(labels: tuple) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            lines += [f'{self.name}{_label_text(key)} {value}' for key, value in sorted(self._values.items())]
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series['counts']):
+                    lines.append(f'{self.name}_bucket{_label_text(key + (("le", bound),))} {count}')
+                lines.append(f'{self.name}_bucket{_label_text(key + (("le", "+Inf"),))} {series["count"]}')
+                lines.append(f'{self.name}_sum{_label_text(key)} {series["sum"]}')
+                lines.append(f'{self.name}_count{_label_text(key)} {series["count"]}')
+        return lines
+
+class MetricsRegistry:
+    """
+    Holds the process's metrics and renders them in the Prometheus text format.
+
+    Besides counters and histograms, collectors can report gauges computed at
+    scrape time: a collector returns a dict of {metric_name: value}.
+    Collectors are registered by name, so building the app again replaces
+    them rather than emitting every gauge twice.
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._get_or_create(name, lambda: Counter(name, help))
+
+    def histogram(self, name: str, help: str, buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(name, lambda: Histogram(name, help, buckets))
+
+    def add_collector(self, name: str, collector):
+        """
+        Registers a collector, replacing any earlier one of the same name.
+
+        :param name: Identifies the collector, e.g. its metric prefix.
+        :param collector: A callable returning {metric_name: value}.
+        """
+        with self._lock:
+            self._collectors[name] = collector
+
+    def remove_collector(self, name: str):
+        with self._lock:
+            self._collectors.pop(name, None)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.values())
+        for metric in metrics:
+            lines += metric.render()
+        # A metric family may only be declared once in the exposition
+        seen = set(self._metrics)
+        for collector in collectors:
+            for name, value in sorted(collector().items()):
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)) and name not in seen:
+                    seen.add(name)
+                    lines += [f'# TYPE {name} gauge', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+    def _get_or_create(self, name: str, factory):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = factory()
+            return self._metrics[name]
+
+registry = MetricsRegistry()
+
+def prefixed(prefix: str, stats_func):
+    """
+    Wraps a stats function returning a flat dict as a registry collector.
+
+    :param prefix: The metric name prefix, e.g. 'app_prompt_cache'.
+    :param stats_func: A callable returning {name: number}.
+    """
+    return lambda: {f'{prefix}_{key}': value for key, value in stats_func().items()}
+
+def register_stats(prefix: str, stats_func):
+    """
+    Registers a stats function as a collector named after its prefix,
+    replacing the one registered by an earlier app, or removes the
+    collector when stats_func is None.
+
+    :param prefix: The metric name prefix, e.g. 'app_chat_writer'.
+    :param stats_func: A callable returning {name: number}, or None.
+    """
+    if stats_func is None:
+        registry.remove_collector(prefix)
+    else:
+        registry.add_collector(prefix, prefixed(prefix, stats_func))
@@ -0,0 +1,137 @@
+## migrations.py
+import base64
+import pickle
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import table, column, select, update, inspect, text, Integer, LargeBinary
+from .models import db
+from .serialization import get_serializer, is_serialized
+
+# Columns that used to be db.PickleType and now hold Serializer blobs
+PICKLE_COLUMNS = [
+    ('adventure', 'story_state'),
+    ('game_session', 'session_data'),
+]
+
+def _coerce(value):
+    # Maps the non-JSON types pickled state commonly holds onto JSON ones
+    if isinstance(value, dict):
+        return {str(key): _coerce(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_coerce(item) for item in value]
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode('ascii')
+    return value
+
+def _convert(serializer, blob: bytes) -> bytes:
+    # Trusted one-off load of rows written by this application
+    value = pickle.loads(blob)
+    try:
+        return serializer.dumps(value)
+    except (TypeError, ValueError):
+        return serializer.dumps(_coerce(value))
+
+def migrate_pickle_blobs(batch_size: int = 500) -> dict:
+    """
+    Rewrites pickled state blobs in place using the configured Serializer.
+
+    Rows are walked in primary key order in batches, each committed on its own,
+    so the migration can be interrupted and re-run; rows that already carry a
+    serialization header are skipped. Values the serializer cannot hold are
+    coerced (sets and tuples to lists, dates to ISO strings, bytes to base64,
+    keys to strings); a row that still cannot be converted is logged, left
+    as it is and reported, and the migration carries on.
+
+    :param batch_size: The number of rows to convert per transaction.
+    :return: A (converted, failed) tuple of dicts mapping 'table.column' to the
+        number of rows converted and to the IDs of rows left unconverted.
+    """
+    serializer = get_serializer()
+    converted = {}
+    failed = {}
+    for table_name, column_name in PICKLE_COLUMNS:
+        # Lightweight table so we read the raw bytes rather than decoded values
+        raw = table(table_name, column('id', Integer), column(column_name, LargeBinary))
+        blob_column = raw.c[column_name]
+        count = 0
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(raw.c.id, blob_column)
+                .where(raw.c.id > last_id, blob_column.isnot(None))
+                .order_by(raw.c.id)
+                .limit(batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            for row_id, blob in rows:
+                if is_serialized(blob):
+                    continue
+                try:
+                    new_blob = _convert(serializer, blob)
+                except Exception as e:
+                    current_app.logger.error(f"Cannot convert {table_name}.{column_name} for row {row_id}: {e}")
+                    failed.setdefault(f'{table_name}.{column_name}', []).append(row_id)
+                    continue
+                db.session.execute(update(raw).where(raw.c.id == row_id).values({column_name: new_blob}))
+                count += 1
+            last_id = rows[-1][0]
+            db.session.commit()
+        converted[f'{table_name}.{column_name}'] = count
+    return converted, failed
+
+def create_missing_indexes() -> list:
+    """
+    Creates every index declared on the models that is missing from the database.
+
+    :return: The names of the indexes that were checked.
+    """
+    names = []
+    for model_table in db.metadata.sorted_tables:
+        for index in model_table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+            names.append(index.name)
+    return names
+
+def add_missing_columns() -> list:
+    """
+    Adds columns declared on the models that existing tables are missing.
+    New columns must be nullable or carry a server default.
+
+    :return: The 'table.column' names that were added.
+    """
+    inspector = inspect(db.engine)
+    preparer = db.engine.dialect.identifier_preparer
+    added = []
+    for model_table in db.metadata.sorted_tables:
+        if not inspector.has_table(model_table.name):
+            continue
+        existing = {c['name'] for c in inspector.get_columns(model_table.name)}
+        for model_column in model_table.columns:
+            if model_column.name in existing:
+                continue
+            ddl = f'ALTER TABLE {preparer.format_table(model_table)} ADD COLUMN {preparer.format_column(model_column)} ' \
+                  f'{model_column.type.compile(db.engine.dialect)}'
+            if model_column.server_default is not None:
+                ddl += f" DEFAULT {model_column.server_default.arg}"
+            if not model_column.nullable:
+                ddl += ' NOT NULL'
+            db.session.execute(text(ddl))
+            added.append(f'{model_table.name}.{model_column.name}')
+    db.session.commit()
+    return added
+
+def backfill_player_counts() -> int:
+    """
+    Recomputes Adventure.player_count from the adventure_players table.
+
+    :return: The number of adventures updated.
+    """
+    result = db.session.execute(text(
+        "UPDATE adventure SET player_count = "
+        "(SELECT COUNT(*) FROM adventure_players WHERE adventure_players.adventure_id = adventure.id)"
+    ))
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,224 @@
+## model_client.py
+import hashlib
+import os
+import random
+import threading
+import time
+from typing import TYPE_CHECKING
+from .config import (MODEL_REQUESTS_PER_SECOND, MODEL_TOKENS_PER_SECOND, MODEL_MAX_RETRIES, MODEL_BACKOFF_BASE,
+                     MODEL_BACKOFF_MAX, MODEL_POOL_SIZE, MODEL_RATE_LIMIT_TIMEOUT)
+
+if TYPE_CHECKING:
+    # Only for annotations; imported at runtime by get_http_session
+    import requests
+
+def get_openai():
+    """
+    Returns the openai module, importing it on first use. It is slow to import
+    and only needed once a real model call is made.
+    """
+    import openai
+    return openai
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimates the number of tokens in a text: ~4 characters per token.
+    """
+    return len(text) // 4
+
+class RateLimitTimeout(RuntimeError):
+    """
+    Raised when the local rate limiter cannot admit a request in time.
+    """
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `rate` tokens per second.
+    """
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1, timeout: float = None):
+        """
+        Takes tokens from the bucket, waiting for them to refill if needed.
+
+        :param amount: The number of tokens to take; clamped to the bucket capacity.
+        :param timeout: The maximum number of seconds to wait.
+        :raises RateLimitTimeout: If the tokens are not available within the timeout.
+        """
+        amount = min(amount, self.capacity)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                raise RateLimitTimeout("Model request rate limit exceeded")
+            time.sleep(wait)
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into a single execution.
+    """
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = SingleFlight._Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+def is_retryable(error: Exception) -> bool:
+    openai = get_openai()
+    if isinstance(error, (openai.error.RateLimitError, openai.error.APIConnectionError, openai.error.Timeout,
+                          openai.error.ServiceUnavailableError, openai.error.TryAgain)):
+        return True
+    status = getattr(error, 'http_status', None)
+    return isinstance(error, openai.error.APIError) and status is not None and status >= 500
+
+class ModelClient:
+    """
+    Process-wide client for the completion API.
+
+    Every request is admitted by request and token rate limiters, retried with
+    jittered exponential backoff on retryable errors, and identical concurrent
+    completions share a single upstream call. HTTP connections come from one
+    pooled session per process.
+    """
+    def __init__(self, api_key: str, requests_per_second: float = MODEL_REQUESTS_PER_SECOND,
+                 tokens_per_second: float = MODEL_TOKENS_PER_SECOND, max_retries: int = MODEL_MAX_RETRIES,
+                 backoff_base: float = MODEL_BACKOFF_BASE, backoff_max: float = MODEL_BACKOFF_MAX,
+                 rate_limit_timeout: float = MODEL_RATE_LIMIT_TIMEOUT):
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limit_timeout = rate_limit_timeout
+        self.request_bucket = TokenBucket(requests_per_second)
+        self.token_bucket = TokenBucket(tokens_per_second)
+        self.single_flight = SingleFlight()
+        get_openai().requestssession = get_http_session()
+
+    def complete(self, prompt: str, engine: str, max_tokens: int) -> str:
+        """
+        Requests a completion, coalescing identical in-flight requests.
+
+        :param prompt: The prompt text.
+        :param engine: The model engine.
+        :param max_tokens: The maximum number of completion tokens.
+        :return: The completion text.
+        """
+        key = hashlib.sha256(f'{engine}\0{max_tokens}\0{prompt}'.encode('utf-8')).hexdigest()
+
+        def call():
+            response = self._create(prompt=prompt, engine=engine, max_tokens=max_tokens)
+            return response.choices[0].text.strip() if response.choices else ""
+
+        return self.single_flight.do(key, call)
+
+    def stream(self, prompt: str, engine: str, max_tokens: int):
+        """
+        Opens a streaming completion. Retries apply to opening the stream only.
+
+        :return: An iterator of completion chunks.
+        """
+        return self._create(prompt=prompt, engine=engine, max_tokens=max_tokens, stream=True)
+
+    def _create(self, prompt: str, max_tokens: int, **kwargs):
+        estimated_tokens = estimate_tokens(prompt) + max_tokens
+        openai = get_openai()
+        attempt = 0
+        while True:
+            self.request_bucket.acquire(1, timeout=self.rate_limit_timeout)
+            self.token_bucket.acquire(estimated_tokens, timeout=self.rate_limit_timeout)
+            try:
+                return openai.Completion.create(api_key=self.api_key, prompt=prompt, max_tokens=max_tokens, **kwargs)
+            except openai.error.OpenAIError as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                time.sleep(self._backoff(attempt, e))
+                attempt += 1
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        # Full jitter, but never retry sooner than the server asked us to
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = (getattr(error, 'headers', None) or {}).get('retry-after')
+        try:
+            return max(delay, float(retry_after)) if retry_after else delay
+        except ValueError:
+            return delay
+
+_clients = {}
+_clients_lock = threading.RLock()
+_sessions = {}
+
+def get_http_session(pool_size: int = MODEL_POOL_SIZE) -> 'requests.Session':
+    """
+    Returns the pooled HTTP session for this process.
+
+    :param pool_size: The maximum number of pooled connections per host.
+    :return: The shared requests.Session.
+    """
+    pid = os.getpid()
+    session = _sessions.get(pid)
+    if session is None:
+        with _clients_lock:
+            session = _sessions.get(pid)
+            if session is None:
+                # Imported here with openai; neither is needed until a real model call
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                session.mount('https://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+                _sessions.clear()
+                _sessions[pid] = session
+    return session
+
+def get_model_client(api_key: str) -> ModelClient:
+    """
+    Returns the client for an API key, creating it once per process.
+
+    :param api_key: The API key the client authenticates with.
+    :return: The shared ModelClient.
+    """
+    key = (os.getpid(), api_key)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = ModelClient(api_key)
+    return client
@@ -1,11 +1,15 @@
 ## models.py
 from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from .serialization import SerializedType
+from .hashing import get_password_hasher
+from .config import STORY_SNAPSHOT_INTERVAL
+from .database import db
 
-db = SQLAlchemy()
-
-class User(db.Model):
+class User(UserMixin, db.Model):
     __tablename__ = 'user'
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -19,10 +23,13 @@ class User(db.Model):
         self.set_password(password)
 
     def set_password(self, password: str):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = get_password_hasher().hash(password)
 
     def check_password(self, password: str) -> bool:
-        return check_password_hash(self.password_hash, password)
+        return get_password_hasher().verify(self.password_hash, password)
+
+    def password_needs_rehash(self) -> bool:
+        return get_password_hasher().needs_rehash(self.password_hash)
 
     def get_id(self) -> str:
         return str(self.id)
@@ -32,29 +39,217 @@ class Adventure(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(120), nullable=False)
     game_master_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    story_state = db.Column(db.PickleType, nullable=True)
+    # State written before the story event log existed; the base the log folds onto
+    legacy_story_state = db.Column('story_state', SerializedType, nullable=True)
+    # Maintained by add_players/remove_players so counting never scans adventure_players
+    player_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped whenever the story, the player list or the title changes; drives page caching
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+    # Rolling summary of the story up to summary_through_seq; maintained by context_builder
+    story_summary = db.Column(db.Text, nullable=True)
+    summary_through_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     players = db.relationship('User', secondary='adventure_players', backref=db.backref('adventures_joined', lazy='dynamic'))
 
+    # Rows per multi-row statement, well under SQLite's bound parameter limit
+    MEMBERSHIP_CHUNK_SIZE = 400
+
     def __init__(self, title: str, game_master: User):
         self.title = title
         self.game_master_id = game_master.id
 
-    def add_player(self, player: User):
-        if player not in self.players:
-            self.players.append(player)
+    def has_player(self, user_id: int) -> bool:
+        return db.session.query(db.exists().where(
+            adventure_players.c.adventure_id == self.id, adventure_players.c.user_id == user_id)).scalar()
+
+    def add_player(self, player: User) -> bool:
+        return self.add_players([player.id]) > 0
+
+    def remove_player(self, player: User) -> bool:
+        return self.remove_players([player.id]) > 0
+
+    def add_players(self, user_ids) -> int:
+        """
+        Adds players with insert-or-ignore statements; existing members are skipped.
+
+        :param user_ids: IDs of the users to add.
+        :return: The number of players actually added.
+        """
+        added = 0
+        user_ids = list(dict.fromkeys(user_ids))
+        for start in range(0, len(user_ids), self.MEMBERSHIP_CHUNK_SIZE):
+            rows = [{'adventure_id': self.id, 'user_id': user_id}
+                    for user_id in user_ids[start:start + self.MEMBERSHIP_CHUNK_SIZE]]
+            added += db.session.execute(_insert_ignore(adventure_players).values(rows)).rowcount
+        self._adjust_player_count(added)
+        return added
+
+    def remove_players(self, user_ids) -> int:
+        """
+        Removes players with bulk deletes; non-members are ignored.
+
+        :param user_ids: IDs of the users to remove.
+        :return: The number of players actually removed.
+        """
+        removed = 0
+        user_ids = list(dict.fromkeys(user_ids))
+        for start in range(0, len(user_ids), self.MEMBERSHIP_CHUNK_SIZE):
+            removed += db.session.execute(adventure_players.delete().where(
+                adventure_players.c.adventure_id == self.id,
+                adventure_players.c.user_id.in_(user_ids[start:start + self.MEMBERSHIP_CHUNK_SIZE]))).rowcount
+        self._adjust_player_count(-removed)
+        return removed
+
+    def _adjust_player_count(self, delta: int):
+        if delta:
+            # Increment in SQL so concurrent joins don't overwrite each other's counts
+            Adventure.query.filter_by(id=self.id).update({
+                Adventure.player_count: Adventure.player_count + delta,
+                Adventure.version: Adventure.version + 1,
+                Adventure.updated_at: datetime.utcnow(),
+            }, synchronize_session=False)
+            _record_change(db.session, self.id)
+        db.session.expire(self, ['player_count', 'players', 'version', 'updated_at'])
+
+    def bump_version(self):
+        """
+        Marks the adventure as changed so cached pages and validators are refreshed.
+        """
+        if self.id is None:
+            return
+        Adventure.query.filter_by(id=self.id).update({
+            Adventure.version: Adventure.version + 1,
+            Adventure.updated_at: datetime.utcnow(),
+        }, synchronize_session=False)
+        _record_change(db.session, self.id)
+        db.session.expire(self, ['version', 'updated_at'])
+
+    @property
+    def story_state(self) -> dict:
+        # Materialized from the latest snapshot plus the short tail of events after it
+        if getattr(self, '_story_state_cache', None) is None:
+            self._story_state_cache = StoryEvent.materialize(self)
+        return self._story_state_cache
+
+    def update_story_state(self, state: dict) -> 'StoryEvent':
+        event = StoryEvent.append(self, state)
+        self._story_state_cache = None
+        self.bump_version()
+        # Indexed here so that every writer of the story log keeps search in step, in the same transaction
+        search = current_app.extensions.get('search') if has_app_context() else None
+        if search is not None:
+            search.index_story_event(self.id, event.seq, state, event.created_at)
+        return event
+
+    def story_state_at(self, seq: int) -> dict:
+        return StoryEvent.materialize(self, seq)
+
+def _record_change(session, adventure_id: int):
+    # Collected per transaction; listeners act on them once the commit succeeds
+    session.info.setdefault('changed_adventures', set()).add(adventure_id)
+
+@db.event.listens_for(Adventure, 'before_update')
+def _bump_version_on_title_change(mapper, connection, target):
+    if db.inspect(target).attrs.title.history.has_changes():
+        target.version = Adventure.version + 1
+        target.updated_at = datetime.utcnow()
+        _record_change(db.inspect(target).session, target.id)
+
+class StoryEvent(db.Model):
+    __tablename__ = 'story_event'
+    __table_args__ = (db.UniqueConstraint('adventure_id', 'seq', name='uq_story_event_adventure_seq'),)
+    id = db.Column(db.Integer, primary_key=True)
+    adventure_id = db.Column(db.Integer, db.ForeignKey('adventure.id'), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    payload = db.Column(SerializedType, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __init__(self, adventure_id: int, seq: int, payload: dict):
+        self.adventure_id = adventure_id
+        self.seq = seq
+        self.payload = payload
+
+    @staticmethod
+    def head_seq(adventure_id: int) -> int:
+        # A snapshot can be ahead of every remaining event, so new events must also land after it
+        event_head = db.session.query(db.func.max(StoryEvent.seq)).filter_by(adventure_id=adventure_id).scalar()
+        snapshot_head = db.session.query(db.func.max(StorySnapshot.seq)).filter_by(adventure_id=adventure_id).scalar()
+        return max(event_head or 0, snapshot_head or 0)
+
+    @staticmethod
+    def append(adventure: Adventure, payload: dict, retries: int = 3) -> 'StoryEvent':
+        """
+        Appends an event to an adventure's story log, writing a snapshot every
+        STORY_SNAPSHOT_INTERVAL events.
 
-    def remove_player(self, player: User):
-        if player in self.players:
-            self.players.remove(player)
+        :param adventure: The Adventure the event belongs to.
+        :param payload: The state changes to fold onto the story state.
+        :param retries: How often to retry when a concurrent writer takes the same seq.
+        :return: The new StoryEvent.
+        """
+        for attempt in range(retries + 1):
+            event = StoryEvent(adventure.id, StoryEvent.head_seq(adventure.id) + 1, payload)
+            try:
+                with db.session.begin_nested():
+                    db.session.add(event)
+            except IntegrityError:
+                if attempt == retries:
+                    raise
+                continue
+            if event.seq % STORY_SNAPSHOT_INTERVAL == 0:
+                StorySnapshot.write(adventure, event.seq)
+            return event
 
-    def update_story_state(self, state: dict):
-        self.story_state = state
+    @staticmethod
+    def materialize(adventure: Adventure, seq: int = None) -> dict:
+        """
+        Rebuilds an adventure's story state from the log.
+
+        :param adventure: The Adventure to rebuild.
+        :param seq: Optional event sequence number to rewind to; defaults to the latest.
+        :return: The story state as of that event.
+        """
+        snapshot_query = StorySnapshot.query.filter_by(adventure_id=adventure.id)
+        if seq is not None:
+            snapshot_query = snapshot_query.filter(StorySnapshot.seq <= seq)
+        snapshot = snapshot_query.order_by(StorySnapshot.seq.desc()).first()
+        state = dict(snapshot.state if snapshot else adventure.legacy_story_state or {})
+        events = StoryEvent.query.filter(StoryEvent.adventure_id == adventure.id,
+                                         StoryEvent.seq > (snapshot.seq if snapshot else 0))
+        if seq is not None:
+            events = events.filter(StoryEvent.seq <= seq)
+        for event in events.order_by(StoryEvent.seq):
+            state.update(event.payload)
+        return state
+
+class StorySnapshot(db.Model):
+    __tablename__ = 'story_snapshot'
+    __table_args__ = (db.UniqueConstraint('adventure_id', 'seq', name='uq_story_snapshot_adventure_seq'),)
+    id = db.Column(db.Integer, primary_key=True)
+    adventure_id = db.Column(db.Integer, db.ForeignKey('adventure.id'), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    state = db.Column(SerializedType, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __init__(self, adventure_id: int, seq: int, state: dict):
+        self.adventure_id = adventure_id
+        self.seq = seq
+        self.state = state
+
+    @staticmethod
+    def write(adventure: Adventure, seq: int) -> 'StorySnapshot':
+        existing = StorySnapshot.query.filter_by(adventure_id=adventure.id, seq=seq).first()
+        if existing:
+            return existing
+        snapshot = StorySnapshot(adventure.id, seq, StoryEvent.materialize(adventure, seq))
+        db.session.add(snapshot)
+        return snapshot
 
 class GameSession(db.Model):
     __tablename__ = 'game_session'
     id = db.Column(db.Integer, primary_key=True)
     adventure_id = db.Column(db.Integer, db.ForeignKey('adventure.id'), nullable=False)
-    session_data = db.Column(db.PickleType, nullable=True)
+    session_data = db.Column(SerializedType, nullable=True)
     adventure = db.relationship('Adventure', backref=db.backref('session', uselist=False))
 
     def __init__(self, adventure: Adventure):
@@ -85,27 +280,87 @@ class ChatRoom(db.Model):
         self.adventure_id = adventure.id
 
     def send_message(self, user: User, message: str):
-        new_message = Message(sender=user, text=message)
-        db.session.add(new_message)
-        db.session.commit()
+        # Imported here because chat.py imports this module
+        from .chat import ChatManager
+        return ChatManager(self).post_message(user, message)
 
-    def get_messages(self) -> list:
-        return self.messages.all()
+    def get_messages(self, limit: int = 50) -> list:
+        # Newest first and bounded; use ChatManager.get_messages_page to page further back
+        return self.messages.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit).all()
 
 class Message(db.Model):
     __tablename__ = 'message'
+    __table_args__ = (db.Index('ix_message_room_timestamp_id', 'chat_room_id', 'timestamp', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     text = db.Column(db.String(500), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     chat_room_id = db.Column(db.Integer, db.ForeignKey('chat_room.id'), nullable=False)
 
-    def __init__(self, sender: User, text: str):
+    def __init__(self, sender: User, text: str, chat_room: 'ChatRoom' = None):
         self.sender_id = sender.id
         self.text = text
+        if chat_room is not None:
+            self.chat_room_id = chat_room.id
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'chat_room_id': self.chat_room_id,
+            'sender_id': self.sender_id,
+            'text': self.text,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+        }
+
+class ModelUsage(db.Model):
+    """
+    Daily model-call aggregates per adventure, user and outcome ('ok' or an
+    error class name). Written in batches by telemetry.UsageRecorder; a key
+    may span several rows when processes flush concurrently, so always sum.
+    """
+    __tablename__ = 'model_usage'
+    __table_args__ = (db.Index('ix_model_usage_day_user', 'day', 'user_id'),
+                      db.Index('ix_model_usage_day_adventure', 'day', 'adventure_id'))
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    adventure_id = db.Column(db.Integer, db.ForeignKey('adventure.id'), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    outcome = db.Column(db.String(64), nullable=False)
+    calls = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    prompt_tokens = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    completion_tokens = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    latency_ms = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+    max_latency_ms = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
+
+class StoryJob(db.Model):
+    """
+    Status of a background job, shared by every worker so that a status poll
+    can land on any of them. Written by jobs.JobManager on its own
+    connections, outside the request's transaction.
+    """
+    __tablename__ = 'story_job'
+    id = db.Column(db.String(32), primary_key=True)
+    task = db.Column(db.String(64), nullable=False)
+    kwargs = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(16), nullable=False)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    submitted_at = db.Column(db.Float, nullable=False)
+    started_at = db.Column(db.Float, nullable=True)
+    finished_at = db.Column(db.Float, nullable=True, index=True)
 
 # Association table for the many-to-many relationship between Adventure and User
 adventure_players = db.Table('adventure_players',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
-    db.Column('adventure_id', db.Integer, db.ForeignKey('adventure.id'), primary_key=True)
+    db.Column('adventure_id', db.Integer, db.ForeignKey('adventure.id'), primary_key=True),
+    db.Index('ix_adventure_players_adventure_id', 'adventure_id')
 )
+
+def _insert_ignore(target):
+    # INSERT that skips rows violating a unique constraint, in the current dialect's syntax
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(target).on_conflict_do_nothing()
+    if dialect == 'sqlite':
+        return sqlite.insert(target).on_conflict_do_nothing()
+    return db.insert(target).prefix_with('IGNORE')
@@ -0,0 +1,139 @@
+## page_cache.py
+import hashlib
+import time
+from datetime import datetime, timezone
+from flask import abort, current_app, has_app_context, make_response, request, session
+from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from werkzeug.http import is_resource_modified
+from .cache import make_cache
+from .config import (PAGE_CACHE_BACKEND, PAGE_CACHE_PATH, PAGE_CACHE_MAX_ENTRIES, PAGE_CACHE_TTL,
+                     ADVENTURE_VERSION_TTL)
+from .models import db, Adventure
+
+# Stands in for the session's CSRF token in cached pages; swapped for the real token on every response
+CSRF_PLACEHOLDER = '__CSRF_TOKEN__'
+
+def init_page_cache(app):
+    """
+    Initialize the rendered page cache and the adventure version cache.
+
+    :param app: The Flask application object.
+    """
+    backend = app.config.get('PAGE_CACHE_BACKEND', PAGE_CACHE_BACKEND)
+    path = app.config.get('PAGE_CACHE_PATH', PAGE_CACHE_PATH)
+    max_entries = app.config.get('PAGE_CACHE_MAX_ENTRIES', PAGE_CACHE_MAX_ENTRIES)
+    ttl = app.config.get('PAGE_CACHE_TTL', PAGE_CACHE_TTL)
+    # Rendered adventure pages, keyed by adventure version so a bump makes old entries unreachable
+    app.extensions['page_cache'] = make_cache(backend, max_entries, ttl, path)
+    # Adventure ID -> (version, updated_at), so validating a request needs no query
+    app.extensions['adventure_version_cache'] = make_cache(
+        backend, max_entries, app.config.get('ADVENTURE_VERSION_TTL', ADVENTURE_VERSION_TTL), path)
+
+def get_page_cache():
+    return current_app.extensions.get('page_cache')
+
+def get_version_cache():
+    return current_app.extensions.get('adventure_version_cache')
+
+def _version_key(adventure_id: int) -> str:
+    return f'adventure_version:{adventure_id}'
+
+def adventure_version(adventure_id: int):
+    """
+    Returns the adventure's current version and last modification time.
+
+    :param adventure_id: The adventure ID.
+    :return: A (version, updated_at timestamp) tuple, or None if the adventure does not exist.
+    """
+    version_cache = get_version_cache()
+    if version_cache is not None:
+        cached = version_cache.get(_version_key(adventure_id))
+        if cached is not None:
+            return tuple(cached)
+    row = db.session.execute(
+        db.select(Adventure.version, Adventure.updated_at).where(Adventure.id == adventure_id)).first()
+    if row is None:
+        return None
+    # Stored as naive UTC
+    updated_at = row.updated_at.replace(tzinfo=timezone.utc).timestamp() if row.updated_at else 0.0
+    if version_cache is not None:
+        version_cache.set(_version_key(adventure_id), [row.version, updated_at])
+    return row.version, updated_at
+
+def invalidate_adventure(adventure_id: int):
+    version_cache = get_version_cache() if has_app_context() else None
+    if version_cache is not None:
+        version_cache.delete(_version_key(adventure_id))
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_adventures(session):
+    for adventure_id in session.info.pop('changed_adventures', ()):
+        invalidate_adventure(adventure_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_adventures(session):
+    session.info.pop('changed_adventures', None)
+
+def cached_adventure_page(adventure_id: int, page: str, render):
+    """
+    Serves an adventure page with ETag/Last-Modified validators and a rendered
+    page cache, both keyed by the adventure's version.
+
+    An unchanged page costs neither a query nor a render: a matching
+    conditional request gets a 304, and a cache hit returns the stored HTML.
+    Validators also roll over every PAGE_CACHE_TTL seconds so that form tokens
+    embedded in a page never go stale. Requests with pending flash messages
+    are always rendered fresh.
+
+    Cached HTML never holds a CSRF token: the token rendered into the page is
+    replaced with a placeholder before storing, and the requesting session's
+    own token is put back on every response. Validators include a digest of
+    the session's token, so a 304 is only sent to the session the page was
+    rendered for.
+
+    :param adventure_id: The adventure ID.
+    :param page: A name for the page, e.g. 'view'.
+    :param render: Callable taking the Adventure and returning the page HTML.
+    :return: The response.
+    """
+    if session.get('_flashes'):
+        return render(Adventure.query.get_or_404(adventure_id))
+
+    current = adventure_version(adventure_id)
+    if current is None:
+        abort(404)
+    version, updated_at = current
+    ttl = current_app.config.get('PAGE_CACHE_TTL', PAGE_CACHE_TTL)
+    epoch = int(time.time() // ttl)
+    # Pages may show per-user controls, so entries are per user
+    key = f'adventure_page:{page}-{adventure_id}-{version}-{current_user.get_id()}-{epoch}'
+    csrf_token = generate_csrf()
+    session_tag = hashlib.sha256(
+        session[current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token')].encode()).hexdigest()[:16]
+    etag = f'{page}-{adventure_id}-{version}-{current_user.get_id()}-{epoch}-{session_tag}'
+    last_modified = datetime.fromtimestamp(int(max(updated_at, epoch * ttl)), timezone.utc)
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = make_response('', 304)
+    else:
+        page_cache = get_page_cache()
+        body = page_cache.get(key) if page_cache is not None else None
+        if body is None:
+            # Forms in the page render this request's token (generate_csrf caches it per request)
+            body = render(Adventure.query.get_or_404(adventure_id)).replace(csrf_token, CSRF_PLACEHOLDER)
+            if page_cache is not None:
+                page_cache.set(key, body)
+        response = make_response(body.replace(CSRF_PLACEHOLDER, csrf_token))
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def page_cache_stats() -> dict:
+    page_cache = get_page_cache()
+    if page_cache is None:
+        return {}
+    return page_cache.stats.to_dict()
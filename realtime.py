@@ -0,0 +1,279 @@
+## realtime.py
+import json
+import logging
+import queue
+import threading
+import time
+from flask import current_app
+from flask_login import current_user
+from .background import ProcessThreads
+from .config import SOCKETIO_MESSAGE_QUEUE
+
+try:
+    from flask_socketio import SocketIO, join_room, leave_room, emit
+except ImportError:  # Push over WebSockets is optional; the hub works without it
+    SocketIO = None
+
+try:
+    import redis
+except ImportError:  # Only needed for the multi-node message bus
+    redis = None
+
+CHANNEL_PREFIX = 'chat_room:'
+
+# Seconds between attempts to reconnect to Redis, doubling up to the maximum
+RECONNECT_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30
+
+def channel_name(chat_room_id: int) -> str:
+    return f'{CHANNEL_PREFIX}{chat_room_id}'
+
+def _deliver(subscribers: list, channel: str, data: str, logger):
+    # A failing subscriber must not take the bus thread, and every later message, down with it
+    for callback in subscribers:
+        try:
+            callback(channel, data)
+        except Exception as e:
+            logger.error(f"Chat bus subscriber failed on {channel}: {e}")
+
+class InMemoryMessageBus:
+    """
+    Single-node message bus. Published messages are dispatched to subscribers
+    on a background thread so publishers never wait for fan-out.
+    """
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self._subscribers = []
+        self._queue = queue.Queue()
+        self._threads = ProcessThreads(('chat-bus', self._dispatch), reset=self._reset_queue)
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def start(self):
+        self._threads.ensure_started()
+
+    def publish(self, channel: str, data: str):
+        self.start()
+        self._queue.put((channel, data))
+
+    def _reset_queue(self):
+        self._queue = queue.Queue()
+
+    def _dispatch(self):
+        while True:
+            channel, data = self._queue.get()
+            _deliver(list(self._subscribers), channel, data, self.logger)
+
+class RedisMessageBus:
+    """
+    Multi-node message bus on Redis pub/sub. Every process subscribes to all
+    chat channels and fans messages out to its own connected clients.
+
+    Publishing only queues the message; a background thread sends it to
+    Redis, so a slow or unreachable Redis never holds up the request that
+    posted it. The listener reconnects with backoff when the connection
+    drops; messages published while it is down are not delivered to this
+    process.
+    """
+    def __init__(self, url: str, logger=None):
+        if redis is None:
+            raise ValueError("The Redis message bus requires the redis package.")
+        self.logger = logger or logging.getLogger(__name__)
+        self._client = redis.Redis.from_url(url)
+        self._subscribers = []
+        self._outbox = queue.Queue()
+        self._threads = ProcessThreads(('chat-bus', self._listen), ('chat-bus-publisher', self._send),
+                                       reset=self._reset_outbox)
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def start(self):
+        self._threads.ensure_started()
+
+    def publish(self, channel: str, data: str):
+        self.start()
+        self._outbox.put((channel, data))
+
+    def _reset_outbox(self):
+        self._outbox = queue.Queue()
+
+    def _send(self):
+        while True:
+            channel, data = self._outbox.get()
+            try:
+                self._client.publish(channel, data)
+            except Exception as e:
+                self.logger.error(f"Failed to publish chat message to {channel}: {e}")
+
+    def _listen(self):
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f'{CHANNEL_PREFIX}*')
+                delay = RECONNECT_DELAY
+                for item in pubsub.listen():
+                    channel = item['channel'].decode('utf-8')
+                    data = item['data'].decode('utf-8')
+                    _deliver(list(self._subscribers), channel, data, self.logger)
+            except Exception as e:
+                self.logger.error(f"Chat bus lost its Redis subscription, reconnecting in {delay}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+def make_message_bus(url: str, logger=None):
+    """
+    Builds the message bus for a SOCKETIO_MESSAGE_QUEUE URL.
+
+    :param url: 'memory://' for a single node, or a redis:// URL.
+    :param logger: Logger for delivery errors; defaults to this module's logger.
+    :return: The message bus.
+    """
+    if not url or url.startswith('memory://'):
+        return InMemoryMessageBus(logger)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisMessageBus(url, logger)
+    raise ValueError(f"Unsupported message queue URL '{url}'.")
+
+class ChatHub:
+    """
+    Fans chat messages out to the clients connected to this process.
+
+    Messages are published to the bus, and every process's hub delivers what
+    it receives to the local clients that joined the message's chat room.
+    Clients are any object with a send(event, payload) method.
+    """
+    def __init__(self, bus, logger=None):
+        self.bus = bus
+        self.logger = logger or logging.getLogger(__name__)
+        self._channels = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        bus.subscribe(self._on_message)
+
+    def start(self):
+        """
+        Starts receiving from the bus in this process. Called whenever a client
+        joins or a message is published, so workers forked from a preloaded
+        master start their own listener.
+        """
+        self.bus.start()
+
+    def join(self, chat_room_id: int, client):
+        self.start()
+        with self._lock:
+            self._channels.setdefault(channel_name(chat_room_id), set()).add(client)
+
+    def leave(self, chat_room_id: int, client):
+        with self._lock:
+            clients = self._channels.get(channel_name(chat_room_id))
+            if clients is not None:
+                clients.discard(client)
+                if not clients:
+                    del self._channels[channel_name(chat_room_id)]
+
+    def add_listener(self, callback):
+        """
+        Registers a callback receiving (chat_room_id, payload) for every message
+        delivered to this process, regardless of which clients joined.
+        """
+        self._listeners.append(callback)
+
+    def publish(self, chat_room_id: int, payload: dict):
+        self.start()
+        self.bus.publish(channel_name(chat_room_id), json.dumps(payload))
+
+    def connection_count(self) -> int:
+        with self._lock:
+            return sum(len(clients) for clients in self._channels.values())
+
+    def _on_message(self, channel: str, data: str):
+        payload = json.loads(data)
+        chat_room_id = int(channel[len(CHANNEL_PREFIX):])
+        for callback in self._listeners:
+            try:
+                callback(chat_room_id, payload)
+            except Exception as e:
+                self.logger.error(f"Chat listener failed for room {chat_room_id}: {e}")
+        with self._lock:
+            clients = list(self._channels.get(channel, ()))
+        for client in clients:
+            # One broken connection must not keep the message from the rest of the room
+            try:
+                client.send('chat_message', payload)
+            except Exception as e:
+                self.logger.warning(f"Dropping chat client in room {chat_room_id}: {e}")
+                self.leave(chat_room_id, client)
+
+def publish_chat_message(message):
+    """
+    Pushes a committed Message to every client in its chat room. Push is
+    best effort: the message is already stored, so a failure is logged
+    rather than raised to the poster.
+
+    :param message: The Message that was posted.
+    """
+    hub = current_app.extensions.get('chat_hub')
+    if hub is not None:
+        try:
+            hub.publish(message.chat_room_id, message.to_dict())
+        except Exception as e:
+            current_app.logger.error(f"Failed to push chat message {message.id}: {e}")
+
+def init_realtime(app):
+    """
+    Initialize chat push: the message bus, the hub and, when Flask-SocketIO is
+    installed, the WebSocket handlers.
+
+    :param app: The Flask application object.
+    :return: The SocketIO instance, or None when Flask-SocketIO is not installed.
+    """
+    hub = ChatHub(make_message_bus(app.config.get('SOCKETIO_MESSAGE_QUEUE', SOCKETIO_MESSAGE_QUEUE), app.logger),
+                  app.logger)
+    app.extensions['chat_hub'] = hub
+    if SocketIO is None:
+        app.logger.warning("Flask-SocketIO is not installed; chat push over WebSockets is disabled.")
+        return None
+
+    socketio = SocketIO(app)
+    # Socket.IO rooms do the per-connection fan-out within this process
+    hub.add_listener(lambda chat_room_id, payload: socketio.emit('chat_message', payload, to=channel_name(chat_room_id)))
+    _register_socket_handlers(socketio)
+    app.extensions['chat_socketio'] = socketio
+    return socketio
+
+def _register_socket_handlers(socketio):
+    # Imported here because chat.py publishes through this module
+    from .chat import ChatManager
+    from .models import ChatRoom
+
+    @socketio.on('join_chat')
+    def on_join_chat(data):
+        if not current_user.is_authenticated:
+            return False
+        chat_room = ChatRoom.query.get(int(data.get('chat_room_id', 0)))
+        if chat_room is None:
+            return False
+        current_app.extensions['chat_hub'].start()
+        join_room(channel_name(chat_room.id))
+
+    @socketio.on('leave_chat')
+    def on_leave_chat(data):
+        leave_room(channel_name(int(data.get('chat_room_id', 0))))
+
+    @socketio.on('send_message')
+    def on_send_message(data):
+        if not current_user.is_authenticated:
+            return False
+        chat_room = ChatRoom.query.get(int(data.get('chat_room_id', 0)))
+        text = (data.get('text') or '').strip()
+        if chat_room is None or not text or len(text) > 500:
+            emit('chat_error', {'error': 'Invalid message'})
+            return
+        ChatManager(chat_room).post_message(current_user, text)
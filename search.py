@@ -0,0 +1,320 @@
+## search.py
+import html
+import re
+from datetime import datetime
+from flask import current_app
+from .config import SEARCH_ENABLED, SEARCH_LANGUAGE, SEARCH_MAX_PAGE
+from .models import db, StoryEvent
+
+# Placed around matched terms by the database, then turned into <mark> after escaping
+MATCH_START, MATCH_END = '\x02', '\x03'
+
+def _story_body(payload: dict) -> str:
+    # The player's prompt is indexed with the story so turns can be found by what was asked
+    return '\n'.join(part for part in (payload.get('prompt'), payload.get('story')) if part)
+
+def _snippet_html(snippet: str) -> str:
+    return html.escape(snippet or '').replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+
+class SQLiteSearchBackend:
+    """
+    FTS5 index. The adventure and kind are stored as indexed tokens so that
+    scoping a query to one adventure is part of the full-text match rather
+    than a filter over every adventure's hits.
+    """
+    TABLE = 'search_index'
+
+    def create(self):
+        db.session.execute(db.text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.TABLE} USING fts5("
+            "body, adventure, kind, ref_id UNINDEXED, created_at UNINDEXED, tokenize='unicode61')"))
+
+    def exists(self) -> bool:
+        return db.session.execute(db.text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+                                  {'name': self.TABLE}).first() is not None
+
+    def clear(self):
+        db.session.execute(db.text(f"DELETE FROM {self.TABLE}"))
+
+    @staticmethod
+    def _timestamp(value) -> str:
+        # Same text format SQLAlchemy uses for DateTime columns on SQLite
+        return value.strftime('%Y-%m-%d %H:%M:%S.%f') if value else None
+
+    def index_messages(self, rows: list):
+        db.session.execute(db.text(
+            f"INSERT INTO {self.TABLE} (body, adventure, kind, ref_id, created_at) "
+            "SELECT :body, 'a' || adventure_id, 'message', :ref_id, :created_at FROM chat_room WHERE id = :chat_room_id"),
+            [{'body': row['text'], 'ref_id': row['id'], 'created_at': self._timestamp(row['timestamp']),
+              'chat_room_id': row['chat_room_id']} for row in rows])
+
+    def index_story_events(self, rows: list):
+        db.session.execute(db.text(
+            f"INSERT INTO {self.TABLE} (body, adventure, kind, ref_id, created_at) "
+            "VALUES (:body, :adventure, 'story', :ref_id, :created_at)"),
+            [{'body': row['body'], 'adventure': f"a{row['adventure_id']}", 'ref_id': row['seq'],
+              'created_at': self._timestamp(row['created_at'])} for row in rows])
+
+    def delete_story_events(self, adventure_id: int, through_seq: int) -> int:
+        return db.session.execute(db.text(
+            f"DELETE FROM {self.TABLE} WHERE {self.TABLE} MATCH :match AND ref_id <= :through_seq"),
+            {'match': f'adventure : a{adventure_id} AND kind : "story"', 'through_seq': through_seq}).rowcount
+
+    def lock_sources(self):
+        # SQLite serializes writers: the rebuild's first write already holds the database lock
+        pass
+
+    def backfill_messages(self, adventure_id: int = None) -> int:
+        return db.session.execute(db.text(
+            f"INSERT INTO {self.TABLE} (body, adventure, kind, ref_id, created_at) "
+            "SELECT message.text, 'a' || chat_room.adventure_id, 'message', message.id, message.timestamp "
+            "FROM message JOIN chat_room ON chat_room.id = message.chat_room_id "
+            + ("WHERE chat_room.adventure_id = :adventure_id" if adventure_id is not None else "")),
+            {'adventure_id': adventure_id}).rowcount
+
+    def search(self, adventure_id: int, query: str, kind: str, limit: int, offset: int) -> list:
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return []
+        # Each term is quoted, so user input can never be read as FTS5 query syntax
+        quoted = ' '.join('"' + term + '"' for term in terms)
+        match = f"adventure : a{adventure_id} AND body : ({quoted})"
+        if kind:
+            match += f' AND kind : "{kind}"'
+        statement = db.text(
+            f"SELECT kind, ref_id, created_at, snippet({self.TABLE}, 0, :start, :end, '...', 16) AS snippet, "
+            f"bm25({self.TABLE}, 1.0, 0.0, 0.0) AS score FROM {self.TABLE} WHERE {self.TABLE} MATCH :match "
+            "ORDER BY score LIMIT :limit OFFSET :offset"
+        ).columns(kind=db.String, ref_id=db.Integer, created_at=db.String, snippet=db.String, score=db.Float)
+        rows = db.session.execute(statement, {'match': match, 'start': MATCH_START, 'end': MATCH_END,
+                                              'limit': limit, 'offset': offset})
+        # bm25 is lower for better matches; report higher-is-better like Postgres
+        return [(row.kind, row.ref_id, row.created_at, row.snippet, -row.score) for row in rows]
+
+class PostgresSearchBackend:
+    """
+    Table with a generated tsvector column and a GIN index, plus a btree
+    index on the adventure for scoping.
+    """
+    TABLE = 'search_document'
+
+    def __init__(self, language: str = SEARCH_LANGUAGE):
+        if not re.fullmatch(r'\w+', language):
+            raise ValueError(f"Invalid text search configuration: {language}")
+        self.language = language
+
+    def create(self):
+        db.session.execute(db.text(
+            f"CREATE TABLE IF NOT EXISTS {self.TABLE} ("
+            "id BIGSERIAL PRIMARY KEY, adventure_id INTEGER NOT NULL, kind VARCHAR(16) NOT NULL, "
+            "ref_id INTEGER NOT NULL, body TEXT NOT NULL, created_at TIMESTAMP, "
+            f"tsv tsvector GENERATED ALWAYS AS (to_tsvector('{self.language}', body)) STORED)"))
+        db.session.execute(db.text(
+            f"CREATE INDEX IF NOT EXISTS ix_{self.TABLE}_tsv ON {self.TABLE} USING GIN (tsv)"))
+        db.session.execute(db.text(
+            f"CREATE INDEX IF NOT EXISTS ix_{self.TABLE}_adventure ON {self.TABLE} (adventure_id, kind)"))
+
+    def exists(self) -> bool:
+        return db.session.execute(db.text("SELECT to_regclass(:name)"), {'name': self.TABLE}).scalar() is not None
+
+    def clear(self):
+        db.session.execute(db.text(f"TRUNCATE {self.TABLE}"))
+
+    def index_messages(self, rows: list):
+        db.session.execute(db.text(
+            f"INSERT INTO {self.TABLE} (adventure_id, kind, ref_id, body, created_at) "
+            "SELECT adventure_id, 'message', :ref_id, :body, :created_at FROM chat_room WHERE id = :chat_room_id"),
+            [{'body': row['text'], 'ref_id': row['id'], 'created_at': row['timestamp'],
+              'chat_room_id': row['chat_room_id']} for row in rows])
+
+    def index_story_events(self, rows: list):
+        db.session.execute(db.text(
+            f"INSERT INTO {self.TABLE} (adventure_id, kind, ref_id, body, created_at) "
+            "VALUES (:adventure_id, 'story', :ref_id, :body, :created_at)"),
+            [{'adventure_id': row['adventure_id'], 'ref_id': row['seq'], 'body': row['body'],
+              'created_at': row['created_at']} for row in rows])
+
+    def delete_story_events(self, adventure_id: int, through_seq: int) -> int:
+        return db.session.execute(db.text(
+            f"DELETE FROM {self.TABLE} "
+            "WHERE adventure_id = :adventure_id AND kind = 'story' AND ref_id <= :through_seq"),
+            {'adventure_id': adventure_id, 'through_seq': through_seq}).rowcount
+
+    def lock_sources(self):
+        # Holds off new messages and turns until the rebuild commits, so none land between its read and its commit
+        db.session.execute(db.text("LOCK TABLE message, story_event IN SHARE MODE"))
+
+    def backfill_messages(self, adventure_id: int = None) -> int:
+        return db.session.execute(db.text(
+            f"INSERT INTO {self.TABLE} (adventure_id, kind, ref_id, body, created_at) "
+            "SELECT chat_room.adventure_id, 'message', message.id, message.text, message.timestamp "
+            "FROM message JOIN chat_room ON chat_room.id = message.chat_room_id "
+            + ("WHERE chat_room.adventure_id = :adventure_id" if adventure_id is not None else "")),
+            {'adventure_id': adventure_id}).rowcount
+
+    def search(self, adventure_id: int, query: str, kind: str, limit: int, offset: int) -> list:
+        statement = db.text(
+            f"SELECT kind, ref_id, created_at, ts_headline('{self.language}', body, q, :options) AS snippet, "
+            f"ts_rank(tsv, q) AS score FROM {self.TABLE}, plainto_tsquery('{self.language}', :query) AS q "
+            "WHERE adventure_id = :adventure_id AND tsv @@ q AND (CAST(:kind AS VARCHAR) IS NULL OR kind = :kind) "
+            "ORDER BY score DESC, id DESC LIMIT :limit OFFSET :offset"
+        ).columns(kind=db.String, ref_id=db.Integer, created_at=db.DateTime, snippet=db.String, score=db.Float)
+        rows = db.session.execute(statement, {
+            'query': query, 'adventure_id': adventure_id, 'kind': kind or None, 'limit': limit, 'offset': offset,
+            'options': f'StartSel={MATCH_START}, StopSel={MATCH_END}, MaxWords=24, MinWords=8'})
+        return [(row.kind, row.ref_id, row.created_at, row.snippet, row.score) for row in rows]
+
+SEARCH_BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+class SearchIndex:
+    """
+    Full-text index over chat messages and story turns, using the primary
+    database's native full-text support.
+
+    Writers add rows in their own transaction, so the index commits or
+    rolls back with the content. Indexing is skipped while the index has
+    not been created with the init-search command; until then every write
+    checks for it, so writes made right after init-search, which runs in
+    another process, are indexed.
+    """
+    def __init__(self, enabled: bool = SEARCH_ENABLED):
+        self.enabled = enabled
+        self._backend = None
+        self._available = False
+
+    def backend(self):
+        if self._backend is None:
+            backend_class = SEARCH_BACKENDS.get(db.engine.dialect.name)
+            self._backend = backend_class() if backend_class else False
+        return self._backend or None
+
+    def available(self) -> bool:
+        if not self.enabled:
+            return False
+        if not self._available:
+            # Only a positive answer is kept; the index appears once init-search commits
+            backend = self.backend()
+            self._available = backend is not None and backend.exists()
+        return self._available
+
+    def index_messages(self, rows: list):
+        """
+        Adds chat messages to the index, in the caller's transaction.
+
+        :param rows: Dicts with the message's id, chat_room_id, text and timestamp.
+        """
+        if rows and self.available():
+            self.backend().index_messages(rows)
+
+    def index_story_event(self, adventure_id: int, seq: int, payload: dict, created_at: datetime = None):
+        """
+        Adds a story turn to the index, in the caller's transaction.
+        """
+        body = _story_body(payload)
+        if body and self.available():
+            self.backend().index_story_events([{'adventure_id': adventure_id, 'seq': seq, 'body': body,
+                                                'created_at': created_at or datetime.utcnow()}])
+
+    def rebuild(self, batch_size: int = 1000) -> dict:
+        """
+        Creates the index if needed and refills it from the messages and story log.
+
+        :param batch_size: Story events decoded and inserted at a time.
+        :return: Rows indexed per kind.
+        :raises RuntimeError: If the database has no supported full-text search.
+        """
+        backend = self.backend()
+        if backend is None:
+            raise RuntimeError(f"Full-text search is not supported on {db.engine.dialect.name}")
+        backend.create()
+        backend.lock_sources()
+        backend.clear()
+        counts = self._backfill(backend, None, batch_size)
+        db.session.commit()
+        return counts
+
+    def remove_story_events(self, adventure_id: int, through_seq: int) -> int:
+        """
+        Drops an adventure's indexed story turns up to a sequence number, in
+        the caller's transaction; for turns deleted by story log compaction.
+
+        :return: The number of index rows removed.
+        """
+        if not self.available():
+            return 0
+        return self.backend().delete_story_events(adventure_id, through_seq)
+
+    def index_adventure(self, adventure_id: int, batch_size: int = 1000) -> dict:
+        """
+        Indexes all of one adventure's messages and story turns, in the
+        caller's transaction; for content written in bulk, e.g. by an import.
+
+        :return: Rows indexed per kind.
+        """
+        if not self.available():
+            return {}
+        return self._backfill(self.backend(), adventure_id, batch_size)
+
+    @staticmethod
+    def _backfill(backend, adventure_id: int, batch_size: int) -> dict:
+        counts = {'message': backend.backfill_messages(adventure_id), 'story': 0}
+        # Story payloads are serialized blobs, so they are decoded here rather than in SQL
+        events = db.select(StoryEvent.adventure_id, StoryEvent.seq, StoryEvent.payload, StoryEvent.created_at) \
+            .order_by(StoryEvent.id).execution_options(stream_results=True, yield_per=batch_size)
+        if adventure_id is not None:
+            events = events.where(StoryEvent.adventure_id == adventure_id)
+        batch = []
+        for row in db.session.execute(events):
+            body = _story_body(row.payload)
+            if body:
+                batch.append({'adventure_id': row.adventure_id, 'seq': row.seq, 'body': body,
+                              'created_at': row.created_at})
+            if len(batch) >= batch_size:
+                backend.index_story_events(batch)
+                counts['story'] += len(batch)
+                batch = []
+        if batch:
+            backend.index_story_events(batch)
+            counts['story'] += len(batch)
+        return counts
+
+    def search(self, adventure_id: int, query: str, page: int = 1, per_page: int = 20, kind: str = None) -> dict:
+        """
+        Searches one adventure's chat messages and story turns, best matches first.
+
+        :param adventure_id: The adventure to search.
+        :param query: Words to search for; all must match.
+        :param page: The 1-based page number, up to SEARCH_MAX_PAGE.
+        :param per_page: Results per page.
+        :param kind: Optional 'message' or 'story' to search only one kind.
+        :return: A dict with the results, where each snippet is HTML with matches in <mark>.
+        :raises ValueError: If the page or kind is invalid.
+        :raises RuntimeError: If the search index has not been created.
+        """
+        if not 1 <= page <= SEARCH_MAX_PAGE:
+            raise ValueError(f"Page must be between 1 and {SEARCH_MAX_PAGE}.")
+        if kind not in (None, 'message', 'story'):
+            raise ValueError(f"Unknown result kind: {kind}")
+        if not self.available():
+            raise RuntimeError("The search index has not been created; run init-search.")
+        # Fetch one extra row to learn whether another page follows
+        rows = self.backend().search(adventure_id, query, kind, per_page + 1, (page - 1) * per_page)
+        results = [{'kind': kind, 'id': ref_id, 'timestamp': str(created_at) if created_at else None,
+                    'snippet': _snippet_html(snippet), 'score': score}
+                   for kind, ref_id, created_at, snippet, score in rows[:per_page]]
+        return {'query': query, 'page': page, 'results': results,
+                'next_page': page + 1 if len(rows) > per_page and page < SEARCH_MAX_PAGE else None}
+
+def init_search(app):
+    """
+    Initialize the full-text search index.
+
+    :param app: The Flask application object.
+    """
+    app.extensions['search'] = SearchIndex(app.config.get('SEARCH_ENABLED', SEARCH_ENABLED))
+
+def get_search_index():
+    return current_app.extensions.get('search')
@@ -0,0 +1,140 @@
+## serialization.py
+import json
+import struct
+import zlib
+from sqlalchemy.types import TypeDecorator, LargeBinary
+from .config import SERIALIZATION_FORMAT, SERIALIZATION_COMPRESSION, SERIALIZATION_COMPRESSION_THRESHOLD
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; JSON is always available
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; zlib is always available
+    zstandard = None
+
+# Header layout: magic (2 bytes), version, format, compression
+MAGIC = b'TS'
+VERSION = 1
+HEADER = struct.Struct('>2sBBB')
+
+FORMAT_JSON = 1
+FORMAT_MSGPACK = 2
+FORMATS = {'json': FORMAT_JSON, 'msgpack': FORMAT_MSGPACK}
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+COMPRESSIONS = {'none': COMPRESSION_NONE, 'zlib': COMPRESSION_ZLIB, 'zstd': COMPRESSION_ZSTD}
+
+class SerializationError(ValueError):
+    """
+    Raised when a blob cannot be decoded.
+    """
+
+class Serializer:
+    """
+    Encodes state dicts as versioned blobs.
+
+    Every blob starts with a small header naming the format and compression it
+    was written with, so rows written with different settings can be read back
+    side by side and the settings can change without a rewrite.
+    """
+    def __init__(self, format: str = SERIALIZATION_FORMAT, compression: str = SERIALIZATION_COMPRESSION,
+                 compression_threshold: int = SERIALIZATION_COMPRESSION_THRESHOLD):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown serialization format '{format}'.")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression '{compression}'.")
+        if format == 'msgpack' and msgpack is None:
+            raise ValueError("The msgpack format requires the msgpack package.")
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package.")
+        self.format = FORMATS[format]
+        self.compression = COMPRESSIONS[compression]
+        self.compression_threshold = compression_threshold
+
+    def dumps(self, value) -> bytes:
+        """
+        Encodes a value into a versioned blob.
+
+        :param value: A JSON-compatible value.
+        :return: The encoded blob.
+        """
+        if self.format == FORMAT_MSGPACK:
+            body = msgpack.packb(value, use_bin_type=True)
+        else:
+            body = json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        compression = COMPRESSION_NONE
+        if self.compression != COMPRESSION_NONE and len(body) >= self.compression_threshold:
+            compression = self.compression
+            body = _compress(compression, body)
+        return HEADER.pack(MAGIC, VERSION, self.format, compression) + body
+
+    def loads(self, blob: bytes):
+        """
+        Decodes a blob written by any Serializer configuration.
+
+        :param blob: The encoded blob.
+        :return: The decoded value.
+        :raises SerializationError: If the blob has no valid header.
+        """
+        if not is_serialized(blob):
+            raise SerializationError("Blob is missing the serialization header.")
+        _, version, format, compression = HEADER.unpack_from(blob)
+        if version != VERSION:
+            raise SerializationError(f"Unsupported serialization version {version}.")
+        body = _decompress(compression, bytes(blob[HEADER.size:]))
+        if format == FORMAT_MSGPACK:
+            if msgpack is None:
+                raise SerializationError("Blob is msgpack-encoded but msgpack is not installed.")
+            return msgpack.unpackb(body, raw=False)
+        if format == FORMAT_JSON:
+            return json.loads(body.decode('utf-8'))
+        raise SerializationError(f"Unknown serialization format {format}.")
+
+def is_serialized(blob: bytes) -> bool:
+    return blob is not None and len(blob) >= HEADER.size and bytes(blob[:2]) == MAGIC
+
+def _compress(compression: int, body: bytes) -> bytes:
+    if compression == COMPRESSION_ZSTD:
+        return zstandard.ZstdCompressor().compress(body)
+    return zlib.compress(body)
+
+def _decompress(compression: int, body: bytes) -> bytes:
+    if compression == COMPRESSION_NONE:
+        return body
+    if compression == COMPRESSION_ZLIB:
+        return zlib.decompress(body)
+    if compression == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise SerializationError("Blob is zstd-compressed but zstandard is not installed.")
+        return zstandard.ZstdDecompressor().decompress(body)
+    raise SerializationError(f"Unknown compression {compression}.")
+
+_default_serializer = None
+
+def get_serializer() -> Serializer:
+    global _default_serializer
+    if _default_serializer is None:
+        _default_serializer = Serializer()
+    return _default_serializer
+
+class SerializedType(TypeDecorator):
+    """
+    Column type storing values as versioned Serializer blobs.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return get_serializer().dumps(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return get_serializer().loads(value)
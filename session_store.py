@@ -0,0 +1,204 @@
+## session_store.py
+import threading
+from collections import OrderedDict
+from flask import current_app
+from .background import PeriodicFlusher
+from .config import (SESSION_STORE_ENABLED, SESSION_STORE_MAX_SESSIONS, SESSION_STORE_FLUSH_INTERVAL,
+                     SESSION_STORE_DURABILITY)
+from .models import db, GameSession
+
+DURABILITY_MODES = ('write_through', 'write_behind')
+
+class _Entry:
+    def __init__(self, data: dict):
+        self.data = data
+        self.dirty = False
+        # Bumped on every put, so a flush only clears the dirty flag if nothing changed meanwhile
+        self.revision = 0
+
+class SessionStore:
+    """
+    In-memory store of live game session state in front of GameSession rows.
+
+    Reads are served from memory once a session is loaded. Writes mark the
+    session dirty; with 'write_behind' durability dirty sessions are written
+    in one transaction every flush_interval seconds, when they are evicted
+    and at interpreter exit, so a crash loses at most flush_interval seconds
+    of updates. 'write_through' writes before put() returns. The least
+    recently used sessions are evicted once more than max_sessions are held.
+
+    Session state is stored by reference: callers should put() a new dict
+    rather than mutate the one get() returned.
+
+    The store belongs to one process and never re-reads a session it holds,
+    so it is off by default: with several workers a session must always be
+    served by the same worker, or workers see each other's stale state and
+    overwrite each other's updates.
+    """
+    def __init__(self, app, max_sessions: int = SESSION_STORE_MAX_SESSIONS,
+                 flush_interval: float = SESSION_STORE_FLUSH_INTERVAL, durability: str = SESSION_STORE_DURABILITY):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown session store durability: {durability}")
+        self.app = app
+        self.max_sessions = max_sessions
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self._entries = OrderedDict()
+        # Dirty sessions evicted from _entries but not yet written; reads still see them
+        self._evicted = {}
+        self._lock = threading.Lock()
+        self._flusher = PeriodicFlusher(self._write_dirty, flush_interval, 'session-flusher')
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, session_id: int) -> dict:
+        """
+        Returns a session's state, loading it from the database on a miss.
+
+        :param session_id: The GameSession ID.
+        :return: The session state.
+        :raises ValueError: If the session does not exist.
+        """
+        return self._entry(session_id).data
+
+    def put(self, session_id: int, data: dict):
+        """
+        Replaces a session's state and marks it for flushing.
+
+        :param session_id: The GameSession ID.
+        :param data: The new session state.
+        :raises ValueError: If the session does not exist.
+        """
+        entry = self._entry(session_id)
+        with self._lock:
+            if self._entries.get(session_id) is not entry and self._evicted.get(session_id) is not entry:
+                # Evicted clean since it was looked up
+                self._insert(session_id, entry)
+            entry.data = data
+            entry.dirty = True
+            entry.revision += 1
+        if self.durability == 'write_through':
+            self.flush([session_id])
+        else:
+            self._flusher.ensure_started()
+
+    def discard(self, session_id: int):
+        """
+        Drops a session without writing it, e.g. when it is deleted.
+        """
+        with self._lock:
+            self._entries.pop(session_id, None)
+            self._evicted.pop(session_id, None)
+
+    def flush(self, session_ids=None) -> int:
+        """
+        Writes dirty sessions to the database in one transaction.
+
+        :param session_ids: Optional IDs to flush; defaults to every dirty session.
+        :return: The number of sessions written.
+        """
+        return self._flusher.flush(session_ids)
+
+    def shutdown(self):
+        """
+        Stops the flusher and writes every dirty session.
+        """
+        self._flusher.shutdown()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                'sessions': len(self._entries),
+                'dirty': sum(entry.dirty for entry in self._entries.values()) + len(self._evicted),
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+            }
+        return {**stats, **self._flusher.stats()}
+
+    def _write_dirty(self, session_ids=None) -> int:
+        with self._lock:
+            candidates = list(self._evicted.items()) + list(self._entries.items())
+            if session_ids is not None:
+                wanted = set(session_ids)
+                candidates = [(sid, entry) for sid, entry in candidates if sid in wanted]
+            batch = [(sid, entry, entry.revision, entry.data) for sid, entry in candidates if entry.dirty]
+        if not batch:
+            return 0
+        with self.app.app_context():
+            try:
+                db.session.execute(
+                    db.update(GameSession.__table__)
+                    .where(GameSession.__table__.c.id == db.bindparam('session_id'))
+                    .values(session_data=db.bindparam('data')),
+                    [{'session_id': sid, 'data': data} for sid, _, _, data in batch])
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.error(f"Failed to flush {len(batch)} game sessions: {e}")
+                raise
+        with self._lock:
+            for sid, entry, revision, _ in batch:
+                if entry.revision == revision:
+                    entry.dirty = False
+                    if self._evicted.get(sid) is entry:
+                        del self._evicted[sid]
+        return len(batch)
+
+    def _entry(self, session_id: int) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                self._entries.move_to_end(session_id)
+                self._hits += 1
+                return entry
+            entry = self._evicted.get(session_id)
+            if entry is not None:
+                # Still waiting to be written; bring it back rather than read the stale row
+                self._insert(session_id, entry)
+                self._hits += 1
+                return entry
+            self._misses += 1
+        row = db.session.get(GameSession, session_id)
+        if row is None:
+            raise ValueError(f"Game session with ID {session_id} does not exist.")
+        with self._lock:
+            # Another thread may have loaded (and changed) it meanwhile; theirs wins
+            entry = self._entries.get(session_id) or self._evicted.get(session_id)
+            if entry is None:
+                entry = _Entry(row.load_session())
+            self._insert(session_id, entry)
+            return entry
+
+    def _insert(self, session_id: int, entry: _Entry):
+        # Caller holds _lock
+        self._evicted.pop(session_id, None)
+        self._entries[session_id] = entry
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.max_sessions:
+            evicted_id, evicted = self._entries.popitem(last=False)
+            self._evictions += 1
+            if evicted.dirty:
+                self._evicted[evicted_id] = evicted
+                self._flusher.wake()
+
+def init_session_store(app):
+    """
+    Initialize the hot game session store when SESSION_STORE_ENABLED is set.
+    Dirty sessions are flushed at interpreter exit in each process that
+    started a flusher.
+
+    :param app: The Flask application object.
+    """
+    if app.config.get('SESSION_STORE_ENABLED', SESSION_STORE_ENABLED):
+        store = SessionStore(
+            app,
+            max_sessions=app.config.get('SESSION_STORE_MAX_SESSIONS', SESSION_STORE_MAX_SESSIONS),
+            flush_interval=app.config.get('SESSION_STORE_FLUSH_INTERVAL', SESSION_STORE_FLUSH_INTERVAL),
+            durability=app.config.get('SESSION_STORE_DURABILITY', SESSION_STORE_DURABILITY),
+        )
+        app.extensions['session_store'] = store
+
+def get_session_store():
+    return current_app.extensions.get('session_store')
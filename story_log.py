@@ -0,0 +1,59 @@
+## story_log.py
+from .config import STORY_EVENT_RETENTION
+from .models import db, Adventure, StoryEvent, StorySnapshot
+from .jobs import task
+from .search import get_search_index
+
+def compact_adventure(adventure: Adventure, retain_events: int = STORY_EVENT_RETENTION) -> int:
+    """
+    Folds an adventure's story events into a snapshot at the head of the log
+    and prunes events and snapshots older than the retention window.
+
+    :param adventure: The Adventure to compact.
+    :param retain_events: How many of the latest events to keep for rewind; at least 1.
+    :return: The number of events deleted.
+    :raises ValueError: If retain_events is less than 1.
+    """
+    if retain_events < 1:
+        raise ValueError("Compaction must keep at least the latest story event.")
+    head = StoryEvent.head_seq(adventure.id)
+    if not head:
+        return 0
+    StorySnapshot.write(adventure, head)
+    boundary = head - retain_events
+    if boundary <= 0:
+        return 0
+    # Keep the newest snapshot at or before the boundary so every retained event can be replayed
+    base = db.session.query(db.func.max(StorySnapshot.seq)).filter(
+        StorySnapshot.adventure_id == adventure.id, StorySnapshot.seq <= boundary).scalar()
+    if base is None:
+        return 0
+    StorySnapshot.query.filter(StorySnapshot.adventure_id == adventure.id,
+                               StorySnapshot.seq < base).delete(synchronize_session=False)
+    search = get_search_index()
+    if search is not None:
+        # The deleted turns' text survives only as folded snapshot state, so they are no longer search results
+        search.remove_story_events(adventure.id, base)
+    return StoryEvent.query.filter(StoryEvent.adventure_id == adventure.id,
+                                   StoryEvent.seq <= base).delete(synchronize_session=False)
+
+@task('compact_story_log')
+def compact_story_log(adventure_id: int = None, retain_events: int = STORY_EVENT_RETENTION) -> dict:
+    """
+    Compacts the story log of one adventure, or of every adventure.
+
+    :param adventure_id: Optional ID of the Adventure to compact.
+    :param retain_events: How many of the latest events to keep per adventure.
+    :return: A dict mapping adventure IDs to the number of events deleted.
+    """
+    if adventure_id is not None:
+        adventure_ids = [adventure_id]
+    else:
+        adventure_ids = [row.id for row in db.session.query(Adventure.id).order_by(Adventure.id)]
+    deleted = {}
+    for current_id in adventure_ids:
+        adventure = Adventure.query.get(current_id)
+        if adventure:
+            deleted[current_id] = compact_adventure(adventure, retain_events)
+            db.session.commit()
+    return deleted
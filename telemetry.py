@@ -0,0 +1,275 @@
+## telemetry.py
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from .background import PeriodicFlusher
+from .config import MODEL_USAGE_FLUSH_INTERVAL, MODEL_USER_DAILY_TOKEN_QUOTA, MODEL_ADVENTURE_DAILY_TOKEN_QUOTA
+from .metrics import registry
+from .model_client import estimate_tokens
+from .models import db, User, Adventure, ModelUsage
+
+# Labelled by engine and outcome only; per-adventure and per-user figures live in ModelUsage
+model_call_seconds = registry.histogram('app_model_call_seconds', 'Model call latency in seconds.')
+model_first_chunk_seconds = registry.histogram('app_model_first_chunk_seconds',
+                                               'Time to the first streamed chunk in seconds.')
+model_tokens = registry.counter('app_model_tokens_total', 'Estimated model tokens by kind.')
+model_errors = registry.counter('app_model_errors_total', 'Failed model calls by error class.')
+quota_rejections = registry.counter('app_model_quota_rejections_total', 'Model calls refused by a token quota.')
+
+# Any other outcome is the class name of the error that ended the call
+NON_ERROR_OUTCOMES = ('ok', 'cancelled')
+
+class QuotaExceeded(RuntimeError):
+    """
+    Raised before a model call when a user or adventure has used up its daily token quota.
+    """
+
+class UsageRecorder:
+    """
+    Aggregates model-call usage in memory and writes it to ModelUsage in one
+    transaction every flush_interval seconds and at interpreter exit.
+
+    Quotas are checked against today's stored usage plus this process's
+    unflushed usage, so other processes' calls are seen up to one flush
+    interval late.
+    """
+    def __init__(self, app, flush_interval: float = MODEL_USAGE_FLUSH_INTERVAL,
+                 user_quota: int = MODEL_USER_DAILY_TOKEN_QUOTA,
+                 adventure_quota: int = MODEL_ADVENTURE_DAILY_TOKEN_QUOTA):
+        self.app = app
+        self.flush_interval = flush_interval
+        self.user_quota = user_quota
+        self.adventure_quota = adventure_quota
+        # (day, adventure_id, user_id, outcome) -> [calls, prompt_tokens, completion_tokens, latency_ms, max_latency_ms]
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flusher = PeriodicFlusher(self._write_pending, flush_interval, 'usage-flusher')
+
+    def record(self, adventure_id: int, user_id: int, outcome: str, prompt_tokens: int, completion_tokens: int,
+               latency: float):
+        """
+        Adds one model call to the pending aggregates.
+
+        :param outcome: 'ok', 'cancelled' for a stream closed early, or the error class name.
+        :param latency: The call duration in seconds.
+        """
+        self._flusher.ensure_started()
+        key = (datetime.utcnow().date(), adventure_id, user_id, outcome)
+        latency_ms = latency * 1000
+        with self._lock:
+            totals = self._pending.get(key)
+            if totals is None:
+                totals = self._pending[key] = [0, 0, 0, 0.0, 0.0]
+            totals[0] += 1
+            totals[1] += prompt_tokens
+            totals[2] += completion_tokens
+            totals[3] += latency_ms
+            totals[4] = max(totals[4], latency_ms)
+
+    def check_quota(self, adventure_id: int, user_id: int, prompt_tokens: int):
+        """
+        Refuses a call that would take a user or adventure over today's token quota.
+
+        :param prompt_tokens: The estimated prompt tokens of the call about to be made.
+        :raises QuotaExceeded: If a quota would be exceeded.
+        """
+        checks = [('user', ModelUsage.user_id, user_id, self.user_quota),
+                  ('adventure', ModelUsage.adventure_id, adventure_id, self.adventure_quota)]
+        for scope, column, subject_id, quota in checks:
+            if not quota or subject_id is None:
+                continue
+            used = self.tokens_used_today(column, subject_id)
+            if used + prompt_tokens > quota:
+                quota_rejections.inc(scope=scope)
+                raise QuotaExceeded(f"Daily model token quota reached for this {scope} ({used} of {quota} tokens used).")
+
+    def tokens_used_today(self, column, subject_id: int) -> int:
+        today = datetime.utcnow().date()
+        stored = db.session.scalar(
+            db.select(db.func.coalesce(db.func.sum(ModelUsage.prompt_tokens + ModelUsage.completion_tokens), 0))
+            .where(ModelUsage.day == today, column == subject_id))
+        index = 1 if column is ModelUsage.adventure_id else 2
+        with self._lock:
+            pending = sum(totals[1] + totals[2] for key, totals in self._pending.items()
+                          if key[0] == today and key[index] == subject_id)
+        return stored + pending
+
+    def flush(self) -> int:
+        """
+        Writes the pending aggregates, adding to existing rows where possible.
+
+        :return: The number of aggregate keys written.
+        """
+        return self._flusher.flush()
+
+    def shutdown(self):
+        self._flusher.shutdown()
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending_keys = len(self._pending)
+        return {'pending_keys': pending_keys, **self._flusher.stats()}
+
+    def _write_pending(self) -> int:
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        with self.app.app_context():
+            try:
+                for (day, adventure_id, user_id, outcome), totals in batch.items():
+                    self._write(day, adventure_id, user_id, outcome, totals)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.error(f"Failed to flush {len(batch)} model usage aggregates: {e}")
+                with self._lock:
+                    for key, totals in batch.items():
+                        self._merge(key, totals)
+                raise
+        return len(batch)
+
+    def _write(self, day, adventure_id: int, user_id: int, outcome: str, totals: list):
+        calls, prompt_tokens, completion_tokens, latency_ms, max_latency_ms = totals
+        match = db.and_(ModelUsage.day == day, ModelUsage.outcome == outcome,
+                        ModelUsage.adventure_id.is_(None) if adventure_id is None else ModelUsage.adventure_id == adventure_id,
+                        ModelUsage.user_id.is_(None) if user_id is None else ModelUsage.user_id == user_id)
+        # Add in SQL so concurrent flushes from other processes don't overwrite each other
+        updated = db.session.execute(db.update(ModelUsage).where(match).values(
+            calls=ModelUsage.calls + calls,
+            prompt_tokens=ModelUsage.prompt_tokens + prompt_tokens,
+            completion_tokens=ModelUsage.completion_tokens + completion_tokens,
+            latency_ms=ModelUsage.latency_ms + latency_ms,
+            max_latency_ms=db.case((ModelUsage.max_latency_ms < max_latency_ms, max_latency_ms),
+                                   else_=ModelUsage.max_latency_ms),
+        ).execution_options(synchronize_session=False)).rowcount
+        if not updated:
+            db.session.execute(db.insert(ModelUsage).values(
+                day=day, adventure_id=adventure_id, user_id=user_id, outcome=outcome, calls=calls,
+                prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, latency_ms=latency_ms,
+                max_latency_ms=max_latency_ms))
+
+    def _merge(self, key: tuple, totals: list):
+        # Caller holds _lock
+        current = self._pending.get(key)
+        if current is None:
+            self._pending[key] = totals
+            return
+        for i in range(4):
+            current[i] += totals[i]
+        current[4] = max(current[4], totals[4])
+
+class InstrumentedStoryAdapter:
+    """
+    Wraps a story adapter to enforce quotas before each model call and to
+    record its latency, estimated token counts and outcome.
+    """
+    def __init__(self, adapter, recorder: UsageRecorder, adventure_id: int = None, user_id: int = None):
+        self.adapter = adapter
+        self.recorder = recorder
+        self.adventure_id = adventure_id
+        self.user_id = user_id
+
+    def model_params(self) -> dict:
+        return self.adapter.model_params()
+
+    def generate_story(self, prompt: str) -> str:
+        prompt_tokens = estimate_tokens(prompt)
+        self.recorder.check_quota(self.adventure_id, self.user_id, prompt_tokens)
+        start = time.perf_counter()
+        try:
+            story = self.adapter.generate_story(prompt)
+        except Exception as e:
+            self._record(type(e).__name__, prompt_tokens, 0, time.perf_counter() - start)
+            raise
+        self._record('ok', prompt_tokens, estimate_tokens(story), time.perf_counter() - start)
+        return story
+
+    def stream_story(self, prompt: str):
+        prompt_tokens = estimate_tokens(prompt)
+        self.recorder.check_quota(self.adventure_id, self.user_id, prompt_tokens)
+        start = time.perf_counter()
+        completion_tokens = 0
+        first = True
+        # Recorded in finally, so a stream closed early (client disconnect) still counts what it produced
+        outcome = 'cancelled'
+        try:
+            for chunk in self.adapter.stream_story(prompt):
+                if first:
+                    model_first_chunk_seconds.observe(time.perf_counter() - start,
+                                                      engine=self.model_params().get('engine', ''))
+                    first = False
+                completion_tokens += estimate_tokens(chunk)
+                yield chunk
+            outcome = 'ok'
+        except Exception as e:
+            outcome = type(e).__name__
+            raise
+        finally:
+            self._record(outcome, prompt_tokens, completion_tokens, time.perf_counter() - start)
+
+    def _record(self, outcome: str, prompt_tokens: int, completion_tokens: int, latency: float):
+        engine = self.model_params().get('engine', '')
+        status = outcome if outcome in NON_ERROR_OUTCOMES else 'error'
+        model_call_seconds.observe(latency, engine=engine, outcome=status)
+        model_tokens.inc(prompt_tokens, engine=engine, kind='prompt')
+        model_tokens.inc(completion_tokens, engine=engine, kind='completion')
+        if status == 'error':
+            model_errors.inc(engine=engine, error=outcome)
+        self.recorder.record(self.adventure_id, self.user_id, outcome, prompt_tokens, completion_tokens, latency)
+
+def usage_report(days: int = 7, limit: int = 20) -> dict:
+    """
+    Summarizes recorded model usage by user and by adventure, heaviest first.
+
+    :param days: How many days back to include, counting today.
+    :param limit: Rows per section.
+    :return: A JSON-serializable dict.
+    """
+    recorder = get_usage_recorder()
+    if recorder is not None:
+        recorder.flush()
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    tokens = db.func.sum(ModelUsage.prompt_tokens + ModelUsage.completion_tokens)
+    calls = db.func.sum(ModelUsage.calls)
+    errors = db.func.sum(db.case((ModelUsage.outcome.not_in(NON_ERROR_OUTCOMES), ModelUsage.calls), else_=0))
+    mean_latency = db.func.sum(ModelUsage.latency_ms) / db.func.nullif(calls, 0)
+    columns = (tokens.label('tokens'), calls.label('calls'), errors.label('errors'),
+               mean_latency.label('mean_latency_ms'), db.func.max(ModelUsage.max_latency_ms).label('max_latency_ms'))
+
+    def section(key, name_column, join_on):
+        rows = db.session.execute(
+            db.select(key, name_column, *columns).select_from(ModelUsage).outerjoin(join_on[0], join_on[1])
+            .where(ModelUsage.day >= since).group_by(key, name_column).order_by(tokens.desc()).limit(limit))
+        return [{'id': row[0], 'name': row[1], 'tokens': row.tokens or 0, 'calls': row.calls or 0,
+                 'errors': row.errors or 0, 'mean_latency_ms': round(row.mean_latency_ms or 0.0, 1),
+                 'max_latency_ms': round(row.max_latency_ms or 0.0, 1)} for row in rows]
+
+    outcomes = db.session.execute(
+        db.select(ModelUsage.outcome, calls.label('calls')).where(ModelUsage.day >= since)
+        .group_by(ModelUsage.outcome).order_by(calls.desc()))
+    return {
+        'since': since.isoformat(),
+        'users': section(ModelUsage.user_id, User.username, (User, User.id == ModelUsage.user_id)),
+        'adventures': section(ModelUsage.adventure_id, Adventure.title, (Adventure, Adventure.id == ModelUsage.adventure_id)),
+        'outcomes': {row.outcome: row.calls for row in outcomes},
+    }
+
+def init_telemetry(app):
+    """
+    Initialize model-call usage recording and quotas. Pending usage is
+    flushed at interpreter exit in each process that recorded any.
+
+    :param app: The Flask application object.
+    """
+    recorder = UsageRecorder(
+        app,
+        flush_interval=app.config.get('MODEL_USAGE_FLUSH_INTERVAL', MODEL_USAGE_FLUSH_INTERVAL),
+        user_quota=app.config.get('MODEL_USER_DAILY_TOKEN_QUOTA', MODEL_USER_DAILY_TOKEN_QUOTA),
+        adventure_quota=app.config.get('MODEL_ADVENTURE_DAILY_TOKEN_QUOTA', MODEL_ADVENTURE_DAILY_TOKEN_QUOTA),
+    )
+    app.extensions['usage_recorder'] = recorder
+
+def get_usage_recorder():
+    return current_app.extensions.get('usage_recorder')
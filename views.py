@@ -1,54 +1,71 @@
 ## views.py
-from flask import Flask, render_template, request, redirect, url_for, flash
+import json
+from flask import Blueprint, Response, current_app, render_template, request, redirect, url_for, flash, jsonify, abort, stream_with_context
 from flask_login import current_user, login_required
+from flask_wtf.csrf import validate_csrf
+from wtforms.validators import ValidationError
+from .database import use_replica
 from .models import db, User, Adventure, ChatRoom, Message, GameSession
 from .forms import LoginForm, RegistrationForm, AdventureCreationForm, StoryPromptForm, MessageForm
 from .auth import authenticate_user, logout as auth_logout, register_user
 from .game_manager import GameManager
 from .chat import ChatManager
+from .api import stream_adventure_story
+from .jobs import JobQueueFull
+from .availability import username_available, email_available
+from .page_cache import cached_adventure_page
+from .export import export_adventure
+from .telemetry import usage_report
+from .search import get_search_index
+from .config import ADMIN_USERNAMES
 
-app = Flask(__name__)
-app.config.from_object('config')
+bp = Blueprint('views', __name__)
 
-# Initialize database
-db.init_app(app)
-
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     form = RegistrationForm()
     if form.validate_on_submit():
         try:
             user = register_user(form.username.data, form.email.data, form.password.data)
             flash('Account created successfully!', 'success')
-            return redirect(url_for('login'))
+            return redirect(url_for('views.login'))
         except Exception as e:
             flash(str(e), 'danger')
     return render_template('register.html', form=form)
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/register/check')
+def check_availability():
+    result = {}
+    if request.args.get('username'):
+        result['username'] = username_available(request.args['username'])
+    if request.args.get('email'):
+        result['email'] = email_available(request.args['email'])
+    return jsonify(result)
+
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     form = LoginForm()
     if form.validate_on_submit():
         try:
             user = authenticate_user(form.username.data, form.password.data)
             flash('Logged in successfully!', 'success')
-            return redirect(url_for('index'))
+            return redirect(url_for('views.index'))
         except Exception as e:
             flash(str(e), 'danger')
     return render_template('login.html', form=form)
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout_view():
     auth_logout()
     flash('Logged out successfully!', 'success')
-    return redirect(url_for('index'))
+    return redirect(url_for('views.index'))
 
-@app.route('/adventure/create', methods=['GET', 'POST'])
+@bp.route('/adventure/create', methods=['GET', 'POST'])
 @login_required
 def create_adventure():
     form = AdventureCreationForm()
@@ -56,16 +73,17 @@ def create_adventure():
         game_manager = GameManager(current_user)
         adventure = game_manager.create_adventure(form.title.data)
         flash('Adventure created successfully!', 'success')
-        return redirect(url_for('view_adventure', adventure_id=adventure.id))
+        return redirect(url_for('views.view_adventure', adventure_id=adventure.id))
     return render_template('create_adventure.html', form=form)
 
-@app.route('/adventure/<int:adventure_id>')
+@bp.route('/adventure/<int:adventure_id>')
 @login_required
+@use_replica
 def view_adventure(adventure_id):
-    adventure = Adventure.query.get_or_404(adventure_id)
-    return render_template('view_adventure.html', adventure=adventure)
+    return cached_adventure_page(adventure_id, 'view',
+                                 lambda adventure: render_template('view_adventure.html', adventure=adventure))
 
-@app.route('/adventure/<int:adventure_id>/chat', methods=['GET', 'POST'])
+@bp.route('/adventure/<int:adventure_id>/chat', methods=['GET', 'POST'])
 @login_required
 def adventure_chat(adventure_id):
     adventure = Adventure.query.get_or_404(adventure_id)
@@ -75,21 +93,122 @@ def adventure_chat(adventure_id):
     if form.validate_on_submit():
         chat_manager.post_message(current_user, form.message.data)
         form.message.data = ''
-    messages = chat_manager.get_recent_messages()
-    return render_template('adventure_chat.html', adventure=adventure, form=form, messages=messages)
+    try:
+        messages, next_cursor = chat_manager.get_messages_page(cursor=request.args.get('before'))
+    except ValueError:
+        abort(400)
+    return render_template('adventure_chat.html', adventure=adventure, form=form, messages=messages,
+                           next_cursor=next_cursor)
 
-@app.route('/adventure/<int:adventure_id>/play', methods=['GET', 'POST'])
+@bp.route('/adventure/<int:adventure_id>/chat/messages')
 @login_required
-def play_adventure(adventure_id):
+@use_replica
+def chat_history(adventure_id):
     adventure = Adventure.query.get_or_404(adventure_id)
+    if adventure.chat_room is None:
+        abort(404)
+    limit = min(request.args.get('limit', 50, type=int), 200)
+    try:
+        messages, next_cursor = ChatManager(adventure.chat_room).get_messages_page(
+            cursor=request.args.get('cursor'), limit=limit)
+    except ValueError:
+        abort(400)
+    return jsonify({'messages': [message.to_dict() for message in messages], 'next_cursor': next_cursor})
+
+@bp.route('/adventure/<int:adventure_id>/play', methods=['GET', 'POST'])
+@login_required
+def play_adventure(adventure_id):
     form = StoryPromptForm()
+    if request.method == 'GET':
+        return cached_adventure_page(adventure_id, 'play', lambda adventure: render_template(
+            'play_adventure.html', adventure=adventure, form=form, job=None))
+    adventure = Adventure.query.get_or_404(adventure_id)
     game_manager = GameManager(current_user)
+    job = None
     if form.validate_on_submit():
-        game_manager.generate_and_update_story(adventure_id, form.prompt.data)
-        flash('Story updated successfully!', 'success')
-    return render_template('play_adventure.html', adventure=adventure, form=form)
+        try:
+            job = game_manager.submit_story_generation(adventure_id, form.prompt.data)
+            flash('Story generation started!', 'success')
+        except JobQueueFull as e:
+            flash(str(e), 'danger')
+    return render_template('play_adventure.html', adventure=adventure, form=form, job=job)
+
+@bp.route('/adventure/<int:adventure_id>/play/stream')
+@login_required
+def stream_adventure(adventure_id):
+    # EventSource can only GET, so the form's CSRF token comes in the query string
+    if current_app.config.get('WTF_CSRF_ENABLED', True):
+        try:
+            validate_csrf(request.args.get('csrf_token'))
+        except ValidationError:
+            abort(400)
+    Adventure.query.get_or_404(adventure_id)
+    prompt = request.args.get('prompt', '').strip()
+    if not 10 <= len(prompt) <= 500:
+        abort(400)
+
+    def events():
+        story = []
+        try:
+            for chunk in stream_adventure_story(adventure_id, prompt, user_id=current_user.id):
+                story.append(chunk)
+                yield f"data: {json.dumps({'text': chunk})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+            return
+        yield f"event: done\ndata: {json.dumps({'story': ''.join(story).strip()})}\n\n"
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers=headers)
+
+@bp.route('/adventure/<int:adventure_id>/export')
+@login_required
+@use_replica
+def export_adventure_view(adventure_id):
+    adventure = Adventure.query.get_or_404(adventure_id)
+    if adventure.game_master_id != current_user.id:
+        abort(403)
+    headers = {'Content-Disposition': f'attachment; filename=adventure-{adventure_id}.ndjson'}
+    return Response(stream_with_context(export_adventure(adventure_id)), mimetype='application/x-ndjson',
+                    headers=headers)
+
+@bp.route('/adventure/<int:adventure_id>/search')
+@login_required
+@use_replica
+def search_adventure(adventure_id):
+    Adventure.query.get_or_404(adventure_id)
+    query = request.args.get('q', '').strip()
+    if not query or len(query) > 200:
+        abort(400)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 50)
+    try:
+        return jsonify(get_search_index().search(adventure_id, query, page=request.args.get('page', 1, type=int),
+                                                 per_page=per_page, kind=request.args.get('kind') or None))
+    except ValueError:
+        abort(400)
+    except RuntimeError:
+        abort(503)
+
+@bp.route('/admin/usage')
+@login_required
+def usage_report_view():
+    if current_user.username not in current_app.config.get('ADMIN_USERNAMES', ADMIN_USERNAMES):
+        abort(403)
+    days = min(max(request.args.get('days', 7, type=int), 1), 90)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    return jsonify(usage_report(days, limit))
+
+@bp.route('/adventure/<int:adventure_id>/jobs/<job_id>')
+@login_required
+def story_job_status(adventure_id, job_id):
+    game_manager = GameManager(current_user)
+    try:
+        job = game_manager.get_story_job(adventure_id, job_id)
+    except ValueError:
+        abort(404)
+    return jsonify(job.to_dict())
 
-@app.route('/adventure/<int:adventure_id>/join')
+@bp.route('/adventure/<int:adventure_id>/join')
 @login_required
 def join_adventure(adventure_id):
     game_manager = GameManager(current_user)
@@ -98,9 +217,9 @@ def join_adventure(adventure_id):
         flash('Joined adventure successfully!', 'success')
     except Exception as e:
         flash(str(e), 'danger')
-    return redirect(url_for('view_adventure', adventure_id=adventure_id))
+    return redirect(url_for('views.view_adventure', adventure_id=adventure_id))
 
-@app.route('/adventure/<int:adventure_id>/leave')
+@bp.route('/adventure/<int:adventure_id>/leave')
 @login_required
 def leave_adventure(adventure_id):
     game_manager = GameManager(current_user)
@@ -109,9 +228,6 @@ def leave_adventure(adventure_id):
         flash('Left adventure successfully!', 'success')
     except Exception as e:
         flash(str(e), 'danger')
-    return redirect(url_for('view_adventure', adventure_id=adventure_id))
+    return redirect(url_for('views.view_adventure', adventure_id=adventure_id))
 
 # Additional routes can be added here
-
-if __name__ == '__main__':
-    app.run()
@@ -0,0 +1,5 @@
+## wsgi.py
+from .main import create_app
+
+# Entry point for WSGI servers, e.g. gunicorn -c gunicorn.conf.py <package>.wsgi:app
+app = create_app()